@@ -6,13 +6,16 @@ MusicGenius - 智能音乐创作APP
 主入口文件
 """
 
+import io
 import os
 import sys
 import json
 import shutil
+import zipfile
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, send_file, jsonify
 import argparse  # 新增：导入 argparse 模块
 
 # 添加当前目录到Python路径
@@ -21,13 +24,16 @@ sys.path.insert(0, os.path.abspath('.'))
 # 导入相关模块
 from .core.music_creator import MusicCreator
 from .core.music_database import MusicDatabase
-from .utils import midi_utils
+from .core.track_analysis import TrackAnalysisCache
+from .utils import midi_utils, midi_augment
+from .audio import peak_pyramid
 
 class MusicGeniusApp:
     """MusicGenius应用主类"""
     
     def __init__(self, model_dir='models', output_dir='output', 
-                 db_host='localhost', db_user='root', db_password='', db_name='music_genius',
+                 db_host='localhost', db_user='root', db_password='', db_name='music_genius', db_pool_size=5,
+                 db_backend='mysql', db_path=None,
                  upload_folder='uploads', static_folder='ui/static', template_folder='ui/templates',
                  host='0.0.0.0', port=5000, debug=True):
         """初始化应用
@@ -39,6 +45,9 @@ class MusicGeniusApp:
             db_user (str): MySQL用户名
             db_password (str): MySQL密码
             db_name (str): MySQL数据库名
+            db_pool_size (int): 数据库连接池大小，应不小于同时处理请求的线程数
+            db_backend (str): 存储后端，'mysql' 或 'sqlite'（单机部署）
+            db_path (str, optional): SQLite 数据库文件路径
             upload_folder (str): 上传文件目录
             static_folder (str): 静态文件目录
             template_folder (str): 模板文件目录
@@ -62,8 +71,12 @@ class MusicGeniusApp:
             host=db_host,
             user=db_user,
             password=db_password,
-            database=db_name
+            database=db_name,
+            pool_size=db_pool_size,
+            backend=db_backend,
+            path=db_path
         )
+        self.track_analysis = TrackAnalysisCache(self.music_db)
         
     # 创建Flask应用
         self.app = Flask(__name__,
@@ -143,9 +156,9 @@ class MusicGeniusApp:
                 flash('曲目不存在', 'error')
                 return redirect(url_for('library'))
             
-            # 分析曲目
+            # 分析结果缓存在数据库中，只有首次访问或文件内容变化时才重新分析
             try:
-                analysis = self.music_creator.analyze_track(track['filepath'])
+                analysis = self.track_analysis.get(track)
             except Exception as e:
                 analysis = {'error': str(e)}
             
@@ -567,6 +580,38 @@ class MusicGeniusApp:
                     'message': f'Error downloading file: {str(e)}'
                 }), 500
             
+        @self.app.route('/peaks/<path:filename>')
+        def waveform_peaks(filename):
+            """波形峰值API：按显示宽度和时间范围返回峰值金字塔中合适的一层"""
+            try:
+                directory = os.path.join(self.base_dir, self.output_dir)
+                full_path = safe_join(directory, filename)
+                if full_path is None or not os.path.exists(full_path):
+                    return jsonify({
+                        'success': False,
+                        'message': f'File not found: {filename}'
+                    }), 404
+                
+                width = request.args.get('width', 1000, type=int)
+                start = request.args.get('start', 0.0, type=float)
+                end = request.args.get('end', None, type=float)
+                
+                # 导入的或早于此功能生成的文件在首次请求时生成附属文件
+                pyramid = peak_pyramid.ensure_peaks(full_path)
+                result = pyramid.select(width, start=start, end=end)
+                result['success'] = True
+                return jsonify(result)
+            except Exception as e:
+                return jsonify({
+                    'success': False,
+                    'message': f'获取波形峰值失败: {str(e)}'
+                }), 500
+        
+        @self.app.route('/db_pool_stats')
+        def db_pool_stats():
+            """数据库连接池指标API"""
+            return jsonify(self.music_db.pool_stats())
+        
         @self.app.route('/add_to_library', methods=['POST'])
         def add_to_library():
             """添加到音乐库API"""
@@ -595,6 +640,9 @@ class MusicGeniusApp:
                     tags=tags
                 )
                 
+                # 入库时即完成分析，详情页直接读取缓存
+                self.track_analysis.warm([track_id])
+                
                 return jsonify({
                     'success': True,
                     'track_id': track_id,
@@ -632,28 +680,25 @@ class MusicGeniusApp:
                 genre = request.form.get('genre', '')
                 tags = request.form.get('tags', '').split(',') if request.form.get('tags', '') else []
                 
-                # 保存上传的文件并添加到音乐库
-                imported_count = 0
+                # 保存上传的文件
+                upload_paths = []
                 for file in files:
                     filename = secure_filename(file.filename)
                     upload_path = os.path.join(self.app.config['UPLOAD_FOLDER'], filename)
                     file.save(upload_path)
-                    
-                    try:
-                        self.music_db.add_track(
-                            filepath=upload_path,
-                            title=None,  # 使用文件名
-                            artist=None,
-                            genre=genre,
-                            tags=tags
-                        )
-                        imported_count += 1
-                    except Exception as e:
-                        print(f"导入 {filename} 失败: {e}")
+                    upload_paths.append(upload_path)
+                
+                # 批量添加到音乐库
+                report = self.music_db.ingest_files(
+                    [{'filepath': upload_path, 'genre': genre} for upload_path in upload_paths],
+                    analysis_cache=self.track_analysis
+                )
+                imported_count = report['imported']
                 
                 return jsonify({
                     'success': True,
                     'count': imported_count,
+                    'errors': report['errors'],
                     'message': f'成功导入 {imported_count} 个文件到音乐库！'
                 })
             
@@ -685,6 +730,52 @@ class MusicGeniusApp:
                     'message': f'删除曲目失败: {str(e)}'
                 })
         
+        @self.app.route('/export_transpositions/<int:track_id>')
+        def export_transpositions(track_id):
+            """导出曲目的转调和变速版本（ZIP）
+            
+            查询参数 semitones 和 stretch 为逗号分隔的列表，默认导出全部 12 个调的原速版本；
+            重复值被合并，数量超过上限或拉伸系数不为正数时返回 400。
+            """
+            try:
+                track = self.music_db.get_track(track_id)
+                if not track or not os.path.exists(track['filepath']):
+                    return jsonify({
+                        'success': False,
+                        'message': '曲目不存在'
+                    }), 404
+                
+                semitones, stretch_factors = midi_augment.parse_export_params(
+                    request.args.get('semitones'), request.args.get('stretch')
+                )
+                
+                rendered = midi_augment.render_augmentations(track['filepath'], semitones, stretch_factors)
+                
+                base = os.path.splitext(os.path.basename(track['filepath']))[0]
+                buffer = io.BytesIO()
+                with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    for (semitone, factor), data in rendered.items():
+                        archive.writestr(midi_augment.variant_filename(base, semitone, factor), data)
+                buffer.seek(0)
+                
+                return send_file(
+                    buffer,
+                    mimetype='application/zip',
+                    as_attachment=True,
+                    download_name=f"{secure_filename(base) or 'track'}_transpositions.zip"
+                )
+            
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': f'参数错误: {str(e)}'
+                }), 400
+            except Exception as e:
+                return jsonify({
+                    'success': False,
+                    'message': f'导出转调版本失败: {str(e)}'
+                }), 500
+        
         @self.app.route('/learn', methods=['GET'])
         def learn():
             """学习页面"""
@@ -720,13 +811,16 @@ class MusicGeniusApp:
                 sequence_length = int(request.form.get('sequence_length', 100))
                 epochs = int(request.form.get('epochs', 50))
                 batch_size = int(request.form.get('batch_size', 64))
+                # 是否用全部 12 个调的转调版本做数据增强
+                augment = request.form.get('augment', 'false').lower() in ('1', 'true', 'on')
                 
                 # 训练模型
                 model_path = self.music_creator.train_melody_model(
                     midi_files=midi_files,
                     sequence_length=sequence_length,
                     epochs=epochs,
-                    batch_size=batch_size
+                    batch_size=batch_size,
+                    transpositions=midi_augment.ALL_KEYS if augment else None
                 )
                 
                 return jsonify({
@@ -844,6 +938,9 @@ def main():
     parser.add_argument('--db_user', type=str, default='root', help='MySQL 用户名')
     parser.add_argument('--db_password', type=str, default='root123@', help='MySQL 密码')  # 必填参数
     parser.add_argument('--db_name', type=str, default='music_genius', help='MySQL 数据库名')
+    parser.add_argument('--db_pool_size', type=int, default=5, help='数据库连接池大小')
+    parser.add_argument('--db_backend', type=str, default='mysql', choices=['mysql', 'sqlite'], help='存储后端')
+    parser.add_argument('--db_path', type=str, default=None, help='SQLite 数据库文件路径')
     parser.add_argument('--host', type=str, default='0.0.0.0', help='应用主机地址')
     parser.add_argument('--port', type=int, default=5000, help='应用端口号')
     parser.add_argument('--debug', action='store_true', help='是否开启调试模式')
@@ -856,6 +953,9 @@ def main():
         db_user=args.db_user,
         db_password=args.db_password,  # 使用命令行参数
         db_name=args.db_name,
+        db_pool_size=args.db_pool_size,
+        db_backend=args.db_backend,
+        db_path=args.db_path,
         host=args.host,
         port=args.port,
         debug=args.debug
@@ -1,3 +1,7 @@
 from .audio_processor import AudioProcessor
+from .features import AudioFeatures, FEATURE_NAMES
+from .analysis_session import AnalysisSession
+from .analysis_profiles import ANALYSIS_PROFILES
+from .peak_pyramid import PeakPyramid
 
-__all__ = ['AudioProcessor'] 
\ No newline at end of file
+__all__ = ['AudioProcessor', 'AudioFeatures', 'FEATURE_NAMES', 'AnalysisSession', 'ANALYSIS_PROFILES', 'PeakPyramid'] 
\ No newline at end of file
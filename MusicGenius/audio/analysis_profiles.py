@@ -0,0 +1,103 @@
+"""
+音频分析配置
+
+每个配置指定加载音频的采样率、FFT参数，以及需要计算的特征和估计器：
+- fast: 11.025 kHz，只估计速度、节拍和调性，不跟踪音高，用于批量扫描曲库
+- standard: 22.05 kHz，完整特征，音高用向量化 YIN
+- full: 22.05 kHz，完整特征，音高用 pYIN（最准确也最慢），用于详情页
+
+调性和速度估计不需要高采样率，fast 配置下加载、STFT 和起音检测的开销都约为 full 的一半，
+并且跳过了最耗时的音高跟踪。
+"""
+
+from .audio_processor import AudioProcessor
+from .analysis_session import AnalysisSession
+from .features import DEFAULT_FEATURES, RHYTHM_FEATURES, HARMONY_FEATURES
+
+ANALYSIS_PROFILES = {
+    'fast': {
+        'sr': 11025,
+        'n_fft': 2048,
+        'hop_length': 512,
+        'max_lag': 4.0,
+        'pitch_method': 'yin',
+        'features': ('onset_env', 'tempo', 'beat_times'),
+        'rhythm': ('tempo', 'beat_times', 'beat_frames'),
+        'harmony': ('chroma_avg', 'estimated_key', 'estimated_mode')
+    },
+    'standard': {
+        'sr': 22050,
+        'n_fft': 2048,
+        'hop_length': 512,
+        'max_lag': 8.0,
+        'pitch_method': 'yin',
+        'features': DEFAULT_FEATURES,
+        'rhythm': RHYTHM_FEATURES,
+        'harmony': HARMONY_FEATURES
+    },
+    'full': {
+        'sr': 22050,
+        'n_fft': 2048,
+        'hop_length': 512,
+        'max_lag': 8.0,
+        'pitch_method': 'pyin',
+        'features': DEFAULT_FEATURES,
+        'rhythm': RHYTHM_FEATURES,
+        'harmony': HARMONY_FEATURES
+    }
+}
+
+
+def get_profile(profile):
+    """获取分析配置
+
+    Args:
+        profile (str | dict): 配置名称，或自定义的配置字典
+
+    Returns:
+        dict: 分析配置
+    """
+    if isinstance(profile, dict):
+        return profile
+    if profile not in ANALYSIS_PROFILES:
+        raise ValueError(f"未知的分析配置: {profile}，可用配置: {', '.join(ANALYSIS_PROFILES)}")
+    return ANALYSIS_PROFILES[profile]
+
+
+def create_processor(profile):
+    """按配置创建音频处理器
+
+    Args:
+        profile (str | dict): 配置名称或配置字典
+
+    Returns:
+        AudioProcessor: 使用配置中采样率和FFT参数的处理器
+    """
+    profile = get_profile(profile)
+    return AudioProcessor(sr=profile['sr'], n_fft=profile['n_fft'], hop_length=profile['hop_length'],
+                          max_lag=profile['max_lag'])
+
+
+def analyze_file(input_file, profile='standard', processor=None, plot=False, pitch_method=None):
+    """按配置分析音频文件
+
+    Args:
+        input_file (str): 音频文件路径
+        profile (str | dict): 配置名称或配置字典
+        processor (AudioProcessor, optional): 复用的处理器，需与配置的参数一致，默认按配置新建
+        plot (bool): 是否生成可视化图表
+        pitch_method (str, optional): 覆盖配置中的音高跟踪方法
+
+    Returns:
+        dict: 分析结果（见 AnalysisSession.run），profile 为配置名称
+    """
+    name = profile if isinstance(profile, str) else 'custom'
+    profile = get_profile(profile)
+    if processor is None:
+        processor = create_processor(profile)
+
+    session = AnalysisSession(processor, input_file, pitch_method=pitch_method or profile['pitch_method'])
+    result = session.run(profile['features'], plot=plot, rhythm_names=profile['rhythm'],
+                         harmony_names=profile['harmony'])
+    result['profile'] = name
+    return result
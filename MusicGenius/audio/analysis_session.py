@@ -0,0 +1,123 @@
+"""
+音频分析会话
+
+一个会话持有已加载的音频和它的惰性特征映射（幅度谱、起音强度、色度、节拍等中间结果），
+特征提取、节奏分析和和声分析都从同一份中间结果计算，节拍跟踪和色度只各算一次。
+会话会记录每个阶段的耗时。
+"""
+
+import os
+import time
+from .features import DEFAULT_FEATURES, RHYTHM_FEATURES, HARMONY_FEATURES
+
+
+class AnalysisSession:
+    """单个音频文件的分析会话"""
+
+    def __init__(self, processor, input_file=None, y=None, sr=None, pitch_method='pyin'):
+        """初始化会话，传入文件路径或已加载的音频数据
+
+        Args:
+            processor (AudioProcessor): 音频处理器
+            input_file (str, optional): 音频文件路径
+            y (ndarray, optional): 已加载的音频数据
+            sr (int, optional): 采样率
+            pitch_method (str): f0 使用的音高跟踪方法，'pyin' 或 'yin'
+        """
+        if input_file is None and y is None:
+            raise ValueError("必须提供 input_file 或 y")
+
+        self.processor = processor
+        self.input_file = input_file
+        # 阶段名 -> 耗时（秒）
+        self.timings = {}
+
+        if y is None:
+            start = time.perf_counter()
+            y, sr = processor.load_audio(input_file)
+            self.timings['load'] = time.perf_counter() - start
+
+        self.y = y
+        self.sr = sr if sr is not None else processor.sr
+        self.features = processor.features(self.y, self.sr, pitch_method=pitch_method)
+
+    def _timed(self, stage, function):
+        """执行一个阶段并记录耗时"""
+        start = time.perf_counter()
+        result = function()
+        self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+        return result
+
+    def extract_features(self, names=DEFAULT_FEATURES):
+        """提取特征
+
+        Args:
+            names (iterable): 特征名列表
+
+        Returns:
+            dict: 特征名 -> 特征值
+        """
+        return self._timed('features', lambda: self.features.select(names))
+
+    def rhythm(self, names=RHYTHM_FEATURES):
+        """节奏分析"""
+        return self._timed('rhythm', lambda: self.processor.analyze_rhythm(self.y, self.sr, features=self.features,
+                                                                           names=names))
+
+    def harmony(self, names=HARMONY_FEATURES):
+        """和声分析"""
+        return self._timed('harmony', lambda: self.processor.analyze_harmony(self.y, self.sr, features=self.features,
+                                                                             names=names))
+
+    def plot(self):
+        """绘制波形图、频谱图和特征图（特征图缺少的特征会按需计算）
+
+        Returns:
+            dict: 图表名 -> PNG 图像字节（waveform、spectrogram、features）
+        """
+        name = os.path.basename(self.input_file) if self.input_file else 'audio'
+
+        def draw():
+            return {
+                'waveform': self.processor.plot_waveform(self.y, self.sr, title=f"Waveform: {name}"),
+                'spectrogram': self.processor.plot_spectrogram(self.y, self.sr, title=f"Spectrogram: {name}",
+                                                             features=self.features),
+                'features': self.processor.plot_features(self.features, title_prefix=f"{name} - ", sr=self.sr)
+            }
+
+        return self._timed('plot', draw)
+
+    def run(self, feature_names=DEFAULT_FEATURES, plot=False, rhythm_names=RHYTHM_FEATURES,
+            harmony_names=HARMONY_FEATURES):
+        """执行完整分析
+
+        Args:
+            feature_names (iterable): 需要返回的特征名列表
+            plot (bool): 是否生成可视化图表（结果中 plots 为各图表的 PNG 字节）
+            rhythm_names (iterable): 节奏分析返回的特征名，需包含 tempo
+            harmony_names (iterable): 和声分析返回的特征名，需包含 estimated_key 和 estimated_mode
+
+        Returns:
+            dict: 组合的分析结果，timings 为各阶段耗时，feature_timings 为各特征自身的计算耗时
+        """
+        start = time.perf_counter()
+
+        features = self.extract_features(feature_names)
+        rhythm_info = self.rhythm(rhythm_names)
+        harmony_info = self.harmony(harmony_names)
+
+        plots = self.plot() if plot else None
+
+        self.timings['total'] = time.perf_counter() - start + self.timings.get('load', 0.0)
+
+        return {
+            'features': features,
+            'rhythm': rhythm_info,
+            'harmony': harmony_info,
+            'tempo': rhythm_info['tempo'],
+            'estimated_key': harmony_info['estimated_key'],
+            'estimated_mode': harmony_info['estimated_mode'],
+            'timings': dict(self.timings),
+            'feature_timings': dict(self.features.timings),
+            'plots': plots
+        }
@@ -0,0 +1,186 @@
+"""
+快速音频读取
+
+按文件类型选择最快的解码路径：
+1. PCM/浮点 WAV：解析 RIFF 头后用 np.memmap 映射数据块，只转换请求的时间范围
+2. soundfile 支持的其他格式（FLAC、OGG、AIFF 等）：用 soundfile 定位到起始帧后只解码请求的部分
+3. 其余格式（soundfile 无法打开时）：回退到 librosa.load
+
+只有采样率与目标不同时才重采样，使用 scipy 的多相滤波重采样 (resample_poly)。
+多声道先混合为单声道再重采样，减少计算量。
+"""
+
+import struct
+from math import gcd
+import numpy as np
+import soundfile as sf
+import librosa
+from scipy import signal
+
+# WAV 格式码
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (格式码, 位深) -> (numpy 数据类型, 转换为 [-1, 1) 的缩放系数, 偏移)
+_WAV_DTYPES = {
+    (_WAVE_FORMAT_PCM, 8): (np.uint8, 1.0 / 128, 128),
+    (_WAVE_FORMAT_PCM, 16): (np.dtype('<i2'), 1.0 / 32768, 0),
+    (_WAVE_FORMAT_PCM, 32): (np.dtype('<i4'), 1.0 / 2147483648, 0),
+    (_WAVE_FORMAT_IEEE_FLOAT, 32): (np.dtype('<f4'), 1.0, 0),
+    (_WAVE_FORMAT_IEEE_FLOAT, 64): (np.dtype('<f8'), 1.0, 0),
+}
+
+
+def _wav_layout(file_path):
+    """解析 WAV 文件头，获取可以直接映射的数据块布局
+
+    Args:
+        file_path (str): 文件路径
+
+    Returns:
+        dict: 包含 offset、frames、channels、sr、dtype、scale、bias；
+            不是 RIFF/WAVE 或样本格式无法直接映射（如 24 位 PCM、压缩格式）时返回 None
+    """
+    with open(file_path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            return None
+
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+
+            if chunk_id == b'fmt ':
+                data = f.read(chunk_size)
+                format_tag, channels, sr = struct.unpack('<HHI', data[:8])
+                bits = struct.unpack('<H', data[14:16])[0]
+                if format_tag == _WAVE_FORMAT_EXTENSIBLE and len(data) >= 26:
+                    # 子格式 GUID 的前两个字节为实际格式码
+                    format_tag = struct.unpack('<H', data[24:26])[0]
+                fmt = (format_tag, channels, sr, bits)
+                if chunk_size % 2:
+                    f.seek(1, 1)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    return None
+                format_tag, channels, sr, bits = fmt
+                if (format_tag, bits) not in _WAV_DTYPES or channels == 0:
+                    return None
+
+                dtype, scale, bias = _WAV_DTYPES[(format_tag, bits)]
+                offset = f.tell()
+                # 数据块大小可能超出文件实际长度（录制中断的文件），以文件长度为准
+                f.seek(0, 2)
+                size = min(chunk_size, f.tell() - offset)
+                frames = size // (np.dtype(dtype).itemsize * channels)
+                return {'offset': offset, 'frames': frames, 'channels': channels, 'sr': sr,
+                        'dtype': dtype, 'scale': scale, 'bias': bias}
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)
+
+
+def audio_info(file_path):
+    """获取音频文件的基本信息（不解码音频）
+
+    Args:
+        file_path (str): 文件路径
+
+    Returns:
+        dict: 包含 sr、frames、channels、duration
+    """
+    layout = _wav_layout(file_path)
+    if layout is not None:
+        sr, frames, channels = layout['sr'], layout['frames'], layout['channels']
+    else:
+        info = sf.info(file_path)
+        sr, frames, channels = info.samplerate, info.frames, info.channels
+
+    return {'sr': sr, 'frames': frames, 'channels': channels, 'duration': frames / sr if sr else 0.0}
+
+
+def _frame_range(sr, frames, offset, duration):
+    """把时间范围换算为帧范围"""
+    start = min(max(int(round(offset * sr)), 0), frames)
+    stop = frames if duration is None else min(start + int(round(duration * sr)), frames)
+    return start, stop
+
+
+def _read_memmap(file_path, layout, offset, duration):
+    """通过内存映射读取 WAV 数据的一段，返回 (帧数, 声道数) 的 float32 数组"""
+    start, stop = _frame_range(layout['sr'], layout['frames'], offset, duration)
+    data = np.memmap(file_path, dtype=layout['dtype'], mode='r', offset=layout['offset'],
+                     shape=(layout['frames'], layout['channels']))
+
+    # 只有被切片的部分会从磁盘读入并转换
+    block = np.asarray(data[start:stop], dtype=np.float32)
+    if layout['bias']:
+        block -= layout['bias']
+    if layout['scale'] != 1.0:
+        block *= layout['scale']
+    del data
+    return block
+
+
+def _read_soundfile(file_path, offset, duration):
+    """用 soundfile 读取一段音频，返回 (帧数, 声道数) 的 float32 数组和采样率"""
+    with sf.SoundFile(file_path) as f:
+        start, stop = _frame_range(f.samplerate, f.frames, offset, duration)
+        f.seek(start)
+        return f.read(stop - start, dtype='float32', always_2d=True), f.samplerate
+
+
+def resample(y, orig_sr, target_sr):
+    """多相滤波重采样，采样率相同时直接返回输入
+
+    Args:
+        y (ndarray): 音频数据，最后一维为时间
+        orig_sr (int): 原采样率
+        target_sr (int): 目标采样率
+
+    Returns:
+        ndarray: 重采样后的 float32 音频数据
+    """
+    if orig_sr == target_sr:
+        return y
+    divisor = gcd(int(orig_sr), int(target_sr))
+    up, down = int(target_sr) // divisor, int(orig_sr) // divisor
+    return signal.resample_poly(y, up, down, axis=-1).astype(np.float32, copy=False)
+
+
+def load_audio(file_path, sr=None, mono=True, offset=0.0, duration=None):
+    """读取音频文件
+
+    Args:
+        file_path (str): 文件路径
+        sr (int, optional): 目标采样率，默认为None（使用文件原始采样率）
+        mono (bool): 是否混合为单声道
+        offset (float): 起始时间（秒）
+        duration (float, optional): 读取时长（秒），默认为None（读到文件末尾）
+
+    Returns:
+        tuple: (音频数据, 采样率)。单声道时形状为 (样本数,)，多声道时为 (声道数, 样本数)，与 librosa.load 一致
+    """
+    layout = _wav_layout(file_path)
+    if layout is not None:
+        y, native_sr = _read_memmap(file_path, layout, offset, duration), layout['sr']
+    else:
+        try:
+            y, native_sr = _read_soundfile(file_path, offset, duration)
+        except RuntimeError:
+            # soundfile 无法解码的格式
+            return librosa.load(file_path, sr=sr, mono=mono, offset=offset, duration=duration)
+
+    if mono:
+        y = np.ascontiguousarray(y[:, 0]) if y.shape[1] == 1 else y.mean(axis=1)
+    else:
+        y = np.ascontiguousarray(y.T)
+        if y.shape[0] == 1:
+            y = y[0]
+
+    if sr is None:
+        return y, native_sr
+    return resample(y, native_sr, sr), sr
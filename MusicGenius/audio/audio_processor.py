@@ -1,30 +1,39 @@
 import numpy as np
 import librosa
-import matplotlib.pyplot as plt
 import soundfile as sf
 from scipy import signal
+from .features import AudioFeatures, DEFAULT_FEATURES, RHYTHM_FEATURES, HARMONY_FEATURES
+from .streaming import analyze_stream
+from . import audio_loader, plot_renderer
 
 class AudioProcessor:
     """音频处理类，提供音频分析和处理功能"""
     
-    def __init__(self, sr=22050, n_fft=2048, hop_length=512):
+    def __init__(self, sr=22050, n_fft=2048, hop_length=512, max_lag=8.0):
         """初始化音频处理器
         
         Args:
             sr (int): 采样率
             n_fft (int): FFT窗口大小
             hop_length (int): 帧移
+            max_lag (float, optional): 节奏自相关保留的最大延迟（秒），None 表示保留全部延迟
         """
         self.sr = sr
         self.n_fft = n_fft
         self.hop_length = hop_length
+        self.max_lag = max_lag
     
-    def load_audio(self, file_path, sr=None):
-        """加载音频文件
+    def load_audio(self, file_path, sr=None, offset=0.0, duration=None):
+        """加载音频文件（单声道）
+        
+        WAV 文件通过内存映射读取，其他格式用 soundfile 解码，只在采样率不同时重采样，
+        见 audio_loader.load_audio。
         
         Args:
             file_path (str): 音频文件路径
-            sr (int, optional): 目标采样率，默认为None（使用文件原始采样率）
+            sr (int, optional): 目标采样率，默认为None（使用处理器的采样率）
+            offset (float): 起始时间（秒）
+            duration (float, optional): 读取时长（秒），默认为None（读到文件末尾）
         
         Returns:
             tuple: (音频数据, 采样率)
@@ -32,8 +41,7 @@ class AudioProcessor:
         if sr is None:
             sr = self.sr
         
-        y, sr = librosa.load(file_path, sr=sr)
-        return y, sr
+        return audio_loader.load_audio(file_path, sr=sr, offset=offset, duration=duration)
     
     def save_audio(self, y, file_path, sr=None):
         """保存音频文件
@@ -48,205 +56,306 @@ class AudioProcessor:
         
         sf.write(file_path, y, sr)
     
-    def extract_features(self, y, sr=None):
-        """提取音频特征
+    def features(self, y, sr=None, pitch_method='pyin'):
+        """创建音频的惰性特征映射，访问时才计算并缓存
+        
+        每次调用返回新的映射，处理器本身不持有音频和中间结果（处理器可能长期存在，
+        例如网页进程中共享的处理器）。需要复用中间结果时由调用方持有映射，
+        并通过 features 参数传给 analyze_rhythm、analyze_harmony 和 plot_spectrogram，
+        或使用 AnalysisSession。
         
         Args:
             y (ndarray): 音频数据
             sr (int, optional): 采样率
+            pitch_method (str): f0 使用的音高跟踪方法，'pyin' 或 'yin'
         
         Returns:
-            dict: 包含各种音频特征的字典
+            AudioFeatures: 惰性特征映射
         """
         if sr is None:
             sr = self.sr
         
-        # 梅尔频谱
-        mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length)
-        
-        # 色度特征
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length)
-        
-        # 过零率
-        zcr = librosa.feature.zero_crossing_rate(y, hop_length=self.hop_length)
+        return AudioFeatures(self, y, sr, pitch_method=pitch_method)
+    
+    def extract_features(self, y, sr=None, features=None, pitch_method='pyin'):
+        """提取音频特征
         
-        # 频谱质心
-        spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length)
+        Args:
+            y (ndarray): 音频数据
+            sr (int, optional): 采样率
+            features (iterable, optional): 需要的特征名（见 features.FEATURE_NAMES），
+                默认为None（返回 DEFAULT_FEATURES 中的全部特征）
+            pitch_method (str): f0 使用的音高跟踪方法，'pyin' 或 'yin'
         
-        # MFCC
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length, n_mfcc=13)
+        Returns:
+            dict: 包含所请求音频特征的字典
+        """
+        names = DEFAULT_FEATURES if features is None else features
+        return self.features(y, sr, pitch_method=pitch_method).select(names)
+    
+    def track_pitch(self, y, sr=None, method='yin', fmin=None, fmax=None, yin_sr=11025, threshold=0.15):
+        """逐帧估计基频
         
-        # 节拍检测
-        tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-        beat_times = librosa.frames_to_time(beat_frames, sr=sr)
+        Args:
+            y (ndarray): 音频数据
+            sr (int, optional): 采样率
+            method (str): 'yin'（降采样后的向量化 YIN，速度快）或 'pyin'（librosa.pyin，更准确但慢）
+            fmin (float, optional): 最低频率，默认为 C2
+            fmax (float, optional): 最高频率，默认为 C7
+            yin_sr (int): YIN 使用的目标采样率，按整数倍降采样到不低于该值
+            threshold (float): YIN 的非周期性阈值
         
-        # 基频估计
-        f0, voiced_flag, voiced_probs = librosa.pyin(y, fmin=librosa.note_to_hz('C2'), 
-                                                     fmax=librosa.note_to_hz('C7'), sr=sr)
+        Returns:
+            dict: 包含 f0、voiced_flag、voiced_probs、times，以及帧对应的 sr 和 hop_length
+        """
+        if sr is None:
+            sr = self.sr
+        if fmin is None:
+            fmin = librosa.note_to_hz('C2')
+        if fmax is None:
+            fmax = librosa.note_to_hz('C7')
+        
+        if method == 'pyin':
+            f0, voiced_flag, voiced_probs = librosa.pyin(y, fmin=fmin, fmax=fmax, sr=sr,
+                                                         frame_length=self.n_fft, hop_length=self.hop_length)
+            frame_sr, frame_hop = sr, self.hop_length
+        elif method == 'yin':
+            # 按整数倍降采样，保证帧移与原采样率下的 hop_length 对应同一时长
+            factor = max(1, min(int(sr // yin_sr), int(sr // (2.2 * fmax)), self.hop_length))
+            while self.hop_length % factor:
+                factor -= 1
+            if factor > 1:
+                y = signal.resample_poly(y, 1, factor)
+            frame_sr, frame_hop = sr / factor, self.hop_length // factor
+            f0, voiced_flag, voiced_probs = _yin(y, frame_sr, frame_hop, fmin, fmax, threshold)
+        else:
+            raise ValueError(f"未知的音高跟踪方法: {method}，可选: yin, pyin")
+        
+        times = librosa.frames_to_time(np.arange(len(f0)), sr=frame_sr, hop_length=frame_hop)
         
-        features = {
-            'mel_spectrogram': mel_spec,
-            'chroma': chroma,
-            'zero_crossing_rate': zcr,
-            'spectral_centroid': spectral_centroid,
-            'mfcc': mfcc,
-            'tempo': tempo,
-            'beat_times': beat_times,
+        return {
             'f0': f0,
             'voiced_flag': voiced_flag,
-            'voiced_probs': voiced_probs
+            'voiced_probs': voiced_probs,
+            'times': times,
+            'sr': frame_sr,
+            'hop_length': frame_hop
         }
-        
-        return features
     
-    def analyze_rhythm(self, y, sr=None):
+    def analyze_rhythm(self, y, sr=None, features=None, names=RHYTHM_FEATURES):
         """分析音频的节奏特征
         
         Args:
             y (ndarray): 音频数据
             sr (int, optional): 采样率
+            features (AudioFeatures, optional): 已有的特征映射，用于复用中间结果
+            names (iterable): 需要返回的节奏特征名
         
         Returns:
             dict: 节奏特征
         """
-        if sr is None:
-            sr = self.sr
+        if features is None:
+            features = self.features(y, sr)
         
-        # 检测节拍
-        tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-        beat_times = librosa.frames_to_time(beat_frames, sr=sr)
-        
-        # 计算节拍强度
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        pulse = librosa.beat.plp(onset_envelope=onset_env, sr=sr)
-        
-        # 计算节奏模式
-        rhythm_pattern = np.correlate(onset_env, onset_env, mode='full')
-        rhythm_pattern = rhythm_pattern[len(rhythm_pattern)//2:]
-        
-        return {
-            'tempo': tempo,
-            'beat_times': beat_times,
-            'beat_frames': beat_frames,
-            'onset_env': onset_env,
-            'pulse': pulse,
-            'rhythm_pattern': rhythm_pattern
-        }
+        return features.select(names)
     
-    def analyze_harmony(self, y, sr=None):
+    def analyze_harmony(self, y, sr=None, features=None, names=HARMONY_FEATURES):
         """分析音频的和声特征
         
         Args:
             y (ndarray): 音频数据
             sr (int, optional): 采样率
+            features (AudioFeatures, optional): 已有的特征映射，用于复用中间结果
+            names (iterable): 需要返回的和声特征名
         
         Returns:
             dict: 和声特征
         """
-        if sr is None:
-            sr = self.sr
-        
-        # 计算色度特征
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length)
+        if features is None:
+            features = self.features(y, sr)
         
-        # 估计和弦
-        chroma_avg = np.mean(chroma, axis=1)
+        return features.select(names)
+    
+    def analyze_stream(self, file_path, block_length=256):
+        """流式分析长音频文件，峰值内存与时长无关
         
-        # 调性强度
-        key_strengths = librosa.key_strength(y=y, sr=sr)
-        key_index = np.argmax(np.mean(key_strengths, axis=1))
-        keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        estimated_key = keys[key_index % 12]
-        estimated_mode = 'major' if key_index < 12 else 'minor'
+        Args:
+            file_path (str): 音频文件路径
+            block_length (int): 每块包含的帧数
         
-        return {
-            'chroma': chroma,
-            'chroma_avg': chroma_avg,
-            'key_strengths': key_strengths,
-            'estimated_key': estimated_key,
-            'estimated_mode': estimated_mode
-        }
+        Returns:
+            dict: 节奏与和声的汇总结果，见 streaming.StreamingAnalyzer.result
+        """
+        return analyze_stream(file_path, n_fft=self.n_fft, hop_length=self.hop_length, block_length=block_length)
     
-    def plot_waveform(self, y, sr=None, title="Waveform"):
-        """绘制音频波形图
+    def plot_waveform(self, y, sr=None, title="Waveform", width=1200, height=400):
+        """绘制音频波形图（最小/最大值包络）
         
         Args:
             y (ndarray): 音频数据
             sr (int, optional): 采样率
             title (str, optional): 图表标题
+            width (int): 图像宽度（像素）
+            height (int): 图像高度（像素）
+        
+        Returns:
+            bytes: PNG 图像
         """
         if sr is None:
             sr = self.sr
         
-        plt.figure(figsize=(12, 4))
-        librosa.display.waveshow(y, sr=sr)
-        plt.title(title)
-        plt.tight_layout()
+        return plot_renderer.render_waveform(y, sr, title=title, width=width, height=height)
         
-    def plot_spectrogram(self, y, sr=None, title="Spectrogram"):
+    def plot_spectrogram(self, y, sr=None, title="Spectrogram", width=1200, height=400, features=None):
         """绘制频谱图
         
         Args:
             y (ndarray): 音频数据
             sr (int, optional): 采样率
             title (str, optional): 图表标题
+            width (int): 图像宽度（像素）
+            height (int): 图像高度（像素）
+            features (AudioFeatures, optional): 同一段音频已有的特征映射，分析过程中已经计算过的幅度谱直接复用
+        
+        Returns:
+            bytes: PNG 图像
         """
         if sr is None:
             sr = self.sr
+        if features is None:
+            features = self.features(y, sr)
         
-        D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
-        plt.figure(figsize=(12, 4))
-        librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log')
-        plt.colorbar(format='%+2.0f dB')
-        plt.title(title)
-        plt.tight_layout()
+        S = features['stft']
+        return plot_renderer.render_spectrogram(S, sr, hop_length=self.hop_length, title=title,
+                                                width=width, height=height)
 
-    def plot_features(self, features, title_prefix=""):
+    def plot_features(self, features, title_prefix="", sr=None, width=1200, height=800):
         """绘制提取的特征
         
         Args:
-            features (dict): 特征字典
+            features (dict): 特征字典，需包含 mel_spectrogram、chroma、mfcc、spectral_centroid、
+                zero_crossing_rate、f0
             title_prefix (str, optional): 标题前缀
+            sr (int, optional): 采样率
+            width (int): 图像宽度（像素）
+            height (int): 图像高度（像素）
+        
+        Returns:
+            bytes: PNG 图像
         """
-        plt.figure(figsize=(12, 8))
-        
-        # 绘制梅尔频谱
-        plt.subplot(3, 2, 1)
-        librosa.display.specshow(librosa.power_to_db(features['mel_spectrogram'], ref=np.max),
-                                y_axis='mel', x_axis='time')
-        plt.title(f'{title_prefix}Mel Spectrogram')
-        plt.colorbar(format='%+2.0f dB')
-        
-        # 绘制色度图
-        plt.subplot(3, 2, 2)
-        librosa.display.specshow(features['chroma'], y_axis='chroma', x_axis='time')
-        plt.title(f'{title_prefix}Chromagram')
-        plt.colorbar()
-        
-        # 绘制MFCC
-        plt.subplot(3, 2, 3)
-        librosa.display.specshow(features['mfcc'], x_axis='time')
-        plt.title(f'{title_prefix}MFCC')
-        plt.colorbar()
-        
-        # 绘制频谱质心
-        plt.subplot(3, 2, 4)
-        plt.semilogy(features['spectral_centroid'].T)
-        plt.title(f'{title_prefix}Spectral Centroid')
-        plt.xlabel('Time')
-        plt.ylabel('Hz')
-        
-        # 绘制过零率
-        plt.subplot(3, 2, 5)
-        plt.plot(features['zero_crossing_rate'].T)
-        plt.title(f'{title_prefix}Zero Crossing Rate')
-        plt.xlabel('Time')
-        
-        # 绘制F0基频
-        plt.subplot(3, 2, 6)
-        plt.plot(features['f0'])
-        plt.title(f'{title_prefix}F0 Frequency')
-        plt.xlabel('Time')
-        plt.ylabel('Hz')
-        
-        plt.tight_layout() 
\ No newline at end of file
+        if sr is None:
+            sr = self.sr
+        
+        return plot_renderer.render_features(features, sr, hop_length=self.hop_length, title_prefix=title_prefix,
+                                             width=width, height=height)
+
+
+def _yin(y, sr, hop_length, fmin, fmax, threshold, block_size=256):
+    """向量化的 YIN 基频估计
+    
+    每块帧的差函数通过 FFT 一次算出，再对累积均值归一化差函数（CMND）逐帧取
+    第一个低于阈值的谷底，并做抛物线插值。按块处理以控制中间数组的大小。
+    
+    Args:
+        y (ndarray): 音频数据
+        sr (float): 采样率
+        hop_length (int): 帧移
+        fmin (float): 最低频率
+        fmax (float): 最高频率
+        threshold (float): 非周期性阈值
+        block_size (int): 每块的帧数
+    
+    Returns:
+        tuple: (f0, voiced_flag, voiced_probs)，不发声帧的 f0 为 NaN
+    """
+    min_period = max(1, int(np.floor(sr / fmax)))
+    max_period = int(np.ceil(sr / fmin))
+    window = max_period + 2
+    frame_length = 2 * window
+    n_fft = 1 << int(np.ceil(np.log2(frame_length + window)))
+    lags = np.arange(max_period + 1)
+    
+    # 与 librosa 一致：帧以 hop_length 的整数倍为中心
+    y = np.pad(np.asarray(y, dtype=np.float64), frame_length // 2)
+    if len(y) < frame_length:
+        y = np.pad(y, (0, frame_length - len(y)))
+    frames = librosa.util.frame(y, frame_length=frame_length, hop_length=hop_length).T
+    
+    n_frames = len(frames)
+    f0 = np.empty(n_frames)
+    voiced_flag = np.empty(n_frames, dtype=bool)
+    voiced_probs = np.empty(n_frames)
+    
+    for begin in range(0, n_frames, block_size):
+        block = np.ascontiguousarray(frames[begin:begin + block_size])
+        
+        # 差函数 d(tau) = E(0) + E(tau) - 2 * r(tau)，r 为前 window 个采样与整帧的互相关
+        spectrum = np.fft.rfft(block, n=n_fft, axis=1)
+        head_spectrum = np.fft.rfft(block[:, :window], n=n_fft, axis=1)
+        correlation = np.fft.irfft(spectrum * np.conj(head_spectrum), n=n_fft, axis=1)[:, :max_period + 1]
+        
+        energy = np.cumsum(np.pad(block ** 2, ((0, 0), (1, 0))), axis=1)
+        lag_energy = energy[:, lags + window] - energy[:, lags]
+        difference = np.maximum(lag_energy[:, :1] + lag_energy - 2 * correlation, 0)
+        
+        # 累积均值归一化差函数
+        cumulative = np.cumsum(difference[:, 1:], axis=1)
+        cmnd = np.ones_like(difference)
+        cmnd[:, 1:] = difference[:, 1:] * lags[1:] / np.maximum(cumulative, 1e-12)
+        
+        # 搜索范围内的谷底
+        search = cmnd[:, min_period:max_period + 1]
+        is_trough = np.zeros_like(search, dtype=bool)
+        is_trough[:, 1:-1] = (search[:, 1:-1] <= search[:, :-2]) & (search[:, 1:-1] < search[:, 2:])
+        candidates = is_trough & (search < threshold)
+        
+        voiced = candidates.any(axis=1)
+        offsets = np.where(voiced, np.argmax(candidates, axis=1), np.argmin(search, axis=1))
+        periods = offsets + min_period
+        
+        # 抛物线插值
+        rows = np.arange(len(periods))
+        left = cmnd[rows, np.maximum(periods - 1, 1)]
+        center = cmnd[rows, periods]
+        right = cmnd[rows, np.minimum(periods + 1, max_period)]
+        denominator = left - 2 * center + right
+        shift = np.divide(left - right, 2 * denominator, out=np.zeros_like(center), where=np.abs(denominator) > 1e-12)
+        shift = np.clip(shift, -1, 1)
+        
+        end = begin + len(block)
+        f0[begin:end] = np.where(voiced, sr / (periods + shift), np.nan)
+        voiced_flag[begin:end] = voiced
+        voiced_probs[begin:end] = np.clip(1 - center, 0, 1)
+    
+    return f0, voiced_flag, voiced_probs
+
+
+def check_feature_parity(y, sr=22050, n_fft=2048, hop_length=512, rtol=1e-5, atol=1e-6):
+    """检查共享 STFT 导出的特征与 librosa 各自独立计算的结果是否一致
+
+    Args:
+        y (ndarray): 音频数据
+        sr (int): 采样率
+        n_fft (int): FFT窗口大小
+        hop_length (int): 帧移
+        rtol (float): 相对误差容限
+        atol (float): 绝对误差容限
+
+    Returns:
+        dict: 特征名 -> 是否一致
+    """
+    processor = AudioProcessor(sr=sr, n_fft=n_fft, hop_length=hop_length)
+    shared = processor.features(y, sr)
+
+    reference = {
+        'mel_spectrogram': librosa.feature.melspectrogram(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length),
+        'chroma': librosa.feature.chroma_stft(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length),
+        'spectral_centroid': librosa.feature.spectral_centroid(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length),
+        'mfcc': librosa.feature.mfcc(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length, n_mfcc=13),
+        'onset_env': librosa.onset.onset_strength(y=y, sr=sr, n_fft=n_fft, hop_length=hop_length),
+    }
+
+    return {
+        name: bool(np.allclose(shared[name], expected, rtol=rtol, atol=atol))
+        for name, expected in reference.items()
+    }
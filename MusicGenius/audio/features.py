@@ -0,0 +1,244 @@
+"""
+惰性音频特征
+
+AudioFeatures 是一个只读映射：访问某个特征时才计算它，并自动先计算它依赖的中间结果
+（幅度谱、梅尔频谱、起音强度等）。所有结果都缓存在对象内，同一段音频的后续访问直接复用。
+
+    features = processor.features(y, sr)
+    features['chroma']       # 只计算幅度谱和色度
+    features['tempo']        # 复用幅度谱，再计算梅尔频谱、起音强度和节拍
+"""
+
+import time
+from collections.abc import Mapping
+import numpy as np
+import librosa
+from ..utils import key_detection
+
+# analyze_harmony 使用的主音名称
+KEY_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# 特征名 -> 计算函数；一个函数可以同时产出多个特征
+_COMPUTERS = {}
+
+# 旧版 extract_features 返回的特征
+DEFAULT_FEATURES = (
+    'mel_spectrogram', 'chroma', 'zero_crossing_rate', 'spectral_centroid', 'mfcc', 'onset_env',
+    'tempo', 'beat_times', 'f0', 'voiced_flag', 'voiced_probs'
+)
+
+# analyze_rhythm 和 analyze_harmony 默认返回的特征
+RHYTHM_FEATURES = (
+    'tempo', 'beat_times', 'beat_frames', 'onset_env', 'pulse', 'rhythm_pattern',
+    'periodicity', 'periodicity_bpm', 'tempogram'
+)
+HARMONY_FEATURES = ('chroma', 'chroma_avg', 'key_strengths', 'estimated_key', 'estimated_mode')
+
+
+def _feature(*names):
+    """注册计算函数，函数返回值与 names 一一对应（只有一个名称时直接返回该值）"""
+    def register(function):
+        for name in names:
+            _COMPUTERS[name] = (function, names)
+        return function
+    return register
+
+
+@_feature('stft')
+def _stft(features):
+    return np.abs(librosa.stft(features.y, n_fft=features.n_fft, hop_length=features.hop_length))
+
+
+@_feature('power_spectrogram')
+def _power_spectrogram(features):
+    return features['stft'] ** 2
+
+
+@_feature('mel_spectrogram')
+def _mel_spectrogram(features):
+    return librosa.feature.melspectrogram(S=features['power_spectrogram'], sr=features.sr)
+
+
+@_feature('mel_db')
+def _mel_db(features):
+    return librosa.power_to_db(features['mel_spectrogram'])
+
+
+@_feature('chroma')
+def _chroma(features):
+    return librosa.feature.chroma_stft(S=features['power_spectrogram'], sr=features.sr)
+
+
+@_feature('zero_crossing_rate')
+def _zero_crossing_rate(features):
+    return librosa.feature.zero_crossing_rate(features.y, hop_length=features.hop_length)
+
+
+@_feature('spectral_centroid')
+def _spectral_centroid(features):
+    return librosa.feature.spectral_centroid(S=features['stft'], sr=features.sr)
+
+
+@_feature('mfcc')
+def _mfcc(features):
+    return librosa.feature.mfcc(S=features['mel_db'], sr=features.sr, n_mfcc=13)
+
+
+@_feature('onset_env')
+def _onset_env(features):
+    # 帧对齐（center 时的补齐长度）取决于 n_fft 和 hop_length，必须与分析参数一致
+    return librosa.onset.onset_strength(S=features['mel_db'], sr=features.sr, n_fft=features.n_fft,
+                                        hop_length=features.hop_length)
+
+
+@_feature('tempo', 'beat_frames')
+def _beats(features):
+    return librosa.beat.beat_track(onset_envelope=features['onset_env'], sr=features.sr,
+                                   hop_length=features.hop_length)
+
+
+@_feature('beat_times')
+def _beat_times(features):
+    return librosa.frames_to_time(features['beat_frames'], sr=features.sr, hop_length=features.hop_length)
+
+
+@_feature('pulse')
+def _pulse(features):
+    return librosa.beat.plp(onset_envelope=features['onset_env'], sr=features.sr, hop_length=features.hop_length)
+
+
+@_feature('rhythm_pattern')
+def _rhythm_pattern(features):
+    # 起音强度的自相关，用 FFT 计算 (O(n log n))，只保留 max_lag 以内的延迟
+    onset_env = features['onset_env']
+    max_size = None
+    if features.max_lag is not None:
+        max_size = min(len(onset_env), int(features.max_lag * features.sr / features.hop_length) + 1)
+    return librosa.autocorrelate(onset_env, max_size=max_size)
+
+
+@_feature('periodicity')
+def _periodicity(features):
+    # 按零延迟归一化的自相关，取值范围 [-1, 1]
+    rhythm_pattern = features['rhythm_pattern']
+    if len(rhythm_pattern) == 0 or rhythm_pattern[0] <= 0:
+        return np.zeros_like(rhythm_pattern)
+    return rhythm_pattern / rhythm_pattern[0]
+
+
+@_feature('periodicity_bpm')
+def _periodicity_bpm(features):
+    # periodicity 每个延迟对应的速度 (BPM)，零延迟为 inf
+    return librosa.tempo_frequencies(len(features['rhythm_pattern']), sr=features.sr, hop_length=features.hop_length)
+
+
+@_feature('tempogram')
+def _tempogram(features):
+    # 局部自相关速度图，形状为 (延迟数, 帧数)，窗口与 max_lag 一致
+    onset_env = features['onset_env']
+    win_length = 384
+    if features.max_lag is not None:
+        win_length = max(2, int(features.max_lag * features.sr / features.hop_length) + 1)
+    return librosa.feature.tempogram(onset_envelope=onset_env, sr=features.sr, hop_length=features.hop_length,
+                                     win_length=win_length)
+
+
+@_feature('chroma_avg')
+def _chroma_avg(features):
+    return np.mean(features['chroma'], axis=1)
+
+
+@_feature('key_strengths')
+def _key_strengths(features):
+    # 每帧色度与 24 个调性轮廓的相关系数，形状为 (24, 帧数)
+    return key_detection.key_correlations(features['chroma'].T).T
+
+
+@_feature('estimated_key', 'estimated_mode')
+def _estimated_key(features):
+    key_index = int(np.argmax(np.mean(features['key_strengths'], axis=1)))
+    return KEY_NAMES[key_index % 12], 'major' if key_index < 12 else 'minor'
+
+
+@_feature('f0', 'voiced_flag', 'voiced_probs')
+def _pitch(features):
+    pitch = features.processor.track_pitch(features.y, features.sr, method=features.pitch_method)
+    return pitch['f0'], pitch['voiced_flag'], pitch['voiced_probs']
+
+
+FEATURE_NAMES = tuple(_COMPUTERS)
+
+
+class AudioFeatures(Mapping):
+    """按需计算并缓存一段音频的特征"""
+
+    def __init__(self, processor, y, sr, pitch_method='pyin'):
+        """初始化
+
+        Args:
+            processor (AudioProcessor): 提供 n_fft、hop_length 和音高跟踪的音频处理器
+            y (ndarray): 音频数据
+            sr (int): 采样率
+            pitch_method (str): f0 使用的音高跟踪方法，'pyin' 或 'yin'
+        """
+        self.processor = processor
+        self.y = y
+        self.sr = sr
+        self.n_fft = processor.n_fft
+        self.hop_length = processor.hop_length
+        self.max_lag = processor.max_lag
+        self.pitch_method = pitch_method
+        self._values = {}
+        # 每个计算函数的耗时（秒），以其产出的第一个特征命名
+        self.timings = {}
+        self._nested = []
+
+    def __getitem__(self, name):
+        if name in self._values:
+            return self._values[name]
+        if name not in _COMPUTERS:
+            raise KeyError(name)
+
+        function, names = _COMPUTERS[name]
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            result = function(self)
+        finally:
+            dependency_time = self._nested.pop()
+        elapsed = time.perf_counter() - start
+
+        # 只记录本函数自身的耗时，依赖项的耗时计入它们各自的条目
+        self.timings[names[0]] = elapsed - dependency_time
+        if self._nested:
+            self._nested[-1] += elapsed
+
+        if len(names) == 1:
+            self._values[name] = result
+        else:
+            self._values.update(zip(names, result))
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(FEATURE_NAMES)
+
+    def __len__(self):
+        return len(FEATURE_NAMES)
+
+    def __contains__(self, name):
+        return name in _COMPUTERS
+
+    def is_computed(self, name):
+        """特征是否已经计算过"""
+        return name in self._values
+
+    def select(self, names):
+        """计算并返回指定的特征
+
+        Args:
+            names (iterable): 特征名列表
+
+        Returns:
+            dict: 特征名 -> 特征值
+        """
+        return {name: self[name] for name in names}
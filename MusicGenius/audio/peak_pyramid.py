@@ -0,0 +1,258 @@
+"""
+波形峰值金字塔
+
+为音频文件预先计算多分辨率的波形摘要，网页播放器按缩放级别只取需要的一层，
+不再下载和解码整段音频：
+- 第 0 层每 base 个样本一组，记录最小值、最大值和 RMS
+- 之后每层把上一层相邻两组合并，分辨率减半，直到不超过 min_peaks 组
+
+附属文件与音频文件放在一起（<音频文件>.peaks），数值量化为 int16 或 int8。
+读取时通过 mmap 只映射请求的那一层的一段。
+
+文件格式（整数均为小端）：
+    magic (4字节 'MGPK') | version (uint32) | sr (uint32) | base (uint32) | bits (uint32)
+    | levels (uint32) | samples (uint64)
+    层表：levels 组 (offset, count)，均为 uint64
+    数据区：每层 count 组 (min, max, rms)，类型为 int8 或 int16
+"""
+
+import os
+import mmap
+import struct
+import tempfile
+import numpy as np
+import soundfile as sf
+from . import audio_loader
+
+PEAKS_MAGIC = b'MGPK'
+PEAKS_VERSION = 1
+PEAKS_EXTENSION = '.peaks'
+
+_HEADER = struct.Struct('<4sIIIIIQ')
+_LEVEL = struct.Struct('<QQ')
+_DTYPES = {8: np.dtype('<i1'), 16: np.dtype('<i2')}
+
+
+def peaks_path(audio_path):
+    """获取音频文件对应的峰值附属文件路径"""
+    return audio_path + PEAKS_EXTENSION
+
+
+def _block_peaks(y, base):
+    """计算一段单声道音频的第 0 层峰值，返回 (组数, 3) 的 float32 数组"""
+    starts = np.arange(0, len(y), base)
+    counts = np.diff(np.append(starts, len(y)))
+    peaks = np.empty((len(starts), 3), dtype=np.float32)
+    peaks[:, 0] = np.minimum.reduceat(y, starts)
+    peaks[:, 1] = np.maximum.reduceat(y, starts)
+    peaks[:, 2] = np.sqrt(np.add.reduceat(y.astype(np.float64) ** 2, starts) / counts)
+    return peaks
+
+
+def _next_level(peaks):
+    """把相邻两组合并为一组"""
+    n = len(peaks) // 2 * 2
+    pairs = peaks[:n].reshape(-1, 2, 3)
+    merged = np.empty((n // 2, 3), dtype=np.float32)
+    merged[:, 0] = pairs[:, :, 0].min(axis=1)
+    merged[:, 1] = pairs[:, :, 1].max(axis=1)
+    merged[:, 2] = np.sqrt((pairs[:, :, 2] ** 2).mean(axis=1))
+    if len(peaks) % 2:
+        merged = np.vstack([merged, peaks[-1:]])
+    return merged
+
+
+def build_peak_pyramid(level0, min_peaks=64):
+    """由第 0 层逐层合并，构建峰值金字塔
+
+    Args:
+        level0 (ndarray): 第 0 层峰值，形状为 (组数, 3)
+        min_peaks (int): 最粗一层的最大组数
+
+    Returns:
+        list: 各层峰值数组，分辨率依次减半
+    """
+    levels = [level0]
+    while len(levels[-1]) > min_peaks:
+        levels.append(_next_level(levels[-1]))
+    return levels
+
+
+def _read_level0(audio_path, base, block_peaks=4096):
+    """分块读取音频文件并计算第 0 层峰值，峰值内存与音频时长无关"""
+    try:
+        with sf.SoundFile(audio_path) as f:
+            sr = f.samplerate
+            samples = f.frames
+            parts = [
+                _block_peaks(block.mean(axis=1), base)
+                for block in f.blocks(blocksize=base * block_peaks, dtype='float32', always_2d=True)
+            ]
+    except RuntimeError:
+        # soundfile 无法解码的格式，整段读入
+        y, sr = audio_loader.load_audio(audio_path)
+        samples = len(y)
+        parts = [_block_peaks(y, base)]
+
+    level0 = np.vstack(parts) if parts else np.zeros((0, 3), dtype=np.float32)
+    return level0, sr, samples
+
+
+def write_peaks(audio_path, y=None, sr=None, base=256, bits=16, min_peaks=64):
+    """为音频文件生成峰值附属文件
+
+    Args:
+        audio_path (str): 音频文件路径
+        y (ndarray, optional): 已在内存中的音频数据（与文件内容一致），提供时不再读取文件；
+            多声道数据可以是 (声道数, 样本数) 或 (样本数, 声道数)
+        sr (int, optional): y 的采样率
+        base (int): 第 0 层每组的样本数
+        bits (int): 量化位数，16 或 8
+        min_peaks (int): 最粗一层的最大组数
+
+    Returns:
+        str: 附属文件路径
+    """
+    if bits not in _DTYPES:
+        raise ValueError(f"不支持的量化位数: {bits}")
+
+    if y is None:
+        level0, sr, samples = _read_level0(audio_path, base)
+    else:
+        y = np.asarray(y, dtype=np.float32)
+        if y.ndim > 1:
+            # 较短的一维为声道
+            y = y.mean(axis=0 if y.shape[0] < y.shape[1] else 1)
+        level0, samples = _block_peaks(y, base), len(y)
+
+    levels = build_peak_pyramid(level0, min_peaks)
+    dtype = _DTYPES[bits]
+    scale = np.iinfo(dtype).max
+
+    path = peaks_path(audio_path)
+    # 临时文件名唯一，多个请求同时生成同一个附属文件时互不干扰，最后一次替换生效
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                     dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, int(sr), base, bits, len(levels), samples))
+
+            offset = _HEADER.size + _LEVEL.size * len(levels)
+            for level in levels:
+                out.write(_LEVEL.pack(offset, len(level)))
+                offset += len(level) * 3 * dtype.itemsize
+
+            for level in levels:
+                out.write(np.clip(np.round(level * scale), -scale, scale).astype(dtype).tobytes())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    return path
+
+
+def ensure_peaks(audio_path, **kwargs):
+    """获取音频文件的峰值金字塔，附属文件不存在或比音频文件旧时重新生成
+
+    Args:
+        audio_path (str): 音频文件路径
+        **kwargs: 传给 write_peaks 的参数
+
+    Returns:
+        PeakPyramid: 峰值金字塔
+    """
+    path = peaks_path(audio_path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(audio_path):
+        write_peaks(audio_path, **kwargs)
+    return PeakPyramid(path)
+
+
+class PeakPyramid:
+    """通过 mmap 读取的峰值金字塔附属文件"""
+
+    def __init__(self, path):
+        """打开附属文件
+
+        Args:
+            path (str): 附属文件路径
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            magic, version, self.sr, self.base, self.bits, n_levels, self.samples = _HEADER.unpack(header)
+            if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+                raise ValueError(f"{path} 不是有效的峰值文件")
+            table = f.read(_LEVEL.size * n_levels)
+
+        self.levels = [_LEVEL.unpack_from(table, i * _LEVEL.size) for i in range(n_levels)]
+        self.dtype = _DTYPES[self.bits]
+        self.scale = np.iinfo(self.dtype).max
+
+    @property
+    def duration(self):
+        """音频时长（秒）"""
+        return self.samples / self.sr if self.sr else 0.0
+
+    def samples_per_peak(self, level):
+        """某一层每组对应的样本数"""
+        return self.base << level
+
+    def level_for(self, samples_per_pixel):
+        """选择每组样本数不超过 samples_per_pixel 的最粗一层"""
+        level = int(np.floor(np.log2(max(samples_per_pixel, self.base) / self.base)))
+        return min(max(level, 0), len(self.levels) - 1)
+
+    def get(self, level, start=0, stop=None):
+        """读取一层中的一段峰值
+
+        Args:
+            level (int): 层号
+            start (int): 起始组
+            stop (int, optional): 结束组（不含）
+
+        Returns:
+            ndarray: (组数, 3) 的整数数组，列依次为最小值、最大值、RMS
+        """
+        offset, count = self.levels[level]
+        stop = count if stop is None else min(stop, count)
+        start = min(max(start, 0), stop)
+
+        itemsize = 3 * self.dtype.itemsize
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                begin = offset + start * itemsize
+                return np.frombuffer(mm[begin:offset + stop * itemsize], dtype=self.dtype).reshape(-1, 3).copy()
+
+    def select(self, width, start=0.0, end=None):
+        """按显示宽度和时间范围选取合适的一层
+
+        Args:
+            width (int): 显示宽度（像素）
+            start (float): 起始时间（秒）
+            end (float, optional): 结束时间（秒），默认为音频末尾
+
+        Returns:
+            dict: 包含 sr、level、samples_per_peak、start、end、scale 以及 min、max、rms 整数列表
+        """
+        end = self.duration if end is None else min(end, self.duration)
+        start = min(max(start, 0.0), end)
+        span = max(end - start, 0.0) * self.sr
+
+        level = self.level_for(span / max(width, 1))
+        per_peak = self.samples_per_peak(level)
+        first = int(start * self.sr // per_peak)
+        last = int(np.ceil(end * self.sr / per_peak))
+        peaks = self.get(level, first, last)
+
+        return {
+            'sr': self.sr,
+            'level': level,
+            'samples_per_peak': per_peak,
+            'start': first * per_peak / self.sr,
+            'end': min(last * per_peak, self.samples) / self.sr,
+            'scale': int(self.scale),
+            'min': peaks[:, 0].tolist(),
+            'max': peaks[:, 1].tolist(),
+            'rms': peaks[:, 2].tolist()
+        }
@@ -0,0 +1,221 @@
+"""
+无界面图表渲染
+
+每次调用都创建独立的 Figure 对象并用 Agg 后端渲染为 PNG 字节，不使用 pyplot 的全局状态，
+可以在 Flask 的多个请求线程中并发调用。
+
+绘图前先把数据降采样到图像像素分辨率：
+- 波形按像素宽度分箱，绘制每箱的最小/最大值包络
+- 频谱图按时间分箱取最大值，按对数频率分带取最大值
+绘制的元素数量只取决于图像尺寸，与音频时长无关。
+"""
+
+import io
+import numpy as np
+import librosa
+import librosa.display
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+DEFAULT_DPI = 100
+
+
+def _bin_edges(n, n_bins):
+    """把长度 n 均分为最多 n_bins 个区间，返回区间起点（含终点 n）"""
+    return np.unique(np.linspace(0, n, min(n, n_bins) + 1).astype(int))
+
+
+def pool(x, n_bins, reduce='max'):
+    """沿最后一维分箱降采样
+
+    Args:
+        x (ndarray): 输入数组
+        n_bins (int): 最多保留的箱数
+        reduce (str): 'max'、'min' 或 'mean'（mean 会忽略 NaN）
+
+    Returns:
+        tuple: (区间边界索引, 降采样后的数组)
+    """
+    edges = _bin_edges(x.shape[-1], n_bins)
+    if len(edges) < 2:
+        return edges, x[..., :0]
+    starts = edges[:-1]
+
+    if reduce == 'max':
+        return edges, np.maximum.reduceat(x, starts, axis=-1)
+    if reduce == 'min':
+        return edges, np.minimum.reduceat(x, starts, axis=-1)
+
+    finite = np.isfinite(x)
+    sums = np.add.reduceat(np.where(finite, x, 0.0), starts, axis=-1)
+    counts = np.add.reduceat(finite, starts, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return edges, np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def waveform_envelope(y, n_bins):
+    """计算波形的最小/最大值包络
+
+    Args:
+        y (ndarray): 音频数据
+        n_bins (int): 箱数（通常为像素宽度）
+
+    Returns:
+        tuple: (区间边界的样本索引, 每箱最小值, 每箱最大值)
+    """
+    edges, mins = pool(y, n_bins, 'min')
+    _, maxs = pool(y, n_bins, 'max')
+    return edges, mins, maxs
+
+
+def _new_figure(width, height, dpi):
+    """创建独立于 pyplot 的 Agg 图形"""
+    figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _to_png(figure):
+    """把图形渲染为 PNG 字节"""
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def _draw_waveform(ax, y, sr, n_bins):
+    edges, mins, maxs = waveform_envelope(y, n_bins)
+    # 每箱在起点和终点各取一次，画成阶梯状的包络
+    times = np.repeat(edges / sr, 2)[1:-1]
+    ax.fill_between(times, np.repeat(mins, 2), np.repeat(maxs, 2), linewidth=0, color='#1f77b4')
+    ax.set_xlim(0, len(y) / sr)
+    ax.set_xlabel('Time (s)')
+
+
+def _draw_spectrogram(ax, S, sr, hop_length, n_fft, n_cols, n_rows):
+    """把幅度谱降采样到 n_cols × n_rows 后以对数频率轴绘制，返回图像对象"""
+    frame_edges, S = pool(S, n_cols, 'max')
+
+    # 按对数间隔的频带分组（低频的每个频点单独成带）
+    n_freqs = S.shape[0]
+    band_edges = np.unique(np.concatenate([[0], np.geomspace(1, n_freqs, n_rows).astype(int)]))
+    S = np.maximum.reduceat(S, band_edges[:-1], axis=0)
+    band_edges[-1] = n_freqs - 1
+
+    D = librosa.amplitude_to_db(S, ref=np.max)
+    return librosa.display.specshow(
+        D, ax=ax, sr=sr, hop_length=hop_length,
+        x_coords=librosa.frames_to_time(frame_edges, sr=sr, hop_length=hop_length),
+        y_coords=band_edges * sr / n_fft,
+        x_axis='time', y_axis='log'
+    )
+
+
+def render_waveform(y, sr, title='Waveform', width=1200, height=400, dpi=DEFAULT_DPI):
+    """渲染波形图
+
+    Args:
+        y (ndarray): 音频数据
+        sr (int): 采样率
+        title (str): 图表标题
+        width (int): 图像宽度（像素）
+        height (int): 图像高度（像素）
+        dpi (int): 分辨率
+
+    Returns:
+        bytes: PNG 图像
+    """
+    figure = _new_figure(width, height, dpi)
+    ax = figure.add_subplot(1, 1, 1)
+    _draw_waveform(ax, y, sr, width)
+    ax.set_title(title)
+    return _to_png(figure)
+
+
+def render_spectrogram(S, sr, hop_length=512, title='Spectrogram', width=1200, height=400, dpi=DEFAULT_DPI):
+    """渲染对数频率轴的频谱图
+
+    Args:
+        S (ndarray): 幅度谱，形状为 (1 + n_fft // 2, 帧数)
+        sr (int): 采样率
+        hop_length (int): 帧移
+        title (str): 图表标题
+        width (int): 图像宽度（像素）
+        height (int): 图像高度（像素）
+        dpi (int): 分辨率
+
+    Returns:
+        bytes: PNG 图像
+    """
+    figure = _new_figure(width, height, dpi)
+    ax = figure.add_subplot(1, 1, 1)
+    image = _draw_spectrogram(ax, S, sr, hop_length, 2 * (S.shape[0] - 1), width, height)
+    figure.colorbar(image, ax=ax, format='%+2.0f dB')
+    ax.set_title(title)
+    return _to_png(figure)
+
+
+def render_features(features, sr, hop_length=512, title_prefix='', width=1200, height=800, dpi=DEFAULT_DPI):
+    """渲染特征总览图（梅尔频谱、色度、MFCC、频谱质心、过零率、F0）
+
+    Args:
+        features (Mapping): 特征名 -> 特征值，需包含上述六个特征
+        sr (int): 采样率
+        hop_length (int): 帧移
+        title_prefix (str): 标题前缀
+        width (int): 图像宽度（像素）
+        height (int): 图像高度（像素）
+        dpi (int): 分辨率
+
+    Returns:
+        bytes: PNG 图像
+    """
+    figure = _new_figure(width, height, dpi)
+    n_cols = width // 2
+
+    def frame_times(edges):
+        # 每箱中心的时间，与自动生成的另一轴坐标一样按中心对齐
+        return librosa.frames_to_time((edges[:-1] + edges[1:]) / 2, sr=sr, hop_length=hop_length)
+
+    # 梅尔频谱
+    ax = figure.add_subplot(3, 2, 1)
+    edges, mel = pool(features['mel_spectrogram'], n_cols, 'max')
+    image = librosa.display.specshow(librosa.power_to_db(mel, ref=np.max), ax=ax, sr=sr,
+                                     x_coords=frame_times(edges), y_axis='mel', x_axis='time')
+    ax.set_title(f'{title_prefix}Mel Spectrogram')
+    figure.colorbar(image, ax=ax, format='%+2.0f dB')
+
+    # 色度图
+    ax = figure.add_subplot(3, 2, 2)
+    edges, chroma = pool(features['chroma'], n_cols, 'mean')
+    image = librosa.display.specshow(chroma, ax=ax, x_coords=frame_times(edges), y_axis='chroma', x_axis='time')
+    ax.set_title(f'{title_prefix}Chromagram')
+    figure.colorbar(image, ax=ax)
+
+    # MFCC
+    ax = figure.add_subplot(3, 2, 3)
+    edges, mfcc = pool(features['mfcc'], n_cols, 'mean')
+    image = librosa.display.specshow(mfcc, ax=ax, x_coords=frame_times(edges), x_axis='time')
+    ax.set_title(f'{title_prefix}MFCC')
+    figure.colorbar(image, ax=ax)
+
+    # 频谱质心、过零率和 F0 按箱取均值后画折线
+    for index, (name, title, ylabel) in enumerate([
+        ('spectral_centroid', 'Spectral Centroid', 'Hz'),
+        ('zero_crossing_rate', 'Zero Crossing Rate', None),
+        ('f0', 'F0 Frequency', 'Hz')
+    ]):
+        ax = figure.add_subplot(3, 2, 4 + index)
+        values = np.asarray(features[name], dtype=float).reshape(-1)
+        edges, pooled = pool(values, n_cols, 'mean')
+        times = frame_times(edges)
+        if name == 'spectral_centroid':
+            ax.semilogy(times, pooled)
+        else:
+            ax.plot(times, pooled)
+        ax.set_title(f'{title_prefix}{title}')
+        ax.set_xlabel('Time (s)')
+        if ylabel:
+            ax.set_ylabel(ylabel)
+
+    return _to_png(figure)
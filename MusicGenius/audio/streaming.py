@@ -0,0 +1,195 @@
+"""
+流式音频分析
+
+用 librosa.stream 按固定大小的块读取音频，每块计算幅度谱后只更新累计统计量
+（色度均值、频谱质心、RMS、起音强度、速度直方图），不保留整段音频或逐帧特征，
+峰值内存与音频时长无关。
+
+块之间按 n_fft/hop_length 重叠，拼接起来的帧与整段计算（center=False）的帧一致；
+速度在固定长度的起音强度窗口上逐窗估计，再汇总为速度直方图。
+"""
+
+import time
+import numpy as np
+import librosa
+import soundfile as sf
+from ..utils import key_detection
+from .features import KEY_NAMES
+
+# 速度直方图的范围和分辨率 (BPM)
+TEMPO_BINS = np.arange(30, 301)
+
+
+class StreamingAnalyzer:
+    """累计统计量的流式分析器"""
+
+    def __init__(self, sr, n_fft=2048, hop_length=512, tempo_window=8.0, tempo_hop=4.0):
+        """初始化
+
+        Args:
+            sr (int): 采样率
+            n_fft (int): FFT窗口大小
+            hop_length (int): 帧移
+            tempo_window (float): 估计速度的窗口长度（秒）
+            tempo_hop (float): 速度窗口的步长（秒）
+        """
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.window_frames = max(1, int(round(tempo_window * sr / hop_length)))
+        self.hop_frames = max(1, int(round(tempo_hop * sr / hop_length)))
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+
+        self.frames = 0
+        self.tuning = None
+        self.chroma_sum = np.zeros(12)
+        self.centroid_sum = 0.0
+        self.centroid_square_sum = 0.0
+        self.rms_square_sum = 0.0
+        self.rms_peak = 0.0
+        self.onset_sum = 0.0
+        self.onset_max = 0.0
+        self.tempo_histogram = np.zeros(len(TEMPO_BINS))
+
+        self._previous_mel_db = None
+        self._onset_buffer = np.zeros(0)
+
+    def update(self, y_block):
+        """处理一个音频块
+
+        Args:
+            y_block (ndarray): 单声道音频块
+        """
+        if len(y_block) < self.n_fft:
+            y_block = np.pad(y_block, (0, self.n_fft - len(y_block)))
+
+        S = np.abs(librosa.stft(y_block, n_fft=self.n_fft, hop_length=self.hop_length, center=False))
+        power = S ** 2
+        n_frames = S.shape[1]
+        self.frames += n_frames
+
+        # 色度：调音偏差只在第一块上估计，之后保持一致
+        if self.tuning is None:
+            self.tuning = float(librosa.estimate_tuning(S=power, sr=self.sr, n_fft=self.n_fft))
+        chroma = librosa.feature.chroma_stft(S=power, sr=self.sr, tuning=self.tuning)
+        self.chroma_sum += chroma.sum(axis=1)
+
+        # 频谱质心
+        centroid = librosa.feature.spectral_centroid(S=S, sr=self.sr)[0]
+        self.centroid_sum += centroid.sum()
+        self.centroid_square_sum += (centroid ** 2).sum()
+
+        # RMS（与 librosa.feature.rms(S=...) 的帧能量一致）
+        rms = librosa.feature.rms(S=S, frame_length=self.n_fft)[0]
+        self.rms_square_sum += (rms ** 2).sum()
+        self.rms_peak = max(self.rms_peak, float(rms.max()))
+
+        # 起音强度：与上一块最后一帧衔接，保证块边界处的差分连续
+        mel_db = librosa.power_to_db(self.mel_basis @ power)
+        if self._previous_mel_db is None:
+            previous = mel_db[:, :1]
+        else:
+            previous = self._previous_mel_db
+        onset = np.maximum(0.0, np.diff(np.concatenate([previous, mel_db], axis=1), axis=1)).mean(axis=0)
+        self._previous_mel_db = mel_db[:, -1:]
+
+        self.onset_sum += onset.sum()
+        self.onset_max = max(self.onset_max, float(onset.max()))
+        self._update_tempo(onset)
+
+    def _update_tempo(self, onset):
+        """把起音强度加入窗口缓冲区，每凑满一个窗口估计一次速度"""
+        self._onset_buffer = np.concatenate([self._onset_buffer, onset])
+        while len(self._onset_buffer) >= self.window_frames:
+            self._add_tempo_estimate(self._onset_buffer[:self.window_frames])
+            self._onset_buffer = self._onset_buffer[self.hop_frames:]
+
+    def _add_tempo_estimate(self, onset_window):
+        """估计一个窗口的速度并计入直方图"""
+        if not np.any(onset_window > 0):
+            return
+        tempo = float(librosa.beat.tempo(onset_envelope=onset_window, sr=self.sr, hop_length=self.hop_length)[0])
+        index = int(np.clip(np.round(tempo) - TEMPO_BINS[0], 0, len(TEMPO_BINS) - 1))
+        self.tempo_histogram[index] += 1
+
+    def result(self):
+        """汇总分析结果
+
+        Returns:
+            dict: 与 analyze_audio 相同的 rhythm、harmony、tempo、estimated_key、estimated_mode 字段，
+                以及 summary 中的整体统计量
+        """
+        # 音频短于一个速度窗口时，用剩余的起音强度估计一次
+        if not self.tempo_histogram.any() and len(self._onset_buffer):
+            self._add_tempo_estimate(self._onset_buffer)
+
+        frames = max(self.frames, 1)
+        tempo = float(TEMPO_BINS[np.argmax(self.tempo_histogram)]) if self.tempo_histogram.any() else 0.0
+
+        chroma_avg = self.chroma_sum / frames
+        key_strengths = key_detection.key_correlations(chroma_avg)
+        key_index = int(np.argmax(key_strengths))
+
+        centroid_mean = float(self.centroid_sum / frames)
+        centroid_variance = max(self.centroid_square_sum / frames - centroid_mean ** 2, 0.0)
+
+        rhythm = {
+            'tempo': tempo,
+            'tempo_histogram': (TEMPO_BINS.copy(), self.tempo_histogram.copy()),
+            'onset_mean': self.onset_sum / frames,
+            'onset_max': self.onset_max
+        }
+        harmony = {
+            'chroma_avg': chroma_avg,
+            'key_strengths': key_strengths,
+            'estimated_key': KEY_NAMES[key_index % 12],
+            'estimated_mode': 'major' if key_index < 12 else 'minor'
+        }
+
+        return {
+            'rhythm': rhythm,
+            'harmony': harmony,
+            'tempo': tempo,
+            'estimated_key': harmony['estimated_key'],
+            'estimated_mode': harmony['estimated_mode'],
+            'summary': {
+                'sr': self.sr,
+                'frames': self.frames,
+                'duration': self.frames * self.hop_length / self.sr,
+                'spectral_centroid_mean': centroid_mean,
+                'spectral_centroid_std': float(np.sqrt(centroid_variance)),
+                'rms_mean': float(np.sqrt(self.rms_square_sum / frames)),
+                'rms_peak': self.rms_peak
+            }
+        }
+
+
+def analyze_stream(file_path, n_fft=2048, hop_length=512, block_length=256, tempo_window=8.0, tempo_hop=4.0):
+    """流式分析音频文件
+
+    在文件的原始采样率下计算（流式读取不做重采样）。
+
+    Args:
+        file_path (str): 音频文件路径
+        n_fft (int): FFT窗口大小
+        hop_length (int): 帧移
+        block_length (int): 每块包含的帧数
+        tempo_window (float): 估计速度的窗口长度（秒）
+        tempo_hop (float): 速度窗口的步长（秒）
+
+    Returns:
+        dict: 分析结果，见 StreamingAnalyzer.result，timings 中为总耗时
+    """
+    start = time.perf_counter()
+    sr = sf.info(file_path).samplerate
+    analyzer = StreamingAnalyzer(sr, n_fft=n_fft, hop_length=hop_length,
+                                 tempo_window=tempo_window, tempo_hop=tempo_hop)
+
+    blocks = librosa.stream(file_path, block_length=block_length, frame_length=n_fft,
+                            hop_length=hop_length, mono=True, fill_value=0)
+    for y_block in blocks:
+        analyzer.update(y_block)
+
+    result = analyzer.result()
+    result['timings'] = {'total': time.perf_counter() - start}
+    return result
@@ -0,0 +1,384 @@
+"""
+MusicGenius - 批量音频分析
+
+用进程池批量分析音频文件（或曲库中的全部曲目），每首输出一份特征摘要。
+摘要只包含分析配置选中的特征（例如 fast 配置不计算频谱质心、过零率和 MFCC）：
+1. 工作进程在启动时创建音频处理器并在一小段噪声上预热一次，librosa 的惰性导入和
+   numba 的 JIT 编译只在每个进程中发生一次，之后的文件直接复用
+2. 每完成一首就把摘要追加到日志文件（<输出文件>.jsonl），中断后重新运行会跳过日志中已有的条目；
+   写入数据库时，摘要在所在批次写入数据库之后才追加到日志，日志中的条目一定已经写入数据库
+3. 全部完成后由日志生成按列存储的 npz 文件（每个摘要字段一列，某条记录缺少的字段为 NaN 或空字符串），
+   曲库曲目的摘要同时批量写入 tracks 表 features JSON 列的 audio 字段
+
+曲库中的MIDI曲目先用 pretty_midi 合成音频再分析。
+
+命令行用法:
+    python -m MusicGenius.core.audio_batch --files a.wav b.flac --output data/audio_features.npz
+    python -m MusicGenius.core.audio_batch --library --profile fast
+"""
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pretty_midi
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from ..audio import analysis_profiles
+from ..audio.analysis_session import AnalysisSession
+from ..utils import midi_utils
+
+DEFAULT_OUTPUT = os.path.join('data', 'audio_features.npz')
+
+# 摘要中的标量字段和向量字段（向量字段在 npz 中为二维列）
+SCALAR_COLUMNS = (
+    'duration', 'tempo', 'spectral_centroid_mean', 'zero_crossing_rate_mean', 'onset_strength_mean'
+)
+TEXT_COLUMNS = ('estimated_key', 'estimated_mode')
+VECTOR_COLUMNS = {'chroma_avg': 12, 'mfcc_mean': 13}
+
+# 摘要字段 -> 所需的特征；配置选中该特征时摘要才包含这个字段（duration 总是包含）
+SUMMARY_SOURCES = {
+    'tempo': 'tempo',
+    'estimated_key': 'estimated_key',
+    'estimated_mode': 'estimated_mode',
+    'spectral_centroid_mean': 'spectral_centroid',
+    'zero_crossing_rate_mean': 'zero_crossing_rate',
+    'onset_strength_mean': 'onset_env',
+    'chroma_avg': 'chroma_avg',
+    'mfcc_mean': 'mfcc'
+}
+
+# 工作进程内的分析配置、摘要字段和音频处理器，由 _init_worker 创建
+_worker_profile = None
+_worker_fields = None
+_worker_processor = None
+
+
+def summary_fields(profile):
+    """获取分析配置对应的摘要字段
+
+    Args:
+        profile (str | dict): 配置名称或配置字典
+
+    Returns:
+        tuple: 摘要字段名
+    """
+    profile = analysis_profiles.get_profile(profile)
+    selected = set(profile['features']) | set(profile['rhythm']) | set(profile['harmony'])
+    return ('duration',) + tuple(field for field, source in SUMMARY_SOURCES.items() if source in selected)
+
+
+def _init_worker(profile):
+    """工作进程初始化：创建音频处理器并预热"""
+    global _worker_profile, _worker_fields, _worker_processor
+    _worker_profile = analysis_profiles.get_profile(profile)
+    _worker_fields = summary_fields(_worker_profile)
+    _worker_processor = analysis_profiles.create_processor(_worker_profile)
+
+    # 在一秒噪声上完整运行一次，触发 numba 编译和各模块的惰性导入
+    sr = _worker_processor.sr
+    y = (0.1 * np.random.default_rng(0).standard_normal(sr)).astype(np.float32)
+    summarize(AnalysisSession(_worker_processor, y=y, sr=sr, pitch_method=_worker_profile['pitch_method']),
+              _worker_fields)
+
+
+def _tempo(features):
+    tempo = np.atleast_1d(features['tempo'])
+    return float(tempo[0]) if len(tempo) else 0.0
+
+
+# 摘要字段 -> 由会话计算该字段的函数
+_SUMMARIZERS = {
+    'duration': lambda session: float(len(session.y) / session.sr),
+    'tempo': lambda session: _tempo(session.features),
+    'estimated_key': lambda session: session.features['estimated_key'],
+    'estimated_mode': lambda session: session.features['estimated_mode'],
+    'spectral_centroid_mean': lambda session: float(np.mean(session.features['spectral_centroid'])),
+    'zero_crossing_rate_mean': lambda session: float(np.mean(session.features['zero_crossing_rate'])),
+    'onset_strength_mean': lambda session: float(np.mean(session.features['onset_env'])),
+    'chroma_avg': lambda session: [float(value) for value in session.features['chroma_avg']],
+    'mfcc_mean': lambda session: [float(value) for value in np.mean(session.features['mfcc'], axis=1)]
+}
+
+
+def summarize(session, fields=None):
+    """由分析会话计算一首曲目的特征摘要，只计算所需字段依赖的特征
+
+    Args:
+        session (AnalysisSession): 分析会话
+        fields (iterable, optional): 摘要字段，默认为全部字段；通常由 summary_fields 按配置得到
+
+    Returns:
+        dict: 特征摘要（可直接序列化为JSON）
+    """
+    fields = _SUMMARIZERS if fields is None else fields
+    return {field: _SUMMARIZERS[field](session) for field in fields}
+
+
+def _load(filepath, sr):
+    """读取音频；MIDI文件先合成为音频"""
+    if filepath.lower().endswith(midi_utils.MIDI_EXTENSIONS):
+        return pretty_midi.PrettyMIDI(filepath).fluidsynth(fs=sr).astype(np.float32), sr
+    return _worker_processor.load_audio(filepath)
+
+
+def analyze_item(item):
+    """分析一个文件（在工作进程中执行）
+
+    Args:
+        item (tuple): (键, 文件路径)，键为曲目ID或文件路径
+
+    Returns:
+        tuple: (键, 文件路径, 摘要, 错误信息)，成功时错误信息为None
+    """
+    key, filepath = item
+    try:
+        y, sr = _load(filepath, _worker_processor.sr)
+        session = AnalysisSession(_worker_processor, filepath, y=y, sr=sr,
+                                  pitch_method=_worker_profile['pitch_method'])
+        return key, filepath, summarize(session, _worker_fields), None
+    except Exception as e:
+        return key, filepath, None, str(e) or type(e).__name__
+
+
+def _journal_path(output_path):
+    return output_path + '.jsonl'
+
+
+def _load_journal(output_path):
+    """读取日志: 键 -> 记录；忽略中断时写了一半的最后一行"""
+    records = {}
+    path = _journal_path(output_path)
+    if not os.path.exists(path):
+        return records
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[str(record['key'])] = record
+    return records
+
+
+def write_columns(records, output_path):
+    """把摘要记录按列写入 npz 文件
+
+    只写入至少一条记录包含的字段；记录缺少的字段（由不同配置分析）在数值列中为 NaN，
+    在文本列中为空字符串。
+
+    Args:
+        records (list): 日志记录列表，每条包含 key、filepath、summary
+        output_path (str): 输出文件路径
+    """
+    present = set()
+    for record in records:
+        present.update(record['summary'])
+
+    columns = {
+        'key': np.array([str(record['key']) for record in records], dtype=str),
+        'filepath': np.array([record['filepath'] for record in records], dtype=str)
+    }
+    for name in SCALAR_COLUMNS:
+        if name in present:
+            columns[name] = np.array([record['summary'].get(name, np.nan) for record in records], dtype=np.float64)
+    for name in TEXT_COLUMNS:
+        if name in present:
+            columns[name] = np.array([record['summary'].get(name, '') for record in records], dtype=str)
+    for name, size in VECTOR_COLUMNS.items():
+        if name in present:
+            columns[name] = np.array([record['summary'].get(name, [np.nan] * size) for record in records],
+                                     dtype=np.float32).reshape(-1, size)
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = output_path + '.tmp.npz'
+    np.savez(temp_path, **columns)
+    os.replace(temp_path, output_path)
+
+
+def load_columns(output_path):
+    """读取批量分析结果
+
+    Args:
+        output_path (str): npz 文件路径
+
+    Returns:
+        dict: 列名 -> ndarray，各列按行对齐
+    """
+    with np.load(output_path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _analyze_all(items, workers, profile):
+    """按完成顺序产出分析结果；进程池中的工作进程在整个批次中复用"""
+    if workers <= 1:
+        _init_worker(profile)
+        for item in items:
+            yield analyze_item(item)
+        return
+
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(profile,)) as executor:
+        pending = set()
+        for item in items:
+            pending.add(executor.submit(analyze_item, item))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        for future in pending:
+            yield future.result()
+
+
+def _commit_records(journal, records, pending, db):
+    """把一批记录写入数据库，成功后再追加到日志（写入失败的记录不进入日志，下次运行时重新分析）"""
+    if not pending:
+        return
+    batch = list(pending)
+    pending.clear()
+
+    if db is not None:
+        db.update_track_audio_features([(record['key'], record['summary']) for record in batch])
+
+    for record in batch:
+        journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+        records[str(record['key'])] = record
+    journal.flush()
+
+
+def analyze_batch(items, output_path=DEFAULT_OUTPUT, profile='fast', workers=None, db=None,
+                  batch_size=500, progress_callback=None):
+    """批量分析音频文件
+
+    日志中已有、且包含当前配置全部摘要字段的条目会被跳过（例如先用 fast 配置分析过的曲目，
+    改用 standard 配置时会重新分析）；写入数据库时键必须为曲目ID。中断（包括 Ctrl+C）时已分析的摘要
+    先写入数据库再记入日志，日志中的条目不会缺少数据库中的 audio 字段。
+
+    Args:
+        items (iterable): (键, 文件路径) 列表，键为曲目ID或任意唯一字符串
+        output_path (str): npz 输出文件路径
+        profile (str): 分析配置，见 audio.analysis_profiles
+        workers (int, optional): 分析进程数，默认为CPU核数；为1时在当前进程内分析
+        db (MusicDatabase, optional): 提供时把摘要批量写入曲目的 features 列
+        batch_size (int): 每批写入数据库的曲目数
+        progress_callback (callable, optional): 进度回调，参数为 (已处理数, 总数)
+
+    Returns:
+        dict: 分析报告，包含总数、分析数、跳过数、失败数、每个失败文件的错误信息和耗时
+    """
+    start_time = time.time()
+    records = _load_journal(output_path)
+    fields = set(summary_fields(profile))
+
+    pending_items = []
+    skipped = 0
+    for key, filepath in items:
+        record = records.get(str(key))
+        if record is not None and fields <= set(record['summary']):
+            skipped += 1
+        else:
+            pending_items.append((key, filepath))
+
+    report = {'total': len(pending_items) + skipped, 'analyzed': 0, 'skipped': skipped, 'failed': 0,
+              'errors': [], 'elapsed': 0.0}
+    workers = workers or os.cpu_count() or 1
+    progress_callback = progress_callback or (lambda processed, total: print(f"分析进度: {processed}/{total}"))
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # 不写数据库时每条记录立即记入日志
+    commit_size = batch_size if db is not None else 1
+    pending = []
+    processed = 0
+    with open(_journal_path(output_path), 'a', encoding='utf-8') as journal:
+        try:
+            for key, filepath, summary, error in _analyze_all(pending_items, workers, profile):
+                processed += 1
+                if error is not None:
+                    report['failed'] += 1
+                    report['errors'].append({'filepath': filepath, 'error': error})
+                else:
+                    pending.append({'key': key, 'filepath': filepath, 'summary': summary})
+                    report['analyzed'] += 1
+                    if len(pending) >= commit_size:
+                        _commit_records(journal, records, pending, db)
+
+                if processed % 50 == 0:
+                    progress_callback(processed, len(pending_items))
+        finally:
+            _commit_records(journal, records, pending, db)
+
+    if processed % 50:
+        progress_callback(processed, len(pending_items))
+
+    write_columns(sorted(records.values(), key=lambda record: str(record['key'])), output_path)
+    report['elapsed'] = time.time() - start_time
+    return report
+
+
+def analyze_library(db, output_path=DEFAULT_OUTPUT, track_ids=None, **kwargs):
+    """批量分析曲库中的曲目，并把摘要写入数据库
+
+    Args:
+        db (MusicDatabase): 音乐数据库
+        output_path (str): npz 输出文件路径
+        track_ids (list, optional): 曲目ID列表，默认为None（全部曲目）
+        **kwargs: 传给 analyze_batch 的其他参数
+
+    Returns:
+        dict: 分析报告
+    """
+    filepaths = db.get_track_filepaths(track_ids)
+    return analyze_batch(sorted(filepaths.items()), output_path, db=db, **kwargs)
+
+
+def main(argv=None):
+    """命令行入口：批量分析音频文件或曲库曲目"""
+    parser = argparse.ArgumentParser(description="批量分析音频文件，输出按列存储的特征摘要")
+    parser.add_argument('--files', type=str, nargs='*', help='音频文件路径')
+    parser.add_argument('--library', action='store_true', help='分析曲库中的曲目')
+    parser.add_argument('--track-ids', type=int, nargs='*', help='曲目ID，与 --library 一起使用，缺省时分析全部曲目')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT, help='npz 输出文件路径')
+    parser.add_argument('--profile', type=str, default='fast', choices=sorted(analysis_profiles.ANALYSIS_PROFILES),
+                        help='分析配置')
+    parser.add_argument('--workers', type=int, default=None, help='分析进程数')
+    parser.add_argument('--db_host', type=str, default='localhost', help='MySQL 服务器地址')
+    parser.add_argument('--db_user', type=str, default='root', help='MySQL 用户名')
+    parser.add_argument('--db_password', type=str, default='', help='MySQL 密码')
+    parser.add_argument('--db_name', type=str, default='music_genius', help='MySQL 数据库名')
+    parser.add_argument('--db_backend', type=str, default='mysql', choices=['mysql', 'sqlite'], help='存储后端')
+    parser.add_argument('--db_path', type=str, default=None, help='SQLite 数据库文件路径')
+    args = parser.parse_args(argv)
+
+    if not args.files and not args.library:
+        parser.error('需要指定 --files 或 --library')
+
+    if args.library:
+        from .music_database import MusicDatabase
+
+        db = MusicDatabase(host=args.db_host, user=args.db_user, password=args.db_password, database=args.db_name,
+                           backend=args.db_backend, path=args.db_path)
+        try:
+            report = analyze_library(db, args.output, track_ids=args.track_ids, profile=args.profile,
+                                     workers=args.workers)
+        finally:
+            db.close()
+    else:
+        report = analyze_batch([(filepath, filepath) for filepath in args.files], args.output,
+                               profile=args.profile, workers=args.workers)
+
+    for error in report['errors']:
+        print(f"分析 {error['filepath']} 时出错: {error['error']}")
+    print(f"完成: 分析 {report['analyzed']}，跳过 {report['skipped']}，失败 {report['failed']}，"
+          f"耗时 {report['elapsed']:.1f} 秒")
+
+
+if __name__ == '__main__':
+    main()
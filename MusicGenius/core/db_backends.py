@@ -0,0 +1,283 @@
+"""
+MusicGenius - 数据库存储后端
+
+MusicDatabase 的所有查询都以 MySQL 的写法编写（%s 占位符、反引号标识符），
+各后端负责建立连接、建表，以及提供少数方言不同的语句片段：
+- MySQLBackend: 连接 MySQL 服务器，适合多机部署
+- SQLiteBackend: 嵌入式 SQLite 文件，适合单机部署，省去每条查询的网络往返。
+  使用 WAL 日志模式（读写互不阻塞），游标自动把 %s 占位符转换为 ?，
+  每个连接缓存已编译的语句（prepared statement），批量写入使用 executemany
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+from functools import lru_cache
+import mysql.connector
+
+DEFAULT_SQLITE_PATH = os.path.join('data', 'music_genius.db')
+
+
+class MySQLBackend:
+    """MySQL 存储后端"""
+
+    name = 'mysql'
+    # 连接本身失效的异常，出现时连接不再放回连接池
+    disconnect_errors = (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError)
+    # 写入 JSON 列的参数表达式
+    json_param = 'CAST(%s AS JSON)'
+
+    schema = [
+        # 曲目表
+        '''
+        CREATE TABLE IF NOT EXISTS tracks (
+            id BIGINT PRIMARY KEY AUTO_INCREMENT,
+            title VARCHAR(255),
+            genre VARCHAR(100),
+            filepath VARCHAR(512) UNIQUE,
+            duration INT,
+            tempo INT,
+            INDEX idx_title (title),
+            INDEX idx_genre (genre)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        ''',
+        # 标签表
+        '''
+        CREATE TABLE IF NOT EXISTS tags (
+            id BIGINT PRIMARY KEY AUTO_INCREMENT,
+            name VARCHAR(100) UNIQUE,
+            INDEX idx_name (name)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        ''',
+        # 曲目-标签关联表
+        '''
+        CREATE TABLE IF NOT EXISTS track_tags (
+            track_id BIGINT,
+            tag_id BIGINT,
+            PRIMARY KEY (track_id, tag_id),
+            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE,
+            FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE,
+            INDEX idx_track_id (track_id),
+            INDEX idx_tag_id (tag_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        ''',
+        # 乐器表
+        '''
+        CREATE TABLE IF NOT EXISTS instruments (
+            id BIGINT PRIMARY KEY AUTO_INCREMENT,
+            track_id BIGINT,
+            name VARCHAR(100),
+            program INT,
+            is_drum BOOLEAN,
+            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE,
+            INDEX idx_track_id (track_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        '''
+    ]
+
+    def __init__(self, host='localhost', user='root', password='', database='music_genius'):
+        """初始化
+
+        Args:
+            host (str): MySQL服务器地址
+            user (str): 数据库用户名
+            password (str): 数据库密码
+            database (str): 数据库名称
+        """
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+
+    def connect(self):
+        """建立一个新连接"""
+        return mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database
+        )
+
+    @staticmethod
+    def check(conn):
+        """健康检查：连接已断开时 ping 抛出异常"""
+        conn.ping(reconnect=False)
+
+    @staticmethod
+    def cursor(conn):
+        return conn.cursor()
+
+    @staticmethod
+    def table_columns(cursor, table):
+        """获取表的列名集合"""
+        cursor.execute(f"SHOW COLUMNS FROM {table}")
+        return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def insert_ignore(table, columns):
+        """插入语句，唯一键冲突的行被跳过"""
+        return f"INSERT IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+    @staticmethod
+    def upsert(table, columns, conflict_column, update_columns):
+        """插入语句，唯一键冲突时更新 update_columns"""
+        updates = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {updates}")
+
+
+class _SQLiteCursor(sqlite3.Cursor):
+    """接受 %s 占位符的 SQLite 游标，使 MySQL 写法的查询可以直接执行"""
+
+    def execute(self, sql, parameters=()):
+        return super().execute(_to_qmark(sql), parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return super().executemany(_to_qmark(sql), seq_of_parameters)
+
+
+@lru_cache(maxsize=512)
+def _to_qmark(sql):
+    return sql.replace('%s', '?')
+
+
+# 读出为 datetime 的 TIMESTAMP 列（按列名匹配）
+TIMESTAMP_COLUMNS = frozenset({'created_at'})
+
+
+def _convert_timestamps(cursor, row):
+    """行工厂：把 TIMESTAMP 列读出为 datetime，与 MySQL 一致
+
+    只作用于本后端创建的连接，不使用进程全局的 sqlite3.register_converter，
+    以免影响同一进程中其他使用 sqlite3 的代码。
+    """
+    indices = [index for index, column in enumerate(cursor.description) if column[0] in TIMESTAMP_COLUMNS]
+    if not indices:
+        return row
+
+    row = list(row)
+    for index in indices:
+        if isinstance(row[index], str):
+            row[index] = datetime.fromisoformat(row[index])
+    return tuple(row)
+
+
+class SQLiteBackend:
+    """嵌入式 SQLite 存储后端（WAL 模式）"""
+
+    name = 'sqlite'
+    # 在已关闭的连接上操作时抛出 ProgrammingError
+    disconnect_errors = (sqlite3.ProgrammingError,)
+    json_param = 'JSON(%s)'
+
+    schema = [
+        '''
+        CREATE TABLE IF NOT EXISTS tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title VARCHAR(255),
+            artist VARCHAR(255),
+            genre VARCHAR(100),
+            filepath VARCHAR(512) UNIQUE,
+            duration INT,
+            tempo INT,
+            `key` VARCHAR(10),
+            mode VARCHAR(20),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            features JSON
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_title ON tracks (title)',
+        'CREATE INDEX IF NOT EXISTS idx_artist ON tracks (artist)',
+        'CREATE INDEX IF NOT EXISTS idx_genre ON tracks (genre)',
+        '''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) UNIQUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS track_tags (
+            track_id BIGINT,
+            tag_id BIGINT,
+            PRIMARY KEY (track_id, tag_id),
+            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE,
+            FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_track_tags_tag_id ON track_tags (tag_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS instruments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            track_id BIGINT,
+            name VARCHAR(100),
+            program INT,
+            is_drum BOOLEAN,
+            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_instruments_track_id ON instruments (track_id)'
+    ]
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, busy_timeout=30.0, cached_statements=256):
+        """初始化
+
+        Args:
+            path (str): 数据库文件路径
+            busy_timeout (float): 等待其他连接释放写锁的最长时间（秒）
+            cached_statements (int): 每个连接缓存的已编译语句数
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+
+    def connect(self):
+        """建立一个新连接，启用 WAL 日志和外键约束，TIMESTAMP 列读出为 datetime
+
+        连接由连接池保证同一时间只被一个线程使用，因此关闭 check_same_thread。
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL 模式下 NORMAL 只在检查点同步，掉电最多丢失最近的事务，不会损坏数据库
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.row_factory = _convert_timestamps
+        return conn
+
+    @staticmethod
+    def check(conn):
+        """健康检查：连接不可用时抛出异常"""
+        conn.execute('SELECT 1').fetchone()
+
+    @staticmethod
+    def cursor(conn):
+        return conn.cursor(_SQLiteCursor)
+
+    @staticmethod
+    def table_columns(cursor, table):
+        """获取表的列名集合"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in cursor.fetchall()}
+
+    @staticmethod
+    def insert_ignore(table, columns):
+        """插入语句，唯一键冲突的行被跳过"""
+        return f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+    @staticmethod
+    def upsert(table, columns, conflict_column, update_columns):
+        """插入语句，唯一键冲突时更新 update_columns"""
+        updates = ', '.join(f"{column} = excluded.{column}" for column in update_columns)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT({conflict_column}) DO UPDATE SET {updates}")
+
+
+BACKENDS = {'mysql': MySQLBackend, 'sqlite': SQLiteBackend}
@@ -0,0 +1,183 @@
+"""
+MusicGenius - 数据库连接池
+
+线程安全的连接池，每次数据库操作借出一个独立的连接：
+1. 连接按需创建，总数不超过 pool_size；全部借出时调用方按先来后到排队等待，超过 timeout 抛出 TimeoutError
+2. 借出时对空闲超过 check_interval 秒的连接做健康检查（如 MySQL 的 ping），失效的连接被丢弃并重建
+3. 记录借出次数、需要等待的次数和等待时长等指标，用于判断连接池大小是否合适
+
+连接的创建和健康检查由调用方提供，连接池本身与具体的数据库驱动无关。
+"""
+
+import time
+import threading
+from collections import deque
+
+
+class ConnectionPool:
+    """线程安全的数据库连接池"""
+
+    def __init__(self, connect, pool_size=5, timeout=30.0, check=None, check_interval=5.0):
+        """初始化连接池（不立即创建连接）
+
+        Args:
+            connect (callable): 无参数，返回一个新的数据库连接
+            pool_size (int): 最大连接数
+            timeout (float): 借出连接的最长等待时间（秒）
+            check (callable, optional): 健康检查函数，参数为连接，连接失效时抛出异常
+            check_interval (float): 空闲不超过该时长（秒）的连接借出时跳过健康检查，为 0 时每次都检查
+        """
+        if pool_size < 1:
+            raise ValueError(f"连接池大小必须为正整数: {pool_size}")
+
+        self.connect = connect
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.check = check
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        # 可借出的名额和排队等待的调用方（先进先出，避免刚归还连接的线程反复插队）
+        self._available = pool_size
+        self._waiters = deque()
+        # 空闲连接及其归还时间，后归还的先借出
+        self._idle = deque()
+        self._closed = False
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'health_check_failures': 0,
+            'discarded': 0
+        }
+
+    def acquire(self):
+        """借出一个连接，全部借出时等待
+
+        Returns:
+            连接对象，用完后必须调用 release 归还
+        """
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+
+        start = time.perf_counter()
+        with self._released:
+            waited = self._available == 0 or bool(self._waiters)
+            if waited:
+                self._wait_turn(start)
+            self._available -= 1
+        wait_time = time.perf_counter() - start
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._return_slot()
+            raise
+
+        with self._lock:
+            self._metrics['checkouts'] += 1
+            if waited:
+                self._metrics['waits'] += 1
+                self._metrics['wait_time'] += wait_time
+                self._metrics['max_wait_time'] = max(self._metrics['max_wait_time'], wait_time)
+        return conn
+
+    def _wait_turn(self, start):
+        """排队等待，直到排在队首且有空闲名额（调用时持有锁）"""
+        turn = object()
+        self._waiters.append(turn)
+        try:
+            while self._available == 0 or self._waiters[0] is not turn:
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise TimeoutError(f"等待数据库连接超时（{self.timeout} 秒，连接池大小 {self.pool_size}）")
+                self._released.wait(remaining)
+        finally:
+            self._waiters.remove(turn)
+            # 队首变化，唤醒其他等待者重新检查
+            self._released.notify_all()
+
+    def _return_slot(self):
+        with self._released:
+            self._available += 1
+            self._released.notify_all()
+
+    def _checkout(self):
+        """取出一个可用的空闲连接，没有时新建"""
+        while True:
+            with self._lock:
+                conn, returned_at = self._idle.pop() if self._idle else (None, None)
+            if conn is None:
+                break
+            if self.check is None or time.monotonic() - returned_at <= self.check_interval:
+                return conn
+            try:
+                self.check(conn)
+                return conn
+            except Exception as e:
+                print(f"数据库连接健康检查失败，重新连接: {e}")
+                with self._lock:
+                    self._metrics['health_check_failures'] += 1
+                self._discard(conn)
+
+        conn = self.connect()
+        with self._lock:
+            self._metrics['connections_created'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """归还连接
+
+        Args:
+            conn: acquire 借出的连接
+            discard (bool): 是否丢弃该连接（例如连接已出错），而不是放回池中
+        """
+        try:
+            if discard or self._closed:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._return_slot()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._metrics['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """关闭所有空闲连接；借出中的连接在归还时关闭"""
+        self._closed = True
+        with self._lock:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """获取连接池指标
+
+        Returns:
+            dict: pool_size、in_use（借出中的连接数）、waiting（正在排队的调用方数）、idle（空闲连接数）、checkouts（借出次数）、waits（需要等待的次数）、
+                wait_time / max_wait_time（等待总时长和最长一次等待，秒）、timeouts（等待超时次数）、
+                connections_created、health_check_failures、discarded
+        """
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self.pool_size - self._available
+            stats['waiting'] = len(self._waiters)
+        stats['pool_size'] = self.pool_size
+        return stats
@@ -0,0 +1,234 @@
+"""
+MusicGenius - 音乐库批量导入流水线
+
+导入分为三个阶段：
+1. 进程池并行解析MIDI文件、提取特征
+2. 有界队列连接解析阶段与写入阶段，写入跟不上时自动对解析阶段施加背压
+3. 单个写入线程将结果攒批，用 executemany 批量插入，每 N 行提交一次；
+   指定了分析缓存时，每批提交后立即预先分析这批曲目，详情页无需再现场分析
+
+每个文件的失败原因都会记录在导入报告中。
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from ..utils import midi_utils
+
+# 写入线程的结束标记
+_SENTINEL = None
+
+
+def extract_track_row(item):
+    """解析单个MIDI文件，生成待插入的曲目行（在工作进程中执行）
+
+    Args:
+        item (dict): 包含 filepath、title、artist、genre、extract_features 的字典
+
+    Returns:
+        tuple: (item, 曲目行字典, 错误信息)，成功时错误信息为None
+    """
+    filepath = item['filepath']
+    try:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"文件 {filepath} 不存在")
+
+        row = {
+            'title': item['title'],
+            'genre': item['genre'],
+            'filepath': filepath,
+            'duration': None,
+            'tempo': None,
+            'key': None,
+            'mode': None
+        }
+
+        if item.get('extract_features', True):
+            info = midi_utils.extract_track_info(filepath)
+            row['duration'] = int(round(info['duration']))
+            row['tempo'] = int(round(info['tempo']))
+            row['key'] = info['key']
+            row['mode'] = info['mode']
+
+        return item, row, None
+    except Exception as e:
+        return item, None, str(e)
+
+
+class LibraryIngestor:
+    """音乐库批量导入器"""
+
+    def __init__(self, db, workers=None, batch_size=500, queue_size=1000, progress_callback=None,
+                 update_existing=False, parallel_threshold=32, analysis_cache=None):
+        """初始化导入器
+
+        Args:
+            db (MusicDatabase): 音乐数据库
+            workers (int, optional): 解析进程数，默认为CPU核数；为1时在当前进程内解析
+            batch_size (int): 每批插入并提交的行数
+            queue_size (int): 解析阶段与写入阶段之间队列的最大长度
+            progress_callback (callable, optional): 进度回调，参数为 (已处理数, 总数)
+            update_existing (bool): 是否更新已存在的曲目（用于重新导入修改过的文件）
+            parallel_threshold (int): 文件数少于该值时在当前进程内解析，
+                省去创建进程池的开销（例如网页上传的少量文件）
+            analysis_cache (TrackAnalysisCache, optional): 曲目分析缓存，指定时每批提交后预先分析这批曲目
+        """
+        self.db = db
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.progress_callback = progress_callback or self._print_progress
+        self.update_existing = update_existing
+        self.parallel_threshold = parallel_threshold
+        self.analysis_cache = analysis_cache
+
+    @staticmethod
+    def _print_progress(processed, total):
+        """默认的进度输出"""
+        print(f"导入进度: {processed}/{total}")
+
+    @staticmethod
+    def _normalize_item(item):
+        """将文件路径或字典统一为导入项字典"""
+        if isinstance(item, str):
+            item = {'filepath': item}
+
+        filepath = item['filepath']
+        title = item.get('title') or os.path.splitext(os.path.basename(filepath))[0]
+
+        return {
+            'filepath': filepath,
+            'title': title,
+            'artist': item.get('artist'),
+            'genre': item.get('genre'),
+            'extract_features': item.get('extract_features', True)
+        }
+
+    def ingest(self, items):
+        """批量导入曲目
+
+        Args:
+            items (iterable): 文件路径或导入项字典（filepath、title、artist、genre）
+
+        Returns:
+            dict: 导入报告，包含总数、成功数、重复跳过数、失败数、每个失败文件的错误信息和耗时；
+                预先分析的曲目数和分析失败的错误信息单独记录（分析失败不影响导入结果）
+        """
+        items = [self._normalize_item(item) for item in items]
+        report = {
+            'total': len(items),
+            'imported': 0,
+            'skipped': 0,
+            'failed': 0,
+            'errors': [],
+            'analyzed': 0,
+            'analysis_errors': [],
+            'elapsed': 0.0
+        }
+        if not items:
+            return report
+
+        start_time = time.time()
+        results = queue.Queue(maxsize=self.queue_size)
+        writer = threading.Thread(target=self._write_rows, args=(results, report), daemon=True)
+        writer.start()
+
+        try:
+            self._extract_rows(items, results)
+        finally:
+            results.put(_SENTINEL)
+            writer.join()
+
+        report['elapsed'] = time.time() - start_time
+        return report
+
+    def _extract_rows(self, items, results):
+        """解析阶段：提取特征并放入队列"""
+        if self.workers <= 1 or len(items) < max(self.parallel_threshold, 2):
+            for item in items:
+                results.put(extract_track_row(item))
+            return
+
+        max_pending = self.workers * 4
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for item in items:
+                pending.add(executor.submit(extract_track_row, item))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results.put(future.result())
+
+            for future in pending:
+                results.put(future.result())
+
+    def _write_rows(self, results, report):
+        """写入阶段：攒批插入数据库"""
+        batch = []
+        processed = 0
+        reported = 0
+
+        while True:
+            result = results.get()
+            if result is _SENTINEL:
+                break
+
+            item, row, error = result
+            processed += 1
+            if error is not None:
+                report['failed'] += 1
+                report['errors'].append({'filepath': item['filepath'], 'error': error})
+            else:
+                batch.append(row)
+
+            if len(batch) >= self.batch_size:
+                self._flush(batch, report)
+                batch = []
+                self.progress_callback(processed, report['total'])
+                reported = processed
+
+        if batch:
+            self._flush(batch, report)
+        if processed != reported:
+            self.progress_callback(processed, report['total'])
+
+    def _flush(self, batch, report):
+        """批量插入一批曲目，整批失败时逐行重试以定位出错的文件"""
+        try:
+            inserted = self.db.add_track_rows(batch, update_existing=self.update_existing)
+            report['imported'] += inserted
+            report['skipped'] += len(batch) - inserted
+            self._warm([row['filepath'] for row in batch], report)
+            return
+        except Exception as e:
+            print(f"批量插入 {len(batch)} 条曲目时出错，逐条重试: {e}")
+
+        committed = []
+        for row in batch:
+            try:
+                inserted = self.db.add_track_rows([row], update_existing=self.update_existing)
+                report['imported'] += inserted
+                report['skipped'] += 1 - inserted
+                committed.append(row['filepath'])
+            except Exception as e:
+                report['failed'] += 1
+                report['errors'].append({'filepath': row['filepath'], 'error': str(e)})
+        self._warm(committed, report)
+
+    def _warm(self, filepaths, report):
+        """预先分析已提交的曲目（已缓存且未变化的曲目会被跳过）"""
+        if self.analysis_cache is None or not filepaths:
+            return
+
+        try:
+            track_ids = list(self.db.get_track_ids_by_filepath(filepaths).values())
+            warm_report = self.analysis_cache.warm(track_ids)
+        except Exception as e:
+            print(f"预先分析 {len(filepaths)} 首曲目时出错: {e}")
+            report['analysis_errors'].extend({'filepath': filepath, 'error': str(e)} for filepath in filepaths)
+            return
+
+        report['analyzed'] += warm_report['analyzed']
+        report['analysis_errors'].extend(warm_report['errors'])
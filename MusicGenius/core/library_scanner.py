@@ -0,0 +1,207 @@
+"""
+MusicGenius - 音乐库增量扫描
+
+用 os.scandir 单次遍历目录，并维护一份扫描清单（路径 -> 文件大小、修改时间、内容哈希）：
+1. 大小和修改时间都未变的文件直接跳过，不读取内容
+2. 大小或修改时间变化时重新计算哈希，内容确实变化才重新导入
+3. 清单中存在但目录中已不存在的文件，从曲库中删除对应曲目
+
+为避免误删整个曲库：根目录无法读取时扫描直接失败；读取失败的子目录下的文件不视为已移除；
+目录中一个MIDI文件都没有时（例如挂载点未挂载）不删除任何曲目。
+
+监视模式按固定间隔轮询目录，持续保持曲库与目录同步。
+"""
+
+import os
+import json
+import time
+import hashlib
+from ..utils import midi_utils
+from ..utils.feature_cache import file_content_hash
+
+DEFAULT_MANIFEST_DIR = os.path.join('data', 'manifests')
+
+
+def default_manifest_path(directory):
+    """获取目录对应的默认扫描清单路径
+
+    Args:
+        directory (str): 音乐库目录
+
+    Returns:
+        str: 清单文件路径
+    """
+    digest = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(DEFAULT_MANIFEST_DIR, f"{digest}.json")
+
+
+class LibraryScanner:
+    """音乐库增量扫描器"""
+
+    def __init__(self, db, directory, manifest_path=None, recursive=True, genre=None,
+                 workers=None, batch_size=500, analysis_cache=None):
+        """初始化扫描器
+
+        Args:
+            db (MusicDatabase): 音乐数据库
+            directory (str): 音乐库目录
+            manifest_path (str, optional): 扫描清单路径，默认按目录存放在 data/manifests 下
+            recursive (bool): 是否递归扫描子目录
+            genre (str, optional): 新曲目的曲风
+            workers (int, optional): 解析进程数，默认为CPU核数
+            batch_size (int): 每批插入并提交的行数
+            analysis_cache (TrackAnalysisCache, optional): 曲目分析缓存，指定时每批提交后预先分析新增和修改的曲目
+        """
+        self.db = db
+        self.directory = directory
+        self.manifest_path = manifest_path or default_manifest_path(directory)
+        self.recursive = recursive
+        self.genre = genre
+        self.workers = workers
+        self.batch_size = batch_size
+        self.analysis_cache = analysis_cache
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """读取扫描清单: 路径 -> [文件大小, 修改时间(纳秒), 内容哈希]"""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        """原子地写入扫描清单"""
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(temp_path, self.manifest_path)
+
+    def scan(self):
+        """扫描一次目录并同步曲库
+
+        Returns:
+            dict: 同步报告，包含新增、更新、删除、未变化、失败的数量，每个失败文件的错误信息和耗时，
+                以及预先分析的曲目数和分析失败的错误信息
+
+        Raises:
+            OSError: 根目录无法读取
+        """
+        start_time = time.time()
+        report = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0, 'failed': 0, 'errors': [],
+                  'analyzed': 0, 'analysis_errors': [], 'elapsed': 0.0}
+
+        added = []
+        updated = []
+        entries = {}
+        seen = set()
+        failed_dirs = []
+
+        for filepath in midi_utils.iter_midi_files(self.directory, self.recursive, failed_dirs):
+            seen.add(filepath)
+            try:
+                stat = os.stat(filepath)
+                previous = self.manifest.get(filepath)
+                if previous is not None and previous[0] == stat.st_size and previous[1] == stat.st_mtime_ns:
+                    report['unchanged'] += 1
+                    continue
+
+                content_hash = file_content_hash(filepath)
+            except OSError as e:
+                report['failed'] += 1
+                report['errors'].append({'filepath': filepath, 'error': str(e)})
+                continue
+
+            entries[filepath] = [stat.st_size, stat.st_mtime_ns, content_hash]
+            if previous is None:
+                added.append(filepath)
+            elif previous[2] != content_hash:
+                updated.append(filepath)
+            else:
+                # 只有修改时间变化，内容未变
+                self.manifest[filepath] = entries.pop(filepath)
+                report['unchanged'] += 1
+
+        # 删除已移除的文件；读取失败的子目录下的文件状态未知，保留
+        failed_prefixes = tuple(os.path.join(directory, '') for directory in failed_dirs)
+        removed = [
+            filepath for filepath in self.manifest
+            if filepath not in seen and not (failed_prefixes and filepath.startswith(failed_prefixes))
+        ]
+        for directory in failed_dirs:
+            report['errors'].append({'filepath': directory, 'error': '读取目录失败，其中的曲目未同步'})
+        if removed and not seen:
+            print(f"目录 {self.directory} 中没有任何MIDI文件，可能未挂载，跳过删除 {len(removed)} 首曲目")
+            report['errors'].append({'filepath': self.directory, 'error': '目录中没有MIDI文件，跳过删除'})
+            removed = []
+        if removed:
+            self.db.delete_tracks_by_filepath(removed)
+            for filepath in removed:
+                del self.manifest[filepath]
+            report['removed'] = len(removed)
+
+        # 导入新增和修改过的文件
+        if added or updated:
+            ingest_report = self.db.ingest_files(
+                [{'filepath': filepath, 'genre': self.genre} for filepath in added + updated],
+                workers=self.workers,
+                batch_size=self.batch_size,
+                update_existing=bool(updated),
+                analysis_cache=self.analysis_cache
+            )
+
+            failed = {error['filepath'] for error in ingest_report['errors']}
+            report['failed'] += len(failed)
+            report['errors'].extend(ingest_report['errors'])
+            report['analyzed'] = ingest_report['analyzed']
+            report['analysis_errors'] = ingest_report['analysis_errors']
+            report['added'] = sum(1 for filepath in added if filepath not in failed)
+            report['updated'] = sum(1 for filepath in updated if filepath not in failed)
+
+            # 失败的文件不写入清单，下次扫描时重试
+            for filepath, entry in entries.items():
+                if filepath not in failed:
+                    self.manifest[filepath] = entry
+
+        self._save_manifest()
+        report['elapsed'] = time.time() - start_time
+        return report
+
+    def watch(self, interval=5.0, max_scans=None, callback=None):
+        """按固定间隔轮询目录，持续同步曲库
+
+        Args:
+            interval (float): 轮询间隔（秒）
+            max_scans (int, optional): 最多扫描次数，默认为None（直到被中断）
+            callback (callable, optional): 每次扫描后调用，参数为同步报告
+
+        Returns:
+            dict: 最后一次扫描的同步报告
+        """
+        report = None
+        scans = 0
+
+        try:
+            while max_scans is None or scans < max_scans:
+                scans += 1
+                try:
+                    report = self.scan()
+                except OSError as e:
+                    # 根目录暂时不可读（例如被卸载），不改动曲库，下次轮询重试
+                    print(f"读取目录 {self.directory} 时出错，跳过本次同步: {e}")
+                else:
+                    if callback is not None:
+                        callback(report)
+                    elif report['added'] or report['updated'] or report['removed'] or report['failed']:
+                        print(f"同步 {self.directory}: 新增 {report['added']}，更新 {report['updated']}，"
+                              f"删除 {report['removed']}，失败 {report['failed']}")
+
+                if max_scans is None or scans < max_scans:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            print(f"停止监视目录 {self.directory}")
+
+        return report
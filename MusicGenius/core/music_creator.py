@@ -4,12 +4,11 @@ import numpy as np
 import tempfile
 from datetime import datetime
 from ..models import LSTMMelodyGenerator, TransformerStyleTransfer
-from ..audio import AudioProcessor
+from ..audio import AudioProcessor, analysis_profiles, peak_pyramid
 from ..effects import AudioEffects
-from ..utils import midi_utils
+from ..utils import midi_utils, midi_corpus, smf, note_segmentation
 import music21
 import pretty_midi
-from midiutil import MIDIFile
 import subprocess
 import json
 from typing import List, Dict, Optional, Union
@@ -18,6 +17,7 @@ import soundfile as sf
 from .melody_generator import MelodyGenerator
 from .style_transfer import StyleTransfer
 from .accompaniment_generator import AccompanimentGenerator
+from .track_analysis import analyze_midi_track
 from music21 import instrument
 
 class MusicCreator:
@@ -42,6 +42,8 @@ class MusicCreator:
         # 初始化音频处理工具
         self.audio_processor = AudioProcessor()
         self.audio_effects = AudioEffects()
+        # 分析配置名 -> 对应参数的音频处理器
+        self._profile_processors = {}
         
         # 加载已有模型
         self._load_available_models()
@@ -89,14 +91,15 @@ class MusicCreator:
             except Exception as e:
                 print(f"加载Transformer模型出错: {e}")
     
-    def train_melody_model(self, midi_files, sequence_length=100, epochs=50, batch_size=64):
+    def train_melody_model(self, midi_files, sequence_length=100, epochs=50, batch_size=64, transpositions=None):
         """训练旋律生成模型
         
         Args:
-            midi_files (list): MIDI文件路径列表
+            midi_files (list | str): MIDI文件路径列表，或打包语料文件路径（.mgpc）
             sequence_length (int): 输入序列长度
             epochs (int): 训练轮次
             batch_size (int): 批次大小
+            transpositions (list, optional): 数据增强的转调半音数列表，默认为None（不增强）
         """
         # 确保模型目录存在
         os.makedirs(self.model_dir, exist_ok=True)
@@ -106,10 +109,33 @@ class MusicCreator:
         
         # 初始化并训练模型
         self.melody_generator = LSTMMelodyGenerator(sequence_length=sequence_length)
-        self.melody_generator.train(midi_files, epochs=epochs, batch_size=batch_size, save_path=save_path)
+        if isinstance(midi_files, str):
+            with midi_corpus.PackedCorpus(midi_files) as corpus:
+                self.melody_generator.train(corpus, epochs=epochs, batch_size=batch_size, save_path=save_path,
+                                            transpositions=transpositions)
+        else:
+            self.melody_generator.train(midi_files, epochs=epochs, batch_size=batch_size, save_path=save_path,
+                                        transpositions=transpositions)
         
         return save_path
     
+    def pack_corpus(self, midi_files, corpus_path=None):
+        """将MIDI文件打包为训练语料，之后可直接传给 train_melody_model
+        
+        Args:
+            midi_files (list): MIDI文件路径列表
+            corpus_path (str, optional): 语料文件路径，默认为模型目录下的 corpus.mgpc
+        
+        Returns:
+            str: 语料文件路径
+        """
+        if corpus_path is None:
+            corpus_path = os.path.join(self.model_dir, 'corpus' + midi_corpus.CORPUS_EXTENSION)
+        
+        count = midi_corpus.pack_corpus(midi_files, corpus_path)
+        print(f"已打包 {count} 个MIDI文件到 {corpus_path}")
+        return corpus_path
+    
     def learn_style(self, midi_files, style_name, epochs=30, batch_size=32):
         """学习音乐风格
         
@@ -181,9 +207,23 @@ class MusicCreator:
         # 保存音频数据为WAV文件
         sf.write(wav_file, audio_data, 44100)
         print('finish sf.write')
+        self._write_peaks(wav_file, audio_data, 44100)
         return wav_file
         
     
+    def _write_peaks(self, audio_file, audio_data=None, sr=None):
+        """为生成的音频文件写入波形峰值附属文件，供网页播放器按缩放级别读取
+        
+        Args:
+            audio_file (str): 音频文件路径
+            audio_data (ndarray, optional): 已写入文件的音频数据
+            sr (int, optional): 采样率
+        """
+        try:
+            peak_pyramid.write_peaks(audio_file, y=audio_data, sr=sr)
+        except Exception as e:
+            print(f"生成波形峰值文件 {audio_file} 时出错: {e}")
+    
     def _get_style_seed_notes(self, style: str) -> List[str]:
         """根据风格获取种子音符序列
         
@@ -275,19 +315,21 @@ class MusicCreator:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         output_file = f'output/accompaniment_{timestamp}.wav'
         sf.write(output_file, accompaniment, 44100)
+        self._write_peaks(output_file, accompaniment, 44100)
         
         return output_file
     
-    def process_audio(self, input_file, output_file=None, sample_rate=44100):
+    def process_audio(self, input_file, output_file=None, sample_rate=44100, features=None):
         """处理音频文件，使用audio_processor进行处理
         
         Args:
             input_file (str): 输入音频文件路径
             output_file (str, optional): 输出文件路径，默认为None（自动生成）
             sample_rate (int): 采样率
+            features (iterable, optional): 需要提取的特征名，默认为None（不提取）
             
         Returns:
-            str: 处理后的音频文件路径
+            tuple: (处理后的音频文件路径, 特征字典)
         """
         if not os.path.exists(input_file):
             raise FileNotFoundError(f"文件 {input_file} 不存在")
@@ -301,14 +343,14 @@ class MusicCreator:
         # 加载音频
         audio_data, sr = self.audio_processor.load_audio(input_file, sr=sample_rate)
         
-        # 分析并保存音频特征
-        features = self.audio_processor.extract_features(audio_data, sr=sr)
-        features_file = os.path.join(self.output_dir, f"{os.path.basename(input_file)}_features.json")
+        # 只计算调用方需要的特征
+        extracted = self.audio_processor.extract_features(audio_data, sr=sr, features=features or ())
         
         # 保存处理后的音频
         self.audio_processor.save_audio(audio_data, output_file, sr=sr)
+        self._write_peaks(output_file, audio_data, sr)
         
-        return output_file, features
+        return output_file, extracted
         
     def apply_audio_effects(self, input_file: str, effects: List[str], effect_params: Dict) -> str:
         """应用音频效果
@@ -322,7 +364,7 @@ class MusicCreator:
             str: 处理后的音频文件路径
         """
         # 读取音频
-        audio, sr = librosa.load(input_file, sr=44100)
+        audio, sr = self.audio_processor.load_audio(input_file, sr=44100)
         
         # 应用效果
         processed_audio = self.audio_processor.apply_effects(audio, effects, effect_params)
@@ -331,63 +373,70 @@ class MusicCreator:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         output_file = f'output/processed_{timestamp}.wav'
         sf.write(output_file, processed_audio, sr)
+        self._write_peaks(output_file, processed_audio, sr)
         
         return output_file
     
-    def analyze_audio(self, input_file, plot=False):
+    def analyze_audio(self, input_file, plot=False, pitch_method=None, streaming=False, profile='full'):
         """分析音频特征
         
+        特征提取、节奏分析和和声分析共用同一个分析会话中的中间结果。
+        
         Args:
             input_file (str): 输入音频文件路径
             plot (bool): 是否生成可视化图表
+            pitch_method (str, optional): f0 使用的音高跟踪方法，'pyin' 或 'yin'，默认由分析配置决定
+            streaming (bool): 是否按块流式分析（用于很长的文件，只返回汇总结果，不支持绘图）
+            profile (str): 分析配置，'fast'（批量扫描）、'standard' 或 'full'（详情页），
+                见 audio.analysis_profiles
             
         Returns:
-            dict: 分析结果
+            dict: 分析结果，其中 timings 为各阶段耗时（秒）
         """
         if not os.path.exists(input_file):
             raise FileNotFoundError(f"文件 {input_file} 不存在")
         
-        # 加载音频
-        audio_data, sr = self.audio_processor.load_audio(input_file)
+        if streaming:
+            return self.audio_processor.analyze_stream(input_file)
         
-        # 提取特征
-        features = self.audio_processor.extract_features(audio_data, sr)
-        
-        # 分析节奏
-        rhythm_info = self.audio_processor.analyze_rhythm(audio_data, sr)
-        
-        # 分析和声
-        harmony_info = self.audio_processor.analyze_harmony(audio_data, sr)
+        return analysis_profiles.analyze_file(input_file, profile, processor=self._processor_for(profile),
+                                              plot=plot, pitch_method=pitch_method)
+    
+    def _processor_for(self, profile):
+        """获取分析配置对应的音频处理器（按配置名缓存）"""
+        if profile not in self._profile_processors:
+            self._profile_processors[profile] = analysis_profiles.create_processor(profile)
+        return self._profile_processors[profile]
+    
+    def analyze_track(self, midi_file):
+        """分析曲库中的MIDI曲目（不经过曲目分析缓存）
         
-        # 如果需要绘制可视化图表
-        if plot:
-            # 绘制波形图
-            self.audio_processor.plot_waveform(audio_data, sr, title=f"Waveform: {os.path.basename(input_file)}")
-            
-            # 绘制频谱图
-            self.audio_processor.plot_spectrogram(audio_data, sr, title=f"Spectrogram: {os.path.basename(input_file)}")
+        Args:
+            midi_file (str): MIDI文件路径
             
-            # 绘制特征图
-            self.audio_processor.plot_features(features, title_prefix=f"{os.path.basename(input_file)} - ")
-        
-        # 组合分析结果
-        analysis_result = {
-            'features': features,
-            'rhythm': rhythm_info,
-            'harmony': harmony_info,
-            'tempo': rhythm_info['tempo'],
-            'estimated_key': harmony_info['estimated_key'],
-            'estimated_mode': harmony_info['estimated_mode']
-        }
+        Returns:
+            dict: 分析摘要，包含 key、mode、tempo、duration、note_count、features、instruments、chords
+        """
+        if not os.path.exists(midi_file):
+            raise FileNotFoundError(f"文件 {midi_file} 不存在")
         
-        return analysis_result
+        summary, _ = analyze_midi_track(midi_file)
+        return summary
     
-    def audio_to_midi(self, input_file, output_file=None):
+    def audio_to_midi(self, input_file, output_file=None, method=None, min_duration=0.05, profile='standard',
+                      subdivisions=4):
         """将音频转换为MIDI
         
+        音高轨迹经中值滤波和迟滞量化后分割为音符，MIDI 文件的速度取节奏分析估计的速度，
+        音符起止时间对齐到以第一拍为起点的节拍网格。
+        
         Args:
             input_file (str): 输入音频文件路径
             output_file (str, optional): 输出MIDI文件路径，默认为None（自动生成）
+            method (str, optional): 音高跟踪方法，'yin'（快速）或 'pyin'（更准确），默认由分析配置决定
+            min_duration (float): 最短音符时长（秒）
+            profile (str): 分析配置，决定采样率和帧参数，见 audio.analysis_profiles
+            subdivisions (int): 每拍的量化网格数，为 0 时不量化
             
         Returns:
             str: 输出MIDI文件路径
@@ -401,55 +450,40 @@ class MusicCreator:
             base, ext = os.path.splitext(filename)
             output_file = os.path.join(self.output_dir, f"{base}.mid")
         
-        # 加载音频
-        audio_data, sr = self.audio_processor.load_audio(input_file)
-        
-        # 提取特征
-        features = self.audio_processor.extract_features(audio_data, sr)
+        # 按配置的采样率加载音频
+        processor = self._processor_for(profile)
+        audio_data, sr = processor.load_audio(input_file)
         
-        # 创建MIDI文件
-        midi = MIDIFile(1)
-        track = 0
-        channel = 0
-        time = 0
-        tempo = 120
-        midi.addTempo(track, time, tempo)
+        # 音高、起音和速度共用同一个特征映射（梅尔频谱只计算一次）
+        if method is None:
+            method = analysis_profiles.get_profile(profile)['pitch_method']
+        features = processor.features(audio_data, sr, pitch_method=method)
         
-        # 从音高特征中提取音符
+        # 将频率转换为MIDI音符编号
         f0 = features['f0']
-        voiced_flag = features['voiced_flag']
-        
-        # 计算音符
-        current_note = None
-        current_start = 0
-        for i, (pitch, is_voiced) in enumerate(zip(f0, voiced_flag)):
-            if is_voiced and not np.isnan(pitch):
-                # 将频率转换为MIDI音符编号
-                midi_note = int(round(69 + 12 * np.log2(pitch / 440.0)))
-                
-                if current_note is None:
-                    # 开始新音符
-                    current_note = midi_note
-                    current_start = i
-                elif midi_note != current_note:
-                    # 当前音符结束，添加到MIDI文件
-                    note_duration = (i - current_start) / sr
-                    midi_time = current_start / sr * (tempo / 60)
-                    midi.addNote(track, channel, current_note, midi_time, note_duration, 100)
-                    
-                    # 开始新音符
-                    current_note = midi_note
-                    current_start = i
-            elif current_note is not None:
-                # 当前音符结束，添加到MIDI文件
-                note_duration = (i - current_start) / sr
-                midi_time = current_start / sr * (tempo / 60)
-                midi.addNote(track, channel, current_note, midi_time, note_duration, 100)
-                current_note = None
+        voiced = features['voiced_flag'] & np.isfinite(f0)
+        midi_pitches = np.full(len(f0), np.nan)
+        midi_pitches[voiced] = librosa.hz_to_midi(f0[voiced])
+        
+        # 起音检测用于分开同音高的连续音符（音高帧与特征帧对应同一时长）
+        onset_frames = librosa.onset.onset_detect(onset_envelope=features['onset_env'], sr=sr,
+                                                  hop_length=processor.hop_length)
+        notes = note_segmentation.segment_notes(
+            midi_pitches, sr, processor.hop_length,
+            onset_frames=onset_frames,
+            min_duration=min_duration,
+            strengths=features['voiced_probs']
+        )
+        
+        # 按估计的速度对齐到节拍网格
+        rhythm = processor.analyze_rhythm(audio_data, sr, features=features, names=('tempo', 'beat_times'))
+        tempo = np.atleast_1d(rhythm['tempo'])
+        tempo = float(tempo[0]) if len(tempo) and tempo[0] > 0 else smf.DEFAULT_TEMPO
+        first_beat = float(rhythm['beat_times'][0]) if len(rhythm['beat_times']) else 0.0
+        notes = note_segmentation.quantize_to_tempo(notes, tempo, subdivisions, offset=first_beat)
         
         # 保存MIDI文件
-        with open(output_file, 'wb') as f:
-            midi.writeFile(f)
+        smf.write_smf(notes, output_file, tempo=tempo)
         
         return output_file
     
@@ -535,6 +569,7 @@ class MusicCreator:
             
         # 保存混音结果
         self.audio_processor.save_audio(mixed_audio, output_file, sr=sr)
+        self._write_peaks(output_file, mixed_audio, sr)
         
         return output_file
             
@@ -1,6 +1,8 @@
 """
 MusicGenius - 音乐数据库管理模块
 
+支持 MySQL 和嵌入式 SQLite 两种存储后端（见 db_backends），两者使用相同的表结构和查询。
+
 MySQL表结构：
 
 1. tracks表 (曲目表)
@@ -53,16 +55,24 @@ CREATE TABLE instruments (
 
 import os
 import json
-import mysql.connector
+from contextlib import contextmanager
 from mysql.connector import Error
 import pandas as pd
 from datetime import datetime
 from ..utils import midi_utils
+from .db_pool import ConnectionPool
+from .db_backends import BACKENDS, DEFAULT_SQLITE_PATH
+from .library_ingest import LibraryIngestor
+from .library_scanner import LibraryScanner
 
 class MusicDatabase:
-    """音乐数据库管理类，用于管理音乐曲目库"""
+    """音乐数据库管理类，用于管理音乐曲目库
+    
+    每次数据库操作从连接池借出独立的连接和游标（见 operation），多线程的 WSGI 服务器可以共享同一个实例。
+    """
     
-    def __init__(self, host='localhost', user='root', password='', database='music_genius'):
+    def __init__(self, host='localhost', user='root', password='', database='music_genius',
+                 pool_size=5, pool_timeout=30.0, backend='mysql', path=None):
         """初始化音乐数据库
         
         Args:
@@ -70,83 +80,109 @@ class MusicDatabase:
             user (str): 数据库用户名
             password (str): 数据库密码
             database (str): 数据库名称
+            pool_size (int): 连接池的最大连接数
+            pool_timeout (float): 等待空闲连接的最长时间（秒）
+            backend (str | object): 存储后端，'mysql'、'sqlite' 或 db_backends 中的后端实例
+            path (str, optional): SQLite 数据库文件路径，默认为 data/music_genius.db
         """
         self.host = host
         self.user = user
         self.password = password
         self.database = database
-        self.conn = None
-        self.cursor = None
+        if backend == 'sqlite':
+            backend = BACKENDS['sqlite'](path or DEFAULT_SQLITE_PATH, busy_timeout=pool_timeout)
+        elif isinstance(backend, str):
+            if backend not in BACKENDS:
+                raise ValueError(f"未知的存储后端: {backend}，可选: {', '.join(BACKENDS)}")
+            backend = BACKENDS[backend](host=host, user=user, password=password, database=database)
+        self.backend = backend
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.pool = None
         self.connect()
         self.create_tables()
     
     def connect(self):
-        """连接到数据库"""
-        self.conn = mysql.connector.connect(
-            host=self.host,
-            user=self.user,
-            password=self.password,
-            database=self.database
+        """创建连接池（连接在首次使用时建立）"""
+        self.pool = ConnectionPool(
+            self.backend.connect,
+            pool_size=self.pool_size,
+            timeout=self.pool_timeout,
+            check=self.backend.check
         )
-        self.cursor = self.conn.cursor()
     
     def close(self):
         """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
+        if self.pool:
+            self.pool.close()
     
-    def create_tables(self):
-        """创建数据库表"""
-        # 曲目表
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tracks (
-            id BIGINT PRIMARY KEY AUTO_INCREMENT,
-            title VARCHAR(255),
-            genre VARCHAR(100),
-            filepath VARCHAR(512) UNIQUE,
-            duration INT,
-            tempo INT,
-            INDEX idx_title (title),
-            INDEX idx_genre (genre)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-        ''')
-        
-        # 标签表
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tags (
-            id BIGINT PRIMARY KEY AUTO_INCREMENT,
-            name VARCHAR(100) UNIQUE,
-            INDEX idx_name (name)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-        ''')
+    @contextmanager
+    def operation(self):
+        """借出一个连接和游标，用于一次数据库操作
         
-        # 曲目-标签关联表
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS track_tags (
-            track_id BIGINT,
-            tag_id BIGINT,
-            PRIMARY KEY (track_id, tag_id),
-            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE,
-            FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE,
-            INDEX idx_track_id (track_id),
-            INDEX idx_tag_id (tag_id)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-        ''')
+        正常退出时提交，出现异常时回滚并重新抛出；连接本身出错时不再放回连接池。
         
-        # 乐器表
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS instruments (
-            id BIGINT PRIMARY KEY AUTO_INCREMENT,
-            track_id BIGINT,
-            name VARCHAR(100),
-            program INT,
-            is_drum BOOLEAN,
-            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE,
-            INDEX idx_track_id (track_id)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-        ''')
+        Yields:
+            tuple: (连接, 游标)
+        """
+        conn = self.pool.acquire()
+        cursor = None
+        discard = False
+        try:
+            cursor = self.backend.cursor(conn)
+            yield conn, cursor
+            conn.commit()
+        except BaseException as e:
+            discard = isinstance(e, self.backend.disconnect_errors)
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    discard = True
+            self.pool.release(conn, discard=discard)
+    
+    def pool_stats(self):
+        """获取连接池指标（借出次数、等待次数和等待时长等，见 ConnectionPool.stats）
         
-        self.conn.commit()
+        Returns:
+            dict: 连接池指标
+        """
+        return self.pool.stats()
+    
+    def _fetchall(self, sql, params=()):
+        """执行一条查询并返回全部结果行"""
+        with self.operation() as (conn, cursor):
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+    
+    def create_tables(self):
+        """创建数据库表"""
+        with self.operation() as (conn, cursor):
+            for statement in self.backend.schema:
+                cursor.execute(statement)
+            
+            self._add_missing_track_columns(cursor)
+    
+    def _add_missing_track_columns(self, cursor):
+        """为旧版本创建的 tracks 表补齐表结构中的列"""
+        existing = self.backend.table_columns(cursor, 'tracks')
+        
+        columns = [
+            ('artist', 'VARCHAR(255)'),
+            ('key', 'VARCHAR(10)'),
+            ('mode', 'VARCHAR(20)'),
+            ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'),
+            ('features', 'JSON')
+        ]
+        for name, definition in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE tracks ADD COLUMN `{name}` {definition}")
     
     def add_track(self, filepath, title=None, artist=None, genre=None, tags=None, extract_features=True):
         """添加音乐曲目
@@ -185,12 +221,13 @@ class MusicDatabase:
             print(f"Inserting track: {title}, genre: {genre}, filepath: {filepath}, duration: {duration}, tempo: {tempo}, created_at: {datetime.now()}")
 
             # 执行插入
-            self.cursor.execute('''
-            INSERT INTO tracks (title, genre, filepath, duration, tempo)
-            VALUES (%s, %s, %s, %s, %s)
-            ''', (title, genre, title, duration, tempo))
-            
-            track_id = self.cursor.lastrowid
+            with self.operation() as (conn, cursor):
+                cursor.execute('''
+                INSERT INTO tracks (title, genre, filepath, duration, tempo, `key`, mode)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ''', (title, genre, filepath, duration, tempo, key, mode))
+                
+                track_id = cursor.lastrowid
             
             # # 添加标签
             # if tags:
@@ -209,13 +246,85 @@ class MusicDatabase:
             #     VALUES (?, ?, ?, ?)
             #     ''', (track_id, inst['name'], inst['program'], inst['is_drum']))
             
-            self.conn.commit()
             return track_id
-            
+        
         except Exception as e:
-            self.conn.rollback()
             raise Exception(f"添加曲目 {filepath} 时出错: {e}")
     
+    def add_track_rows(self, rows, update_existing=False):
+        """批量插入曲目行，整批一次提交
+        
+        已存在相同文件路径的曲目默认会被跳过。
+        
+        Args:
+            rows (list): 曲目行字典列表，包含 title、genre、filepath、duration、tempo，可选 key、mode
+            update_existing (bool): 是否用新提取的时长、速度和调式更新已存在的曲目
+        
+        Returns:
+            int: 实际插入的曲目数量（更新已存在的曲目时为受影响的行数）
+        """
+        if not rows:
+            return 0
+        
+        columns = ('title', 'genre', 'filepath', 'duration', 'tempo', '`key`', 'mode')
+        if update_existing:
+            sql = self.backend.upsert('tracks', columns, 'filepath', ('duration', 'tempo', '`key`', 'mode'))
+        else:
+            sql = self.backend.insert_ignore('tracks', columns)
+        
+        with self.operation() as (conn, cursor):
+            cursor.executemany(sql, [(row['title'], row['genre'], row['filepath'], row['duration'], row['tempo'],
+                                      row.get('key'), row.get('mode')) for row in rows])
+            inserted = cursor.rowcount
+        return inserted
+    
+    def delete_tracks_by_filepath(self, filepaths):
+        """按文件路径批量删除曲目（标签关联和乐器信息级联删除）
+        
+        Args:
+            filepaths (list): 文件路径列表
+        
+        Returns:
+            int: 删除的曲目数量
+        """
+        if not filepaths:
+            return 0
+        
+        with self.operation() as (conn, cursor):
+            cursor.executemany("DELETE FROM tracks WHERE filepath = %s", [(filepath,) for filepath in filepaths])
+            deleted = cursor.rowcount
+        return deleted
+    
+    def ingest_files(self, items, workers=None, batch_size=500, progress_callback=None, update_existing=False,
+                     analysis_cache=None):
+        """通过批量导入流水线添加曲目
+        
+        Args:
+            items (iterable): 文件路径或导入项字典（filepath、title、artist、genre）
+            workers (int, optional): 解析进程数，默认为CPU核数
+            batch_size (int): 每批插入并提交的行数
+            progress_callback (callable, optional): 进度回调，参数为 (已处理数, 总数)
+            update_existing (bool): 是否更新已存在的曲目
+            analysis_cache (TrackAnalysisCache, optional): 曲目分析缓存，指定时每批提交后预先分析这批曲目
+        
+        Returns:
+            dict: 导入报告
+        """
+        ingestor = LibraryIngestor(
+            self,
+            workers=workers,
+            batch_size=batch_size,
+            progress_callback=progress_callback,
+            update_existing=update_existing,
+            analysis_cache=analysis_cache
+        )
+        report = ingestor.ingest(items)
+        
+        for error in report['errors']:
+            print(f"添加曲目 {error['filepath']} 时出错: {error['error']}")
+        
+        return report
+    
     def add_tag(self, tag_name):
         """添加标签
         
@@ -225,13 +334,11 @@ class MusicDatabase:
         Returns:
             int: 标签ID
         """
-        self.cursor.execute('''
-        INSERT OR IGNORE INTO tags (name)
-        VALUES (?)
-        ''', (tag_name,))
-        
-        self.cursor.execute('SELECT id FROM tags WHERE name = ?', (tag_name,))
-        tag_id = self.cursor.fetchone()[0]
+        with self.operation() as (conn, cursor):
+            cursor.execute(self.backend.insert_ignore('tags', ('name',)), (tag_name,))
+            
+            cursor.execute('SELECT id FROM tags WHERE name = %s', (tag_name,))
+            tag_id = cursor.fetchone()[0]
         return tag_id
     
     def get_track(self, track_id):
@@ -243,52 +350,149 @@ class MusicDatabase:
         Returns:
             dict: 曲目信息
         """
-        self.cursor.execute('''
-        SELECT id, title, artist, genre, filepath, duration, tempo, key, mode, created_at, features
-        FROM tracks
-        WHERE id = ?
-        ''', (track_id,))
-        
-        track = self.cursor.fetchone()
-        if not track:
-            return None
-        
-        track_dict = {
-            'id': track[0],
-            'title': track[1],
-            'artist': track[2],
-            'genre': track[3],
-            'filepath': track[4],
-            'duration': track[5],
-            'tempo': track[6],
-            'key': track[7],
-            'mode': track[8],
-            'created_at': track[9],
-            'features': json.loads(track[10]) if track[10] else {}
-        }
-        
-        # 获取标签
-        self.cursor.execute('''
-        SELECT t.name
-        FROM tags t
-        JOIN track_tags tt ON t.id = tt.tag_id
-        WHERE tt.track_id = ?
-        ''', (track_id,))
-        
-        tags = [row[0] for row in self.cursor.fetchall()]
-        track_dict['tags'] = tags
-        
-        # 获取乐器
-        self.cursor.execute('''
-        SELECT name, program, is_drum
-        FROM instruments
-        WHERE track_id = ?
-        ''', (track_id,))
-        
-        instruments = [{'name': row[0], 'program': row[1], 'is_drum': bool(row[2])} for row in self.cursor.fetchall()]
-        track_dict['instruments'] = instruments
-        
+        with self.operation() as (conn, cursor):
+            cursor.execute('''
+            SELECT id, title, artist, genre, filepath, duration, tempo, `key`, mode, created_at, features
+            FROM tracks
+            WHERE id = %s
+            ''', (track_id,))
+            
+            track = cursor.fetchone()
+            if not track:
+                return None
+            
+            track_dict = {
+                'id': track[0],
+                'title': track[1],
+                'artist': track[2],
+                'genre': track[3],
+                'filepath': track[4],
+                'duration': track[5],
+                'tempo': track[6],
+                'key': track[7],
+                'mode': track[8],
+                'created_at': track[9],
+                'features': json.loads(track[10]) if track[10] else {}
+            }
+            
+            # 获取标签
+            cursor.execute('''
+            SELECT t.name
+            FROM tags t
+            JOIN track_tags tt ON t.id = tt.tag_id
+            WHERE tt.track_id = %s
+            ''', (track_id,))
+            
+            tags = [row[0] for row in cursor.fetchall()]
+            track_dict['tags'] = tags
+            
+            # 获取乐器
+            cursor.execute('''
+            SELECT name, program, is_drum
+            FROM instruments
+            WHERE track_id = %s
+            ''', (track_id,))
+            
+            instruments = [{'name': row[0], 'program': row[1], 'is_drum': bool(row[2])} for row in cursor.fetchall()]
+            track_dict['instruments'] = instruments
+
         return track_dict
+
+    def get_track_filepaths(self, track_ids=None):
+        """批量获取曲目文件路径
+
+        Args:
+            track_ids (list, optional): 曲目ID列表，默认为None（全部曲目）
+
+        Returns:
+            dict: 曲目ID -> 文件路径
+        """
+        if track_ids is not None and not track_ids:
+            return {}
+
+        with self.operation() as (conn, cursor):
+            if track_ids is None:
+                cursor.execute("SELECT id, filepath FROM tracks")
+            else:
+                placeholders = ', '.join(['%s'] * len(track_ids))
+                cursor.execute(f"SELECT id, filepath FROM tracks WHERE id IN ({placeholders})", tuple(track_ids))
+            
+            return {row[0]: row[1] for row in cursor.fetchall()}
+
+    def get_track_ids_by_filepath(self, filepaths, chunk_size=500):
+        """按文件路径批量获取曲目ID
+        
+        Args:
+            filepaths (list): 文件路径列表
+            chunk_size (int): 每条查询包含的路径数量上限（SQLite 限制了单条语句的参数个数）
+        
+        Returns:
+            dict: 文件路径 -> 曲目ID（不在曲库中的路径不包含在内）
+        """
+        filepaths = list(filepaths)
+        track_ids = {}
+        
+        with self.operation() as (conn, cursor):
+            for start in range(0, len(filepaths), chunk_size):
+                chunk = filepaths[start:start + chunk_size]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"SELECT filepath, id FROM tracks WHERE filepath IN ({placeholders})", tuple(chunk))
+                track_ids.update((row[0], row[1]) for row in cursor.fetchall())
+        
+        return track_ids
+
+    def set_track_analysis(self, track_id, features, key=None, mode=None):
+        """保存曲目的分析结果
+        
+        只用 JSON_SET 写入 features 中给出的顶层字段，features 列中的其他字段（例如批量分析
+        写入的 audio）保持不变，不会被分析期间读出的旧副本覆盖。
+        
+        Args:
+            track_id (int): 曲目ID
+            features (dict): 写入 features JSON 列的顶层字段
+            key (str, optional): 调式主音
+            mode (str, optional): 大调/小调
+        
+        Returns:
+            bool: 是否成功更新
+        """
+        if not features:
+            return False
+        
+        assignments = ', '.join([f"%s, {self.backend.json_param}"] * len(features))
+        params = []
+        for name, value in features.items():
+            params.extend((f'$.{name}', json.dumps(value, ensure_ascii=False)))
+        
+        with self.operation() as (conn, cursor):
+            cursor.execute(
+                f"UPDATE tracks SET features = JSON_SET(COALESCE(features, JSON_OBJECT()), {assignments}), "
+                "`key` = COALESCE(%s, `key`), mode = COALESCE(%s, mode) WHERE id = %s",
+                (*params, key, mode, track_id)
+            )
+            updated = cursor.rowcount > 0
+        return updated
+    
+    def update_track_audio_features(self, rows):
+        """批量写入曲目的音频特征摘要（features JSON 列的 audio 字段，其他字段保持不变）
+        
+        Args:
+            rows (list): (曲目ID, 摘要字典) 列表
+        
+        Returns:
+            int: 更新的曲目数量
+        """
+        if not rows:
+            return 0
+        
+        with self.operation() as (conn, cursor):
+            cursor.executemany(
+                "UPDATE tracks SET features = JSON_SET(COALESCE(features, JSON_OBJECT()), '$.audio', "
+                f"{self.backend.json_param}) WHERE id = %s",
+                [(json.dumps(summary, ensure_ascii=False), track_id) for track_id, summary in rows]
+            )
+            updated = cursor.rowcount
+        return updated
     
     def update_track(self, track_id, title=None, artist=None, genre=None):
         """更新曲目信息
@@ -325,10 +529,11 @@ class MusicDatabase:
         query = f"UPDATE tracks SET {', '.join(update_fields)} WHERE id = %s"
         params.append(track_id)
         
-        self.cursor.execute(query, params)
-        self.conn.commit()
+        with self.operation() as (conn, cursor):
+            cursor.execute(query, params)
+            updated = cursor.rowcount > 0
         
-        return self.cursor.rowcount > 0
+        return updated
     
     def delete_track(self, track_id):
         """删除曲目
@@ -340,19 +545,18 @@ class MusicDatabase:
             bool: 是否成功删除
         """
         try:
-            # 删除相关的标签关联
-            self.cursor.execute("DELETE FROM track_tags WHERE track_id = %s", (track_id,))
-            
-            # 删除相关的乐器信息
-            self.cursor.execute("DELETE FROM instruments WHERE track_id = %s", (track_id,))
-            
-            # 删除曲目
-            self.cursor.execute("DELETE FROM tracks WHERE id = %s", (track_id,))
-            
-            self.conn.commit()
-            return self.cursor.rowcount > 0
-        except:
-            self.conn.rollback()
+            with self.operation() as (conn, cursor):
+                # 删除相关的标签关联
+                cursor.execute("DELETE FROM track_tags WHERE track_id = %s", (track_id,))
+                
+                # 删除相关的乐器信息
+                cursor.execute("DELETE FROM instruments WHERE track_id = %s", (track_id,))
+                
+                # 删除曲目
+                cursor.execute("DELETE FROM tracks WHERE id = %s", (track_id,))
+                deleted = cursor.rowcount > 0
+            return deleted
+        except Exception:
             return False
     
     def search_tracks(self, query=None, genre=None, tag=None, key=None, tempo_range=None, limit=100):
@@ -394,8 +598,7 @@ class MusicDatabase:
             
             print(sql)
             # 执行查询
-            self.cursor.execute(sql, params)
-            results = self.cursor.fetchall()
+            results = self._fetchall(sql, params)
             
             # 格式化结果
             tracks = []
@@ -421,8 +624,7 @@ class MusicDatabase:
         Returns:
             list: 曲风列表
         """
-        self.cursor.execute("SELECT DISTINCT genre FROM tracks WHERE genre IS NOT NULL")
-        return [row[0] for row in self.cursor.fetchall()]
+        return [row[0] for row in self._fetchall("SELECT DISTINCT genre FROM tracks WHERE genre IS NOT NULL")]
     
     def get_all_tags(self):
         """获取所有标签
@@ -430,10 +632,10 @@ class MusicDatabase:
         Returns:
             list: 标签列表
         """
-        self.cursor.execute("SELECT name FROM tags")
-        return [row[0] for row in self.cursor.fetchall()]
+        return [row[0] for row in self._fetchall("SELECT name FROM tags")]
     
-    def add_tracks_from_directory(self, directory, recursive=True, genre=None, tags=None):
+    def add_tracks_from_directory(self, directory, recursive=True, genre=None, tags=None,
+                                  workers=None, batch_size=500, progress_callback=None, analysis_cache=None):
         """从目录批量添加MIDI文件
         
         Args:
@@ -441,28 +643,56 @@ class MusicDatabase:
             recursive (bool): 是否递归搜索子目录
             genre (str, optional): 曲风
             tags (list, optional): 标签列表
+            workers (int, optional): 解析进程数，默认为CPU核数
+            batch_size (int): 每批插入并提交的行数
+            progress_callback (callable, optional): 进度回调，参数为 (已处理数, 总数)
+            analysis_cache (TrackAnalysisCache, optional): 曲目分析缓存，指定时每批提交后预先分析这批曲目
         
         Returns:
             int: 添加的曲目数量
         """
-        midi_files = midi_utils.list_midi_files(directory, recursive)
-        count = 0
+        report = self.ingest_files(
+            ({'filepath': filepath, 'genre': genre} for filepath in midi_utils.iter_midi_files(directory, recursive)),
+            workers=workers,
+            batch_size=batch_size,
+            progress_callback=progress_callback,
+            analysis_cache=analysis_cache
+        )
         
-        for filepath in midi_files:
-            try:
-                self.add_track(
-                    filepath=filepath,
-                    title=None,  # 使用文件名
-                    artist=None,
-                    genre=genre,
-                    tags=tags,
-                    extract_features=True
-                )
-                count += 1
-            except Exception as e:
-                print(f"添加曲目 {filepath} 时出错: {e}")
-        
-        return count
+        return report['imported']
+    
+    def sync_directory(self, directory, recursive=True, genre=None, manifest_path=None,
+                       workers=None, batch_size=500, watch=False, interval=5.0, analysis_cache=None):
+        """增量同步目录与曲库：只导入新增或修改的文件，删除已移除文件对应的曲目
+        
+        Args:
+            directory (str): 目录路径
+            recursive (bool): 是否递归扫描子目录
+            genre (str, optional): 新曲目的曲风
+            manifest_path (str, optional): 扫描清单路径，默认按目录存放在 data/manifests 下
+            workers (int, optional): 解析进程数，默认为CPU核数
+            batch_size (int): 每批插入并提交的行数
+            watch (bool): 是否持续监视目录（阻塞，直到被中断）
+            interval (float): 监视模式下的轮询间隔（秒）
+            analysis_cache (TrackAnalysisCache, optional): 曲目分析缓存，指定时每批提交后预先分析新增和修改的曲目
+        
+        Returns:
+            dict: 同步报告（监视模式下为最后一次扫描的报告）
+        """
+        scanner = LibraryScanner(
+            self,
+            directory,
+            manifest_path=manifest_path,
+            recursive=recursive,
+            genre=genre,
+            workers=workers,
+            batch_size=batch_size,
+            analysis_cache=analysis_cache
+        )
+        
+        if watch:
+            return scanner.watch(interval=interval)
+        return scanner.scan()
     
     def get_track_statistics(self):
         """获取数据库统计信息
@@ -472,54 +702,55 @@ class MusicDatabase:
         """
         stats = {}
         
-        # 总曲目数
-        self.cursor.execute("SELECT COUNT(*) FROM tracks")
-        stats['total_tracks'] = self.cursor.fetchone()[0]
-        
-        # 曲风分布
-        self.cursor.execute('''
-        SELECT genre, COUNT(*) as count
-        FROM tracks
-        WHERE genre IS NOT NULL
-        GROUP BY genre
-        ORDER BY count DESC
-        ''')
-        stats['genre_distribution'] = {row[0]: row[1] for row in self.cursor.fetchall()}
-        
-        # 调式分布
-        self.cursor.execute('''
-        SELECT key, mode, COUNT(*) as count
-        FROM tracks
-        WHERE key IS NOT NULL AND mode IS NOT NULL
-        GROUP BY key, mode
-        ORDER BY count DESC
-        ''')
-        stats['key_distribution'] = {f"{row[0]} {row[1]}": row[2] for row in self.cursor.fetchall()}
-        
-        # 速度分布
-        self.cursor.execute('''
-        SELECT 
-            CASE
-                WHEN tempo < 60 THEN 'Very Slow (<60)'
-                WHEN tempo BETWEEN 60 AND 90 THEN 'Slow (60-90)'
-                WHEN tempo BETWEEN 90 AND 120 THEN 'Moderate (90-120)'
-                WHEN tempo BETWEEN 120 AND 160 THEN 'Fast (120-160)'
-                ELSE 'Very Fast (>160)'
-            END as tempo_range,
-            COUNT(*) as count
-        FROM tracks
-        WHERE tempo IS NOT NULL
-        GROUP BY tempo_range
-        ORDER BY 
-            CASE tempo_range
-                WHEN 'Very Slow (<60)' THEN 1
-                WHEN 'Slow (60-90)' THEN 2
-                WHEN 'Moderate (90-120)' THEN 3
-                WHEN 'Fast (120-160)' THEN 4
-                WHEN 'Very Fast (>160)' THEN 5
-            END
-        ''')
-        stats['tempo_distribution'] = {row[0]: row[1] for row in self.cursor.fetchall()}
+        with self.operation() as (conn, cursor):
+            # 总曲目数
+            cursor.execute("SELECT COUNT(*) FROM tracks")
+            stats['total_tracks'] = cursor.fetchone()[0]
+            
+            # 曲风分布
+            cursor.execute('''
+            SELECT genre, COUNT(*) as count
+            FROM tracks
+            WHERE genre IS NOT NULL
+            GROUP BY genre
+            ORDER BY count DESC
+            ''')
+            stats['genre_distribution'] = {row[0]: row[1] for row in cursor.fetchall()}
+            
+            # 调式分布
+            cursor.execute('''
+            SELECT `key`, mode, COUNT(*) as count
+            FROM tracks
+            WHERE `key` IS NOT NULL AND mode IS NOT NULL
+            GROUP BY `key`, mode
+            ORDER BY count DESC
+            ''')
+            stats['key_distribution'] = {f"{row[0]} {row[1]}": row[2] for row in cursor.fetchall()}
+            
+            # 速度分布
+            cursor.execute('''
+            SELECT 
+                CASE
+                    WHEN tempo < 60 THEN 'Very Slow (<60)'
+                    WHEN tempo BETWEEN 60 AND 90 THEN 'Slow (60-90)'
+                    WHEN tempo BETWEEN 90 AND 120 THEN 'Moderate (90-120)'
+                    WHEN tempo BETWEEN 120 AND 160 THEN 'Fast (120-160)'
+                    ELSE 'Very Fast (>160)'
+                END as tempo_range,
+                COUNT(*) as count
+            FROM tracks
+            WHERE tempo IS NOT NULL
+            GROUP BY tempo_range
+            ORDER BY 
+                CASE tempo_range
+                    WHEN 'Very Slow (<60)' THEN 1
+                    WHEN 'Slow (60-90)' THEN 2
+                    WHEN 'Moderate (90-120)' THEN 3
+                    WHEN 'Fast (120-160)' THEN 4
+                    WHEN 'Very Fast (>160)' THEN 5
+                END
+            ''')
+            stats['tempo_distribution'] = {row[0]: row[1] for row in cursor.fetchall()}
         
         return stats
     
@@ -530,52 +761,43 @@ class MusicDatabase:
             output_path (str): 输出CSV文件路径
         """
         # 查询所有曲目
-        self.cursor.execute('''
-        SELECT id, title, artist, genre, filepath, duration, tempo, key, mode, created_at
+        tracks = self._fetchall('''
+        SELECT id, title, artist, genre, filepath, duration, tempo, `key`, mode, created_at
         FROM tracks
         ''')
-        
-        tracks = self.cursor.fetchall()
         columns = ['id', 'title', 'artist', 'genre', 'filepath', 'duration', 'tempo', 'key', 'mode', 'created_at']
         
         df = pd.DataFrame(tracks, columns=columns)
         df.to_csv(output_path, index=False)
     
-    def import_from_csv(self, csv_path, extract_features=True):
+    def import_from_csv(self, csv_path, extract_features=True, workers=None, batch_size=500, analysis_cache=None):
         """从CSV文件导入数据库
         
         Args:
             csv_path (str): CSV文件路径
             extract_features (bool): 是否提取特征
+            workers (int, optional): 解析进程数，默认为CPU核数
+            batch_size (int): 每批插入并提交的行数
+            analysis_cache (TrackAnalysisCache, optional): 曲目分析缓存，指定时每批提交后预先分析这批曲目
         
         Returns:
             int: 导入的曲目数量
         """
         df = pd.read_csv(csv_path)
-        count = 0
         
-        for _, row in df.iterrows():
-            filepath = row['filepath']
-            
-            # 检查文件是否存在
-            if not os.path.exists(filepath):
-                print(f"文件 {filepath} 不存在，跳过")
-                continue
-            
-            try:
-                self.add_track(
-                    filepath=filepath,
-                    title=row.get('title'),
-                    artist=row.get('artist'),
-                    genre=row.get('genre'),
-                    tags=None,  # CSV中没有标签
-                    extract_features=extract_features
-                )
-                count += 1
-            except Exception as e:
-                print(f"导入曲目 {filepath} 时出错: {e}")
-        
-        return count 
+        # 检查文件是否存在
+        exists = df['filepath'].map(os.path.exists)
+        for filepath in df.loc[~exists, 'filepath']:
+            print(f"文件 {filepath} 不存在，跳过")
+        
+        columns = [column for column in ('filepath', 'title', 'artist', 'genre') if column in df.columns]
+        df = df.loc[exists, columns].astype(object)
+        items = df.where(df.notna(), None).to_dict('records')
+        for item in items:
+            item['extract_features'] = extract_features
+        
+        report = self.ingest_files(items, workers=workers, batch_size=batch_size, analysis_cache=analysis_cache)
+        return report['imported']
 
     def get_total_tracks(self):
         """获取总曲目数
@@ -583,8 +805,7 @@ class MusicDatabase:
         Returns:
             int: 总曲目数
         """
-        self.cursor.execute("SELECT COUNT(*) FROM tracks")
-        total_tracks = self.cursor.fetchone()[0]
+        total_tracks = self._fetchall("SELECT COUNT(*) FROM tracks")[0][0]
         return total_tracks
 
     def get_all_genres(self):
@@ -593,6 +814,5 @@ class MusicDatabase:
         Returns:
             list: 曲风列表
         """
-        self.cursor.execute("SELECT DISTINCT genre FROM tracks WHERE genre IS NOT NULL")
-        genres = [row[0] for row in self.cursor.fetchall()]
+        genres = [row[0] for row in self._fetchall("SELECT DISTINCT genre FROM tracks WHERE genre IS NOT NULL")]
         return genres
\ No newline at end of file
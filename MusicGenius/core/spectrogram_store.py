@@ -0,0 +1,349 @@
+"""
+MusicGenius - MIDI频谱图特征库
+
+批量将曲目渲染为对数梅尔频谱图，写入单个 float16 数据文件，并用索引记录每首曲目的位置：
+1. 进程池并行合成音频、计算频谱图
+2. 主进程按帧优先（frames, n_mels）顺序追加写入数据文件，每首曲目占一段连续区域
+3. 索引文件记录 曲目ID -> (起始帧, 帧数)，写入时先写临时文件再替换，中断后可继续追加
+4. 重新渲染已有曲目时新数据同样追加在末尾，旧区域记为废弃帧；废弃帧超过总帧数的
+   COMPACT_RATIO 时压缩：有效数据复制到新的数据文件，索引切换到新文件后再删除旧文件
+
+读取时通过 np.memmap 映射数据文件，按曲目取出的切片不复制数据，
+下游分析和模型训练无需重新合成音频。
+
+命令行用法:
+    python -m MusicGenius.core.spectrogram_store --store data/spectrograms --track-ids 1 2 3
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from ..utils import midi_utils
+
+DATA_FILENAME = 'spectrograms.f16'
+INDEX_FILENAME = 'index.json'
+STORE_DTYPE = np.float16
+
+# 废弃帧占总帧数的比例超过该值时压缩数据文件
+COMPACT_RATIO = 0.25
+
+# 每渲染多少首曲目保存一次索引
+_INDEX_SAVE_INTERVAL = 50
+
+
+def render_spectrogram(item):
+    """渲染单首曲目的频谱图（在工作进程中执行）
+
+    Args:
+        item (tuple): (曲目ID, MIDI文件路径, 参数字典)
+
+    Returns:
+        tuple: (曲目ID, 形状为 (帧数, n_mels) 的 float16 数组, 错误信息)，成功时错误信息为None
+    """
+    track_id, midi_path, params = item
+    try:
+        spectrogram = midi_utils.midi_to_spectrogram(midi_path, **params)
+        return track_id, np.ascontiguousarray(spectrogram.T, dtype=STORE_DTYPE), None
+    except Exception as e:
+        return track_id, None, str(e)
+
+
+def _load_index(store_dir):
+    """读取索引文件，不存在时返回None"""
+    index_path = os.path.join(store_dir, INDEX_FILENAME)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_index(store_dir, index):
+    """原子地写入索引文件"""
+    index_path = os.path.join(store_dir, INDEX_FILENAME)
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(temp_path, index_path)
+
+
+def _data_path(store_dir, index):
+    """数据文件路径（压缩后的数据文件名记录在索引中）"""
+    return os.path.join(store_dir, index.get('data_file', DATA_FILENAME))
+
+
+def compact_spectrogram_store(store_dir):
+    """压缩特征库，去掉被重新渲染的曲目留下的废弃帧
+
+    有效数据按原顺序复制到新的数据文件，索引原子地切换到新文件后才删除旧文件，
+    中途中断不会损坏特征库。
+
+    Args:
+        store_dir (str): 特征库目录
+
+    Returns:
+        int: 回收的帧数
+    """
+    index = _load_index(store_dir)
+    if index is None:
+        raise FileNotFoundError(f"特征库 {store_dir} 不存在")
+    if not index.get('dead_frames'):
+        return 0
+
+    old_path = _data_path(store_dir, index)
+    generation = index.get('generation', 0) + 1
+    data_file_name = f"spectrograms.{generation}.f16"
+    row_shape = (index['n_mels'],)
+
+    old_data = np.memmap(old_path, dtype=index['dtype'], mode='r', shape=(index['total_frames'],) + row_shape)
+    tracks = {}
+    total_frames = 0
+    try:
+        with open(os.path.join(store_dir, data_file_name), 'wb') as data_file:
+            for track_id, (offset, frames) in sorted(index['tracks'].items(), key=lambda item: item[1][0]):
+                data_file.write(old_data[offset:offset + frames].tobytes())
+                tracks[track_id] = [total_frames, frames]
+                total_frames += frames
+            data_file.flush()
+            os.fsync(data_file.fileno())
+    finally:
+        del old_data
+
+    reclaimed = index['total_frames'] - total_frames
+    index.update(tracks=tracks, total_frames=total_frames, dead_frames=0, generation=generation,
+                 data_file=data_file_name)
+    _save_index(store_dir, index)
+
+    try:
+        os.remove(old_path)
+    except OSError as e:
+        print(f"删除旧数据文件 {old_path} 时出错: {e}")
+    return reclaimed
+
+
+def build_spectrogram_store(items, store_dir, workers=None, sr=22050, n_fft=2048, hop_length=512,
+                            n_mels=128, progress_callback=None, overwrite=False):
+    """批量渲染频谱图并追加到特征库
+
+    已在索引中的曲目默认被跳过，同一曲目ID在 items 中出现多次时只渲染一次。
+
+    Args:
+        items (iterable): (曲目ID, MIDI文件路径) 列表
+        store_dir (str): 特征库目录
+        workers (int, optional): 渲染进程数，默认为CPU核数；为1时在当前进程内渲染
+        sr (int): 采样率
+        n_fft (int): FFT窗口大小
+        hop_length (int): 帧移
+        n_mels (int): 梅尔频带数
+        progress_callback (callable, optional): 进度回调，参数为 (已处理数, 总数)
+        overwrite (bool): 是否重新渲染已在索引中的曲目（例如MIDI文件已修改）
+
+    Returns:
+        dict: 渲染报告，包含总数、写入数、跳过数、失败数、每个失败曲目的错误信息和压缩回收的帧数
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    params = {'sr': sr, 'n_fft': n_fft, 'hop_length': hop_length, 'n_mels': n_mels}
+
+    index = _load_index(store_dir)
+    if index is None:
+        index = dict(params, dtype=np.dtype(STORE_DTYPE).name, total_frames=0, tracks={})
+    elif any(index[key] != value for key, value in params.items()):
+        raise ValueError(f"特征库 {store_dir} 的参数与本次渲染参数不一致")
+
+    pending_items = []
+    seen = set()
+    skipped = 0
+    for track_id, midi_path in items:
+        track_id = str(track_id)
+        if track_id in seen or (track_id in index['tracks'] and not overwrite):
+            skipped += 1
+        else:
+            seen.add(track_id)
+            pending_items.append((track_id, midi_path, params))
+
+    report = {'total': len(pending_items) + skipped, 'written': 0, 'skipped': skipped, 'failed': 0, 'errors': [],
+              'reclaimed_frames': 0}
+    if not pending_items:
+        return report
+
+    workers = workers or os.cpu_count() or 1
+    progress_callback = progress_callback or (lambda processed, total: print(f"渲染进度: {processed}/{total}"))
+    row_bytes = n_mels * np.dtype(STORE_DTYPE).itemsize
+
+    data_path = _data_path(store_dir, index)
+    with open(data_path, 'ab') as data_file:
+        # 丢弃上次中断时写入但未记入索引的数据
+        data_file.truncate(index['total_frames'] * row_bytes)
+        data_file.seek(0, os.SEEK_END)
+
+        processed = 0
+        for track_id, spectrogram, error in _render_all(pending_items, workers):
+            processed += 1
+            if error is not None:
+                report['failed'] += 1
+                report['errors'].append({'track_id': track_id, 'error': error})
+            else:
+                data_file.write(spectrogram.tobytes())
+                previous = index['tracks'].get(track_id)
+                if previous is not None:
+                    # 旧数据留在原处，记为废弃帧，由压缩回收
+                    index['dead_frames'] = index.get('dead_frames', 0) + previous[1]
+                index['tracks'][track_id] = [index['total_frames'], len(spectrogram)]
+                index['total_frames'] += len(spectrogram)
+                report['written'] += 1
+
+            if processed % _INDEX_SAVE_INTERVAL == 0:
+                data_file.flush()
+                _save_index(store_dir, index)
+                progress_callback(processed, len(pending_items))
+
+        data_file.flush()
+        _save_index(store_dir, index)
+
+    if processed % _INDEX_SAVE_INTERVAL:
+        progress_callback(processed, len(pending_items))
+
+    if index.get('dead_frames', 0) > COMPACT_RATIO * index['total_frames']:
+        report['reclaimed_frames'] = compact_spectrogram_store(store_dir)
+
+    return report
+
+
+def _render_all(items, workers):
+    """按完成顺序产出渲染结果，进程池中同时在途的任务数有上限"""
+    if workers <= 1 or len(items) == 1:
+        for item in items:
+            yield render_spectrogram(item)
+        return
+
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for item in items:
+            pending.add(executor.submit(render_spectrogram, item))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        for future in pending:
+            yield future.result()
+
+
+class SpectrogramStore:
+    """频谱图特征库的只读访问类"""
+
+    def __init__(self, store_dir):
+        """打开特征库
+
+        Args:
+            store_dir (str): 特征库目录
+        """
+        index = _load_index(store_dir)
+        if index is None:
+            raise FileNotFoundError(f"特征库 {store_dir} 不存在")
+
+        self.store_dir = store_dir
+        self.sr = index['sr']
+        self.n_fft = index['n_fft']
+        self.hop_length = index['hop_length']
+        self.n_mels = index['n_mels']
+        self._tracks = index['tracks']
+
+        if index['total_frames']:
+            self._data = np.memmap(_data_path(store_dir, index), dtype=index['dtype'], mode='r',
+                                   shape=(index['total_frames'], self.n_mels))
+        else:
+            self._data = np.empty((0, self.n_mels), dtype=index['dtype'])
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __contains__(self, track_id):
+        return str(track_id) in self._tracks
+
+    @property
+    def track_ids(self):
+        """特征库中的曲目ID列表"""
+        return list(self._tracks)
+
+    def get(self, track_id):
+        """获取曲目的频谱图
+
+        Args:
+            track_id: 曲目ID
+
+        Returns:
+            ndarray: 形状为 (帧数, n_mels) 的只读视图（不复制数据）
+        """
+        offset, frames = self._tracks[str(track_id)]
+        return self._data[offset:offset + frames]
+
+    def iter_windows(self, length, hop=None):
+        """按固定长度的帧窗口遍历全部曲目，用于模型训练
+
+        Args:
+            length (int): 窗口帧数
+            hop (int, optional): 窗口步长，默认等于窗口长度
+
+        Yields:
+            tuple: (曲目ID, 形状为 (length, n_mels) 的视图)
+        """
+        hop = hop or length
+        for track_id in self._tracks:
+            spectrogram = self.get(track_id)
+            for start in range(0, len(spectrogram) - length + 1, hop):
+                yield track_id, spectrogram[start:start + length]
+
+
+def main(argv=None):
+    """命令行入口：按曲目ID批量渲染频谱图"""
+    parser = argparse.ArgumentParser(description="批量渲染曲目的梅尔频谱图到特征库")
+    parser.add_argument('--track-ids', type=int, nargs='*', help='曲目ID，缺省时渲染全部曲目')
+    parser.add_argument('--store', type=str, default=os.path.join('data', 'spectrograms'), help='特征库目录')
+    parser.add_argument('--workers', type=int, default=None, help='渲染进程数')
+    parser.add_argument('--sr', type=int, default=22050, help='采样率')
+    parser.add_argument('--n_fft', type=int, default=2048, help='FFT窗口大小')
+    parser.add_argument('--hop_length', type=int, default=512, help='帧移')
+    parser.add_argument('--n_mels', type=int, default=128, help='梅尔频带数')
+    parser.add_argument('--overwrite', action='store_true', help='重新渲染已在特征库中的曲目')
+    parser.add_argument('--db_host', type=str, default='localhost', help='MySQL 服务器地址')
+    parser.add_argument('--db_user', type=str, default='root', help='MySQL 用户名')
+    parser.add_argument('--db_password', type=str, default='', help='MySQL 密码')
+    parser.add_argument('--db_name', type=str, default='music_genius', help='MySQL 数据库名')
+    parser.add_argument('--db_backend', type=str, default='mysql', choices=['mysql', 'sqlite'], help='存储后端')
+    parser.add_argument('--db_path', type=str, default=None, help='SQLite 数据库文件路径')
+    args = parser.parse_args(argv)
+
+    from .music_database import MusicDatabase
+
+    db = MusicDatabase(host=args.db_host, user=args.db_user, password=args.db_password, database=args.db_name,
+                       backend=args.db_backend, path=args.db_path)
+    try:
+        filepaths = db.get_track_filepaths(args.track_ids)
+    finally:
+        db.close()
+
+    missing = set(args.track_ids or []) - set(filepaths)
+    for track_id in sorted(missing):
+        print(f"曲目 {track_id} 不存在，跳过")
+
+    report = build_spectrogram_store(
+        sorted(filepaths.items()),
+        args.store,
+        workers=args.workers,
+        sr=args.sr,
+        n_fft=args.n_fft,
+        hop_length=args.hop_length,
+        n_mels=args.n_mels,
+        overwrite=args.overwrite
+    )
+
+    for error in report['errors']:
+        print(f"渲染曲目 {error['track_id']} 时出错: {error['error']}")
+    print(f"完成: 写入 {report['written']}，跳过 {report['skipped']}，失败 {report['failed']}")
+
+
+if __name__ == '__main__':
+    main()
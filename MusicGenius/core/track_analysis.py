@@ -0,0 +1,194 @@
+"""
+MusicGenius - 曲目分析缓存
+
+曲目详情页的分析结果按曲目持久化，页面访问时只需一次数据库查询：
+1. 精简的摘要（调性、速度、时长、特征、乐器、和弦进行）写入 tracks 表的 features JSON 列
+2. 体积较大的数组（音符数组、音高直方图、完整和弦序列、调性变化）写入 npz 附属文件，
+   文件名为MIDI内容哈希，内容相同的文件共享同一份附属文件
+
+摘要中记录了文件大小、修改时间和内容哈希。大小和修改时间都未变时直接使用缓存；
+变化时重新计算哈希，内容确实变化（或 ANALYSIS_VERSION 变化）才重新分析。
+"""
+
+import os
+import tempfile
+import numpy as np
+from ..utils import midi_utils, key_detection
+from ..utils.feature_cache import file_content_hash
+
+# 分析逻辑版本，修改 analyze_midi_track 后需要递增，旧结果会在下次访问时重新计算
+ANALYSIS_VERSION = 1
+
+DEFAULT_SIDECAR_DIR = os.path.join('data', 'analysis')
+
+# 摘要中最多保留的和弦数量，完整序列在附属文件中
+MAX_SUMMARY_CHORDS = 64
+
+
+def analyze_midi_track(filepath):
+    """分析MIDI曲目
+
+    Args:
+        filepath (str): MIDI文件路径
+
+    Returns:
+        tuple: (摘要字典, 数组字典)。摘要包含 key、mode、tempo、duration、note_count、
+            features、instruments、chords，可直接用于曲目详情页
+    """
+    notes = midi_utils.midi_to_note_array(filepath)
+    features = midi_utils.extract_midi_features(filepath)
+    key, mode = midi_utils.extract_key(filepath)
+    instruments = midi_utils.get_instruments(filepath)
+    chords = midi_utils.extract_chords(filepath)
+    key_changes = midi_utils.extract_key_changes(filepath)
+
+    pitched = notes[~notes['is_drum']]
+    summary = {
+        'key': f"{key} {mode}" if key else None,
+        'mode': mode,
+        'tempo': round(float(features['tempo']), 2),
+        'duration': float(features['duration']),
+        'note_count': int(features['num_notes']),
+        'features': {
+            'note_density': float(features['note_density']),
+            'pitch_range': int(features['pitch_range']),
+            'chord_density': float(features['chord_density']),
+            'avg_note_duration': float(features['avg_note_duration'])
+        },
+        'instruments': [inst['name'] for inst in instruments],
+        'chords': [name for _, name in chords[:MAX_SUMMARY_CHORDS]]
+    }
+
+    arrays = {
+        'notes': notes,
+        'pitch_class_histogram': key_detection.pitch_class_histogram(
+            pitched['pitch'], pitched['end'] - pitched['start']),
+        'chord_times': np.array([float(offset) for offset, _ in chords], dtype=np.float64),
+        'chord_names': np.array([name for _, name in chords], dtype=str),
+        'key_change_times': np.array([start for start, _, _ in key_changes], dtype=np.float64),
+        'key_change_names': np.array([f"{tonic} {mode}" for _, tonic, mode in key_changes], dtype=str)
+    }
+
+    return summary, arrays
+
+
+class TrackAnalysisCache:
+    """曲目分析结果的持久化缓存"""
+
+    def __init__(self, db, sidecar_dir=DEFAULT_SIDECAR_DIR, analyzer=analyze_midi_track):
+        """初始化缓存
+
+        Args:
+            db (MusicDatabase): 音乐数据库
+            sidecar_dir (str): npz 附属文件目录
+            analyzer (callable): 分析函数，参数为文件路径，返回 (摘要, 数组字典)
+        """
+        self.db = db
+        self.sidecar_dir = sidecar_dir
+        self.analyzer = analyzer
+
+    def sidecar_path(self, content_hash):
+        """获取内容哈希对应的附属文件路径"""
+        return os.path.join(self.sidecar_dir, f"{content_hash}.npz")
+
+    def get(self, track):
+        """获取曲目的分析摘要，缓存失效时重新分析并写回数据库
+
+        Args:
+            track (dict): get_track 返回的曲目信息
+
+        Returns:
+            dict: 分析摘要
+        """
+        return self._entry(track)['analysis']
+
+    def _entry(self, track):
+        """获取曲目的有效缓存条目（features 列的内容），必要时重新分析"""
+        filepath = track['filepath']
+        stored = track.get('features') or {}
+        stat = os.stat(filepath)
+
+        if stored.get('analysis_version') == ANALYSIS_VERSION and 'analysis' in stored:
+            if stored.get('file_size') == stat.st_size and stored.get('file_mtime_ns') == stat.st_mtime_ns:
+                return stored
+
+            # 只有修改时间变化、内容未变时，更新文件状态后继续使用缓存
+            content_hash = file_content_hash(filepath)
+            if stored.get('content_hash') == content_hash:
+                file_state = {'file_size': stat.st_size, 'file_mtime_ns': stat.st_mtime_ns}
+                self.db.set_track_analysis(track['id'], file_state)
+                return dict(stored, **file_state)
+        else:
+            content_hash = file_content_hash(filepath)
+
+        return self._analyze(track['id'], filepath, content_hash, stat, stored)
+
+    def _analyze(self, track_id, filepath, content_hash, stat, stored=None):
+        """分析曲目并写入数据库和附属文件（features 列中的其他字段保持不变）"""
+        summary, arrays = self.analyzer(filepath)
+
+        os.makedirs(self.sidecar_dir, exist_ok=True)
+        path = self.sidecar_path(content_hash)
+        # 临时文件名唯一，同一曲目被同时分析（例如导入后预热时页面被访问）时互不干扰
+        fd, temp_path = tempfile.mkstemp(prefix=f"{content_hash}.", suffix='.tmp.npz', dir=self.sidecar_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                np.savez_compressed(out, **arrays)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        analysis = {
+            'analysis_version': ANALYSIS_VERSION,
+            'content_hash': content_hash,
+            'file_size': stat.st_size,
+            'file_mtime_ns': stat.st_mtime_ns,
+            'analysis': summary
+        }
+        # 只写入分析相关字段，分析期间其他任务写入的字段（如 audio）不会被旧副本覆盖
+        self.db.set_track_analysis(track_id, analysis, key=summary['key'].split()[0] if summary['key'] else None,
+                                   mode=summary['mode'])
+
+        return dict(stored or {}, **analysis)
+
+    def get_arrays(self, track):
+        """读取曲目分析的数组（附属文件不存在时先分析）
+
+        Args:
+            track (dict): get_track 返回的曲目信息
+
+        Returns:
+            dict: 数组名 -> ndarray
+        """
+        entry = self._entry(track)
+        path = self.sidecar_path(entry['content_hash'])
+
+        # 附属文件被删除时重新生成
+        if not os.path.exists(path):
+            self._analyze(track['id'], track['filepath'], entry['content_hash'], os.stat(track['filepath']), entry)
+
+        with np.load(path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    def warm(self, track_ids=None):
+        """预先分析曲目（例如导入之后），已缓存且未变化的曲目会被跳过
+
+        Args:
+            track_ids (list, optional): 曲目ID列表，默认为None（全部曲目）
+
+        Returns:
+            dict: 报告，包含分析成功和失败的数量以及失败的错误信息
+        """
+        report = {'analyzed': 0, 'failed': 0, 'errors': []}
+
+        for track_id in self.db.get_track_filepaths(track_ids):
+            track = self.db.get_track(track_id)
+            try:
+                self.get(track)
+                report['analyzed'] += 1
+            except Exception as e:
+                report['failed'] += 1
+                report['errors'].append({'filepath': track['filepath'], 'error': str(e)})
+
+        return report
@@ -6,18 +6,22 @@ from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping
 import os
 import pickle
 from music21 import note, chord, stream, instrument, tempo
+from ..utils import midi_utils, midi_corpus, midi_augment
 # 这个是高质量，符合音乐规律的旋律，生成midi文件 
 class LSTMMelodyGenerator:
     """基于LSTM的旋律生成模型"""
     
-    def __init__(self, sequence_length=100, model_path=None):
+    def __init__(self, sequence_length=100, model_path=None, tokenizer_version=midi_utils.DEFAULT_TOKENIZER_VERSION):
         """初始化LSTM旋律生成器
         
         Args:
             sequence_length (int): 输入序列长度
             model_path (str, optional): 预训练模型路径
+            tokenizer_version (int): 训练时使用的分词器版本，见 midi_utils.TOKENIZER_VERSIONS；
+                加载模型时以模型保存的版本为准
         """
         self.sequence_length = sequence_length
+        self.tokenizer_version = tokenizer_version
         self.model = None
         self.notes = []
         self.note_to_int = {}
@@ -95,19 +99,33 @@ class LSTMMelodyGenerator:
         # 打印模型摘要
         self.model.summary()
     
-    def train(self, midi_files, epochs=100, batch_size=64, save_path='model/lstm_melody.h5'):
+    def train(self, midi_files, epochs=100, batch_size=64, save_path='model/lstm_melody.h5', transpositions=None):
         """训练模型
         
         Args:
-            midi_files (list): MIDI文件路径列表
+            midi_files (list | PackedCorpus): MIDI文件路径列表，或打包语料
             epochs (int): 训练轮次
             batch_size (int): 批次大小
             save_path (str): 保存模型路径
+            transpositions (list, optional): 数据增强的转调半音数列表（如 midi_augment.ALL_KEYS），
+                默认为None（不增强）
         """
         # 获取所有音符
         self.notes = []
-        for file in midi_files:
-            self.notes.extend(self._get_notes(file))
+        if isinstance(midi_files, midi_corpus.PackedCorpus):
+            # 打包语料一次顺序读取全部文件
+            for tokens in self._iter_corpus_notes(midi_files):
+                if transpositions:
+                    for variant in midi_augment.augment_tokens(tokens, transpositions):
+                        self.notes.extend(variant)
+                else:
+                    self.notes.extend(tokens)
+        else:
+            for file in midi_files:
+                if transpositions:
+                    self.notes.extend(self._get_augmented_notes(file, transpositions))
+                else:
+                    self.notes.extend(self._get_notes(file))
         
         # 获取所有不同的音符名称
         pitch_names = sorted(set(self.notes))
@@ -149,7 +167,7 @@ class LSTMMelodyGenerator:
         
         # 保存音符映射
         with open(os.path.join(os.path.dirname(save_path), 'note_mappings.pkl'), 'wb') as f:
-            pickle.dump((self.note_to_int, self.int_to_note, self.vocab_size), f)
+            pickle.dump((self.note_to_int, self.int_to_note, self.vocab_size, self.tokenizer_version), f)
 
     # 用户操作触发LSTM 的调用：1.生成旋律（用户在网页上选择风格，长度等参数，提交旋律生成请求）
     # 2. 训练模型，用户上传MIDI 文件，训练新的LSTM 模型
@@ -274,7 +292,10 @@ class LSTMMelodyGenerator:
         mapping_path = os.path.join(os.path.dirname(model_path), 'note_mappings.pkl')
         if os.path.exists(mapping_path):
             with open(mapping_path, 'rb') as f:
-                self.note_to_int, self.int_to_note, self.vocab_size = pickle.load(f)
+                mappings = pickle.load(f)
+            # 旧版本的映射不含分词器版本，均由版本 1（music21）生成
+            self.note_to_int, self.int_to_note, self.vocab_size = mappings[:3]
+            self.tokenizer_version = mappings[3] if len(mappings) > 3 else 1
     
     def save_model(self, model_path):
         """保存模型
@@ -293,44 +314,68 @@ class LSTMMelodyGenerator:
         
         # 保存音符映射
         with open(os.path.join(os.path.dirname(model_path), 'note_mappings.pkl'), 'wb') as f:
-            pickle.dump((self.note_to_int, self.int_to_note, self.vocab_size), f)
+            pickle.dump((self.note_to_int, self.int_to_note, self.vocab_size, self.tokenizer_version), f)
+    
+    def _iter_corpus_notes(self, corpus):
+        """依次产出打包语料中每个文件的音符序列，解析失败的文件被跳过
+        
+        Args:
+            corpus (PackedCorpus): 打包语料
+        
+        Yields:
+            list: 音符列表
+        """
+        if self.tokenizer_version != 1:
+            for _, midi_data in corpus.iter_smf():
+                yield midi_utils.smf_to_tokens(midi_data)
+            return
+        
+        for index, midi_path in enumerate(corpus.paths):
+            data = corpus.get_bytes(index)
+            try:
+                tokens = midi_utils.midi_bytes_to_tokens(data, version=1)
+            except Exception as e:
+                print(f"处理语料中的文件 {midi_path} 时出错，跳过: {e}")
+                continue
+            finally:
+                data.release()
+            yield tokens
     
     def _get_notes(self, midi_path):
         """从MIDI文件中提取音符
         
+        使用 tokenizer_version 指定的分词器，结果按文件内容缓存。
+        
         Args:
             midi_path (str): MIDI文件路径
         
         Returns:
             list: 音符列表
         """
-        from music21 import converter
+        try:
+            return midi_utils.midi_to_tokens(midi_path, version=self.tokenizer_version)
+        except Exception as e:
+            print(f"处理MIDI文件 {midi_path} 时出错: {e}")
+            return []
+    
+    def _get_augmented_notes(self, midi_path, transpositions):
+        """从MIDI文件中提取各转调版本的音符（文件只解析一次）
         
-        notes = []
+        Args:
+            midi_path (str): MIDI文件路径
+            transpositions (list): 转调半音数列表
         
+        Returns:
+            list: 依次拼接的各转调版本音符列表
+        """
         try:
-            midi = converter.parse(midi_path)
-            
-            # 提取所有乐器部分
-            parts = instrument.partitionByInstrument(midi)
-            
-            if parts:  # 文件有乐器部分
-                notes_to_parse = parts.parts[0].recurse()
-            else:  # 文件没有乐器部分
-                notes_to_parse = midi.flat.notes
-            
-            # 提取音符、和弦和休止符
-            for element in notes_to_parse:
-                if isinstance(element, note.Note):
-                    notes.append(str(element.pitch))
-                elif isinstance(element, chord.Chord):
-                    notes.append('.'.join(str(n) for n in element.normalOrder))
-                elif isinstance(element, note.Rest):
-                    notes.append('REST')
+            notes = []
+            for tokens in midi_augment.augment_tokens(midi_path, transpositions, version=self.tokenizer_version):
+                notes.extend(tokens)
+            return notes
         except Exception as e:
             print(f"处理MIDI文件 {midi_path} 时出错: {e}")
-        
-        return notes
+            return []
     
     def _apply_temperature(self, predictions, temperature):
         """应用温度采样
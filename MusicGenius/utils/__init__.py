@@ -3,5 +3,11 @@ MusicGenius 工具模块
 """
 
 from . import midi_utils
+from . import key_detection
+from . import feature_cache
+from . import smf
+from . import midi_corpus
+from . import midi_augment
+from . import note_segmentation
 
-__all__ = ['midi_utils'] 
\ No newline at end of file
+__all__ = ['midi_utils', 'key_detection', 'feature_cache', 'smf', 'midi_corpus', 'midi_augment', 'note_segmentation']
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""
+MIDI特征缓存
+
+以 (文件内容哈希, 提取器版本) 为键，把 MIDI 解析结果持久化到本地 SQLite 数据库，
+重复导入、训练和分析同一文件时直接读取缓存，不再重新解析。
+
+缓存的内容包括速度、调性、特征字典、音符序列（训练用）和音符数组（NoteArray）。
+修改任何提取逻辑后需要增加 EXTRACTOR_VERSION，打开缓存时会自动清除旧版本的条目。
+
+缓存路径可通过环境变量 MUSICGENIUS_FEATURE_CACHE 指定，设置为空字符串时禁用缓存。
+"""
+
+import io
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# 提取器版本，修改 midi_utils 或分词逻辑后需要递增
+# 2: 改用 smf 字节级解析器，音符序列不再由 music21 生成
+# 3: 默认调性轮廓改为与 music21 一致的 aarden
+EXTRACTOR_VERSION = 3
+
+DEFAULT_CACHE_PATH = os.path.join('data', 'feature_cache.db')
+
+# 值的序列化方式
+_KIND_JSON = 'json'
+_KIND_NPY = 'npy'
+
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """计算文件内容的 SHA1 哈希
+
+    Args:
+        path (str): 文件路径
+        chunk_size (int): 每次读取的字节数
+
+    Returns:
+        str: 十六进制哈希值
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class FeatureCache:
+    """基于 SQLite 的MIDI特征缓存"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, version=EXTRACTOR_VERSION):
+        """初始化特征缓存
+
+        Args:
+            path (str): SQLite数据库文件路径
+            version (int): 提取器版本
+        """
+        self.path = path
+        self.version = version
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        # 进程内的哈希缓存: 路径 -> ((文件大小, 修改时间), 哈希)
+        self._hashes = {}
+
+    def _connection(self):
+        """获取当前进程的数据库连接（fork 后的子进程会重新连接）"""
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS midi_features (
+                content_hash TEXT,
+                version INTEGER,
+                name TEXT,
+                kind TEXT,
+                value BLOB,
+                PRIMARY KEY (content_hash, version, name)
+            )
+            ''')
+            # 清除旧版本提取器产生的条目
+            self._conn.execute('DELETE FROM midi_features WHERE version != ?', (self.version,))
+            self._conn.commit()
+            self._pid = os.getpid()
+
+        return self._conn
+
+    def content_hash(self, path):
+        """获取文件内容哈希，文件大小和修改时间未变时复用上次的结果
+
+        Args:
+            path (str): 文件路径
+
+        Returns:
+            str: 十六进制哈希值
+        """
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = file_content_hash(path)
+        self._hashes[path] = (signature, digest)
+        return digest
+
+    def get(self, content_hash, name):
+        """读取缓存条目
+
+        Args:
+            content_hash (str): 文件内容哈希
+            name (str): 条目名称
+
+        Returns:
+            tuple: (是否命中, 值)
+        """
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT kind, value FROM midi_features WHERE content_hash = ? AND version = ? AND name = ?',
+                (content_hash, self.version, name)
+            ).fetchone()
+
+        if row is None:
+            return False, None
+
+        kind, value = row
+        if kind == _KIND_NPY:
+            return True, np.load(io.BytesIO(value), allow_pickle=False)
+        return True, json.loads(value)
+
+    def set(self, content_hash, name, value):
+        """写入缓存条目
+
+        Args:
+            content_hash (str): 文件内容哈希
+            name (str): 条目名称
+            value: 可JSON序列化的值或 numpy 数组
+        """
+        if isinstance(value, np.ndarray):
+            buffer = io.BytesIO()
+            np.save(buffer, value, allow_pickle=False)
+            kind, blob = _KIND_NPY, buffer.getvalue()
+        else:
+            kind, blob = _KIND_JSON, json.dumps(value, default=_json_default)
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO midi_features (content_hash, version, name, kind, value) VALUES (?, ?, ?, ?, ?)',
+                (content_hash, self.version, name, kind, blob)
+            )
+            conn.commit()
+
+    def get_or_compute(self, path, name, compute):
+        """读取缓存，未命中时计算并写入
+
+        Args:
+            path (str): MIDI文件路径
+            name (str): 条目名称
+            compute (callable): 无参数的计算函数
+
+        Returns:
+            缓存或计算得到的值
+        """
+        try:
+            content_hash = self.content_hash(path)
+        except OSError:
+            return compute()
+
+        hit, value = self.get(content_hash, name)
+        if hit:
+            return value
+
+        value = compute()
+        try:
+            self.set(content_hash, name, value)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"写入特征缓存 {path} 时出错: {e}")
+        return value
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM midi_features')
+            conn.commit()
+
+
+def _json_default(value):
+    """JSON序列化 numpy 标量"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化类型 {type(value).__name__}")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """获取默认的特征缓存
+
+    Returns:
+        FeatureCache: 特征缓存，禁用时返回None
+    """
+    global _default_cache
+
+    path = os.environ.get('MUSICGENIUS_FEATURE_CACHE', DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None or _default_cache.path != path:
+            _default_cache = FeatureCache(path)
+        return _default_cache
+
+
+def cached(path, name, compute):
+    """通过默认缓存读取或计算MIDI文件的某项特征
+
+    Args:
+        path (str): MIDI文件路径
+        name (str): 条目名称
+        compute (callable): 无参数的计算函数
+
+    Returns:
+        缓存或计算得到的值
+    """
+    cache = get_default_cache()
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(path, name, compute)
@@ -0,0 +1,227 @@
+"""
+调性检测模块
+
+基于 Krumhansl-Schmuckler 算法的向量化调性检测：
+1. 用 numpy 从音符数组计算按时值加权的音级直方图
+2. 通过一次矩阵乘法与全部 24 个（12 个主音 × 大调/小调）旋转后的调性轮廓求相关系数
+3. 相关系数最大的调即为估计结果
+
+可选地按时间窗口逐段估计调性，用于追踪转调。
+"""
+
+import numpy as np
+
+# 与 music21 一致的主音拼写（降号写作 '-'）
+TONIC_NAMES = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'G#', 'A', 'B-', 'B']
+
+# 调性轮廓 (大调, 小调)
+KEY_PROFILES = {
+    # Krumhansl & Kessler (1982)
+    'krumhansl': (
+        [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88],
+        [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+    ),
+    # Aarden & Essen (2003)
+    'aarden': (
+        [17.7661, 0.145624, 14.9265, 0.160186, 19.8049, 11.3587, 0.291248, 22.062, 0.145624, 8.15494, 0.232998, 4.95122],
+        [18.2648, 0.737619, 14.0499, 16.8599, 0.702494, 14.4362, 0.702494, 18.6161, 4.56621, 1.93186, 7.37619, 1.75623]
+    ),
+}
+
+# 默认轮廓，与 music21 的 'key' 分析一致
+DEFAULT_PROFILE = 'aarden'
+
+# 与 music21 结果比较时期望达到的最低一致率
+MUSIC21_AGREEMENT_TARGET = 0.9
+
+_profile_matrices = {}
+
+
+def _zscore(x, axis=-1):
+    """沿指定轴做零均值、单位方差标准化"""
+    x = np.asarray(x, dtype=np.float64)
+    x = x - x.mean(axis=axis, keepdims=True)
+    norm = np.sqrt((x ** 2).sum(axis=axis, keepdims=True))
+    return np.divide(x, norm, out=np.zeros_like(x), where=norm > 0)
+
+
+def get_profile_matrix(profile=DEFAULT_PROFILE):
+    """获取标准化后的 24×12 调性轮廓矩阵
+
+    第 k 行 (k < 12) 为主音 k 的大调轮廓，第 12 + k 行为主音 k 的小调轮廓。
+
+    Args:
+        profile (str): 轮廓名称，见 KEY_PROFILES
+
+    Returns:
+        ndarray: 形状为 (24, 12) 的矩阵
+    """
+    if profile not in KEY_PROFILES:
+        raise ValueError(f"未知的调性轮廓: {profile}，可选: {', '.join(KEY_PROFILES)}")
+
+    if profile not in _profile_matrices:
+        major, minor = (np.asarray(p, dtype=np.float64) for p in KEY_PROFILES[profile])
+        rows = [np.roll(major, k) for k in range(12)] + [np.roll(minor, k) for k in range(12)]
+        _profile_matrices[profile] = _zscore(np.stack(rows))
+
+    return _profile_matrices[profile]
+
+
+def pitch_class_histogram(pitches, durations):
+    """计算按时值加权的音级直方图
+
+    Args:
+        pitches (ndarray): MIDI音高数组
+        durations (ndarray): 对应的时值数组
+
+    Returns:
+        ndarray: 长度为 12 的直方图
+    """
+    pitch_classes = np.asarray(pitches, dtype=np.int64) % 12
+    weights = np.clip(np.asarray(durations, dtype=np.float64), 0, None)
+    return np.bincount(pitch_classes, weights=weights, minlength=12)
+
+
+def key_correlations(histograms, profile=DEFAULT_PROFILE):
+    """计算直方图与全部 24 个调性轮廓的相关系数
+
+    Args:
+        histograms (ndarray): 形状为 (12,) 或 (n, 12) 的音级直方图
+        profile (str): 轮廓名称
+
+    Returns:
+        ndarray: 形状为 (24,) 或 (n, 24) 的相关系数
+    """
+    return _zscore(histograms) @ get_profile_matrix(profile).T
+
+
+def key_index_to_name(index):
+    """将调性索引转换为 (主音, 调式)
+
+    Args:
+        index (int): 0-23 的调性索引
+
+    Returns:
+        tuple: (主音, 'major'/'minor')
+    """
+    return TONIC_NAMES[index % 12], 'major' if index < 12 else 'minor'
+
+
+def estimate_key_from_histogram(histogram, profile=DEFAULT_PROFILE):
+    """根据音级直方图估计调性
+
+    Args:
+        histogram (ndarray): 长度为 12 的音级直方图（也可以是色度均值）
+        profile (str): 轮廓名称
+
+    Returns:
+        tuple: (主音, 调式)，直方图为空时返回 (None, None)
+    """
+    histogram = np.asarray(histogram, dtype=np.float64)
+    if not np.any(histogram > 0):
+        return None, None
+
+    return key_index_to_name(int(np.argmax(key_correlations(histogram, profile))))
+
+
+def estimate_key(notes, profile=DEFAULT_PROFILE):
+    """估计音符数组的整体调性
+
+    Args:
+        notes (ndarray): 音符数组（见 note_array.NOTE_DTYPE），应已去除鼓声
+        profile (str): 轮廓名称
+
+    Returns:
+        tuple: (主音, 调式)，没有音符时返回 (None, None)
+    """
+    if len(notes) == 0:
+        return None, None
+
+    histogram = pitch_class_histogram(notes['pitch'], notes['end'] - notes['start'])
+    return estimate_key_from_histogram(histogram, profile)
+
+
+def estimate_key_windows(notes, window=8.0, hop=4.0, profile=DEFAULT_PROFILE):
+    """按时间窗口逐段估计调性，用于追踪转调
+
+    每个窗口的直方图权重为音符与窗口的重叠时长。
+
+    Args:
+        notes (ndarray): 音符数组，应已去除鼓声
+        window (float): 窗口长度（秒）
+        hop (float): 窗口步长（秒）
+        profile (str): 轮廓名称
+
+    Returns:
+        list: [(窗口开始时间, 主音, 调式), ...]，没有音符的窗口主音和调式为 None
+    """
+    if len(notes) == 0:
+        return []
+
+    starts = notes['start']
+    ends = notes['end']
+    window_starts = np.arange(0.0, max(float(ends.max()) - window, 0.0) + hop, hop)
+    window_ends = window_starts + window
+
+    # 音符与窗口的重叠时长矩阵 (n_notes, n_windows)
+    overlap = np.minimum(ends[:, None], window_ends[None, :]) - np.maximum(starts[:, None], window_starts[None, :])
+    np.clip(overlap, 0, None, out=overlap)
+
+    # 按音级汇总得到每个窗口的直方图 (n_windows, 12)
+    pitch_class_onehot = np.eye(12)[notes['pitch'].astype(np.int64) % 12]
+    histograms = overlap.T @ pitch_class_onehot
+
+    key_indices = np.argmax(key_correlations(histograms, profile), axis=1)
+    active = histograms.sum(axis=1) > 0
+
+    results = []
+    for start, index, is_active in zip(window_starts.tolist(), key_indices.tolist(), active.tolist()):
+        tonic, mode = key_index_to_name(index) if is_active else (None, None)
+        results.append((start, tonic, mode))
+
+    return results
+
+
+def compare_with_music21(midi_paths, profile=DEFAULT_PROFILE):
+    """在语料上比较本模块与 music21 的调性检测结果
+
+    主音按音级比较，忽略等音拼写的差异。
+
+    Args:
+        midi_paths (list): MIDI文件路径列表
+        profile (str): 轮廓名称
+
+    Returns:
+        dict: 比较结果，包含总数、一致数、一致率及不一致的文件
+    """
+    from music21 import converter, analysis
+    from . import midi_utils
+
+    total = 0
+    agreed = 0
+    mismatches = []
+
+    for midi_path in midi_paths:
+        try:
+            reference = analysis.discrete.analyzeStream(converter.parse(midi_path), 'key')
+            expected = (reference.tonic.pitchClass, reference.mode) if reference is not None else (None, None)
+            tonic, mode = midi_utils.extract_key(midi_path, profile=profile)
+            actual = (TONIC_NAMES.index(tonic), mode) if tonic is not None else (None, None)
+        except Exception as e:
+            print(f"比较文件 {midi_path} 时出错: {e}")
+            continue
+
+        total += 1
+        if actual == expected:
+            agreed += 1
+        else:
+            mismatches.append({'filepath': midi_path, 'expected': expected, 'actual': actual})
+
+    agreement = agreed / total if total else 0.0
+    return {
+        'total': total,
+        'agreed': agreed,
+        'agreement': agreement,
+        'meets_target': agreement >= MUSIC21_AGREEMENT_TARGET,
+        'mismatches': mismatches
+    }
@@ -0,0 +1,251 @@
+"""
+MIDI批量转调与数据增强
+
+每个文件只解析一次，在内存中的音符数组上一次生成全部转调和速度变体：
+- augment_note_array: 返回每个变体的音符数组，供训练流程直接使用
+- augment_tokens: 返回每个转调变体的训练音符序列（分词器版本 1 直接转调音符序列，不重新解析）
+- render_augmentations: 用线程池并行将各变体编码为MIDI字节
+- write_augmentations: 将各变体并行写入目录
+
+速度变体通过拉伸音符时间实现，写出时同时按比例调整速度，保持拍点位置不变。
+"""
+
+import os
+import re
+import math
+from concurrent.futures import ThreadPoolExecutor
+from . import midi_utils
+from . import smf
+from .key_detection import TONIC_NAMES
+
+# 全部 12 个调的转调半音数
+ALL_KEYS = tuple(range(-6, 6))
+
+# 网页导出接口单次请求允许的最多转调数和变速数
+MAX_EXPORT_SEMITONES = 25
+MAX_EXPORT_STRETCH_FACTORS = 4
+
+# 音名记号（如 'C#4'、'B-3'），八度为 -1 时与降号有歧义（'E-1'），优先解析为降号
+_PITCH_TOKEN = re.compile(r'^([A-G][#-]?)(-?\d+)$')
+_CHORD_TOKEN = re.compile(r'^\d+(\.\d+)*$')
+
+
+def _load(source):
+    """读取音符数组和初始速度
+
+    Args:
+        source (str | dict | ndarray): MIDI文件路径、smf.read_smf 的解析结果或音符数组
+
+    Returns:
+        tuple: (音符数组, 速度)
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return midi_utils.midi_to_note_array(source), midi_utils.get_tempo(source)
+    if isinstance(source, dict):
+        tempi = source['tempo_changes'][1]
+        return source['notes'], float(tempi[0]) if len(tempi) > 0 else smf.DEFAULT_TEMPO
+    return source, smf.DEFAULT_TEMPO
+
+
+def augment_note_array(source, semitones=ALL_KEYS, stretch_factors=(1.0,), clamp='octave'):
+    """生成转调和速度变体
+
+    Args:
+        source (str | dict | ndarray): MIDI文件路径、smf.read_smf 的解析结果或音符数组
+        semitones (iterable): 转调半音数列表
+        stretch_factors (iterable): 时间拉伸系数列表，1.0 为原速
+        clamp (str): 超出音域时的处理方式，见 midi_utils.transpose_note_array
+
+    Returns:
+        dict: (半音数, 拉伸系数) -> 音符数组
+    """
+    stretch_factors = _check_stretch_factors(stretch_factors)
+    notes, _ = _load(source)
+
+    variants = {}
+    for factor in stretch_factors:
+        stretched = midi_utils.time_stretch_note_array(notes, factor) if factor != 1.0 else notes
+        for semitone in semitones:
+            variants[(semitone, factor)] = midi_utils.transpose_note_array(stretched, semitone, clamp=clamp)
+
+    return variants
+
+
+def _parse_pitch_token(token):
+    """解析音名记号，返回MIDI音高，不是音名时返回None"""
+    match = _PITCH_TOKEN.match(token)
+    if match is None:
+        return None
+    name, octave = match.groups()
+    if name not in TONIC_NAMES:
+        # 'C-1' 等：不带降号的音名，八度为 -1
+        name, octave = name[0], '-' + octave
+        if name not in TONIC_NAMES:
+            return None
+    return TONIC_NAMES.index(name) + 12 * (int(octave) + 1)
+
+
+def transpose_tokens(tokens, semitones, clamp='octave'):
+    """转调训练音符序列
+
+    音名按 music21 的默认拼写重新生成，和弦重新计算 normal order，结果与 music21
+    解析转调后的MIDI文件得到的序列相同。
+
+    Args:
+        tokens (list): 音符序列（格式见 midi_utils.stream_to_tokens）
+        semitones (int): 转调半音数
+        clamp (str): 超出音域时的处理方式，'octave'、'clip' 或 'drop'
+
+    Returns:
+        list: 转调后的音符序列
+    """
+    if clamp not in ('octave', 'clip', 'drop'):
+        raise ValueError("clamp参数必须是'octave'、'clip'或'drop'")
+
+    transposed = []
+    for token in tokens:
+        if _CHORD_TOKEN.match(token):
+            pitch_classes = [(int(pc) + semitones) % 12 for pc in token.split('.')]
+            transposed.append('.'.join(str(pc) for pc in midi_utils.normal_order(pitch_classes)))
+            continue
+
+        pitch = _parse_pitch_token(token)
+        if pitch is None:
+            transposed.append(token)
+            continue
+
+        pitch += semitones
+        if not 0 <= pitch <= 127:
+            if clamp == 'drop':
+                continue
+            if clamp == 'clip':
+                pitch = min(max(pitch, 0), 127)
+            elif pitch < 0:
+                pitch += 12 * ((11 - pitch) // 12)
+            else:
+                pitch -= 12 * ((pitch - 116) // 12)
+        transposed.append(f"{TONIC_NAMES[pitch % 12]}{pitch // 12 - 1}")
+
+    return transposed
+
+
+def _check_stretch_factors(stretch_factors):
+    """检查拉伸系数必须为正的有限数"""
+    stretch_factors = list(stretch_factors)
+    for factor in stretch_factors:
+        if not math.isfinite(factor) or factor <= 0:
+            raise ValueError(f"拉伸系数必须为正数: {factor}")
+    return stretch_factors
+
+
+def parse_export_params(semitones=None, stretch=None):
+    """解析并检查导出接口的转调和变速参数
+
+    Args:
+        semitones (str, optional): 逗号分隔的转调半音数，缺省为全部 12 个调
+        stretch (str, optional): 逗号分隔的拉伸系数，缺省为原速
+
+    Returns:
+        tuple: (去重后的半音数列表, 去重后的拉伸系数列表)
+
+    Raises:
+        ValueError: 参数无法解析、拉伸系数不为正数或数量超过上限
+    """
+    semitones = list(dict.fromkeys(int(value) for value in semitones.split(','))) if semitones else list(ALL_KEYS)
+    stretch_factors = list(dict.fromkeys(float(value) for value in stretch.split(','))) if stretch else [1.0]
+
+    if len(semitones) > MAX_EXPORT_SEMITONES:
+        raise ValueError(f"转调数不能超过 {MAX_EXPORT_SEMITONES} 个")
+    if len(stretch_factors) > MAX_EXPORT_STRETCH_FACTORS:
+        raise ValueError(f"变速数不能超过 {MAX_EXPORT_STRETCH_FACTORS} 个")
+    return semitones, _check_stretch_factors(stretch_factors)
+
+
+def augment_tokens(source, semitones=ALL_KEYS, clamp='octave', version=midi_utils.DEFAULT_TOKENIZER_VERSION):
+    """生成各转调变体的训练音符序列
+
+    文件只解析一次：版本 1 分词后对音符序列转调，版本 2 对音符数组转调后分词。
+
+    Args:
+        source (str | dict | ndarray | list): MIDI文件路径、已分词的音符序列，
+            版本 2 时也可以是 smf.read_smf 的解析结果或音符数组
+        semitones (iterable): 转调半音数列表
+        clamp (str): 超出音域时的处理方式
+        version (int): 分词器版本，见 midi_utils.TOKENIZER_VERSIONS
+
+    Returns:
+        list: 每个变体的音符序列
+    """
+    if version not in midi_utils.TOKENIZER_VERSIONS:
+        raise ValueError(f"未知的分词器版本: {version}")
+    if isinstance(source, list) or version == 1:
+        tokens = source if isinstance(source, list) else midi_utils.midi_to_tokens(source, version=1)
+        return [transpose_tokens(tokens, semitone, clamp=clamp) for semitone in semitones]
+
+    notes, tempo = _load(source)
+    return [
+        midi_utils.notes_to_tokens(midi_utils.transpose_note_array(notes, semitone, clamp=clamp), tempo=tempo)
+        for semitone in semitones
+    ]
+
+
+def render_augmentations(source, semitones=ALL_KEYS, stretch_factors=(1.0,), clamp='octave', workers=None):
+    """将各变体并行编码为MIDI文件内容
+
+    Args:
+        source (str | dict | ndarray): MIDI文件路径、smf.read_smf 的解析结果或音符数组
+        semitones (iterable): 转调半音数列表
+        stretch_factors (iterable): 时间拉伸系数列表
+        clamp (str): 超出音域时的处理方式
+        workers (int, optional): 编码线程数，默认为CPU核数
+
+    Returns:
+        dict: (半音数, 拉伸系数) -> MIDI文件字节
+    """
+    # 只读取一次，音符数组和速度一起向下传递
+    notes, tempo = _load(source)
+    variants = augment_note_array(notes, semitones, stretch_factors, clamp)
+
+    def encode(key):
+        # 拉伸后同步调整速度，使拍点位置保持不变
+        return key, smf.write_smf(variants[key], tempo=tempo / key[1])
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        return dict(executor.map(encode, variants))
+
+
+def variant_filename(base, semitone, factor):
+    """生成变体的文件名，如 song_t+2_x1.00.mid"""
+    return f"{base}_t{semitone:+d}_x{factor:.2f}.mid"
+
+
+def write_augmentations(source, output_dir, semitones=ALL_KEYS, stretch_factors=(1.0,), clamp='octave',
+                        workers=None, base_name=None):
+    """将各变体并行写入目录
+
+    Args:
+        source (str | dict | ndarray): MIDI文件路径、smf.read_smf 的解析结果或音符数组
+        output_dir (str): 输出目录
+        semitones (iterable): 转调半音数列表
+        stretch_factors (iterable): 时间拉伸系数列表
+        clamp (str): 超出音域时的处理方式
+        workers (int, optional): 编码线程数
+        base_name (str, optional): 输出文件名前缀，默认为源文件名
+
+    Returns:
+        dict: (半音数, 拉伸系数) -> 输出文件路径
+    """
+    if base_name is None:
+        base_name = os.path.splitext(os.path.basename(source))[0] if isinstance(source, (str, os.PathLike)) else 'midi'
+    os.makedirs(output_dir, exist_ok=True)
+
+    rendered = render_augmentations(source, semitones, stretch_factors, clamp, workers)
+
+    paths = {}
+    for (semitone, factor), data in rendered.items():
+        path = os.path.join(output_dir, variant_filename(base_name, semitone, factor))
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths[(semitone, factor)] = path
+
+    return paths
@@ -0,0 +1,175 @@
+"""
+MIDI语料读取模块
+
+1. 通过 mmap 读取MIDI文件并直接交给 smf 解析器，多个工作进程读取同一文件时共享内核页缓存
+2. 打包语料（packed corpus）：把整个库的MIDI文件内容拼接成一个带偏移表的二进制文件，
+   扫描全部语料只需一次顺序读取，而不是打开成千上万个小文件
+
+打包语料的文件格式（整数均为小端）：
+    magic (4字节 'MGPC') | version (uint32) | count (uint64) | index_offset (uint64)
+    MIDI数据区：所有文件内容依次拼接
+    偏移表（位于 index_offset）：count 组 (offset, length)，均为 uint64
+    路径表：紧跟偏移表，UTF-8 编码的 JSON 数组
+"""
+
+import os
+import json
+import mmap
+import struct
+import numpy as np
+from . import smf
+
+CORPUS_MAGIC = b'MGPC'
+CORPUS_VERSION = 1
+CORPUS_EXTENSION = '.mgpc'
+
+_HEADER = struct.Struct('<4sIQQ')
+
+
+def read_smf_file(midi_path):
+    """通过 mmap 读取并解析MIDI文件
+
+    Args:
+        midi_path (str): MIDI文件路径
+
+    Returns:
+        dict: smf.read_smf 的解析结果
+    """
+    with open(midi_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"MIDI文件 {midi_path} 为空")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return smf.read_smf(mm)
+
+
+def pack_corpus(midi_paths, output_path):
+    """将多个MIDI文件打包为一个语料文件
+
+    Args:
+        midi_paths (list): MIDI文件路径列表
+        output_path (str): 输出语料文件路径
+
+    Returns:
+        int: 打包的文件数量
+    """
+    offsets = []
+    packed_paths = []
+
+    with open(output_path, 'wb') as out:
+        out.write(_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, 0, 0))
+
+        for midi_path in midi_paths:
+            try:
+                with open(midi_path, 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                print(f"读取文件 {midi_path} 时出错，跳过: {e}")
+                continue
+
+            offsets.append((out.tell(), len(data)))
+            packed_paths.append(midi_path)
+            out.write(data)
+
+        index_offset = out.tell()
+        out.write(np.asarray(offsets, dtype='<u8').reshape(-1, 2).tobytes())
+        out.write(json.dumps(packed_paths, ensure_ascii=False).encode('utf-8'))
+
+        # 回写文件头
+        out.seek(0)
+        out.write(_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, len(packed_paths), index_offset))
+
+    return len(packed_paths)
+
+
+class PackedCorpus:
+    """打包语料的只读访问类，基于 mmap，按索引零拷贝地取出单个MIDI文件的内容"""
+
+    def __init__(self, corpus_path):
+        """打开打包语料
+
+        Args:
+            corpus_path (str): 语料文件路径
+        """
+        self.corpus_path = corpus_path
+        self._file = open(corpus_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, index_offset = _HEADER.unpack_from(self._mm, 0)
+        if magic != CORPUS_MAGIC:
+            self.close()
+            raise ValueError(f"{corpus_path} 不是有效的打包语料文件")
+        if version != CORPUS_VERSION:
+            self.close()
+            raise ValueError(f"不支持的打包语料版本: {version}")
+
+        table_size = count * 2 * 8
+        self._offsets = np.frombuffer(self._mm, dtype='<u8', count=count * 2, offset=index_offset).reshape(-1, 2)
+        self.paths = json.loads(self._mm[index_offset + table_size:].decode('utf-8'))
+        self._view = memoryview(self._mm)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """关闭语料文件"""
+        # 释放所有指向 mmap 的视图后才能关闭
+        self._offsets = None
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+            self._view = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_bytes(self, index):
+        """获取第 index 个MIDI文件的内容
+
+        Args:
+            index (int): 文件索引
+
+        Returns:
+            memoryview: 指向语料文件内部的只读视图（不复制数据）
+        """
+        offset, length = (int(value) for value in self._offsets[index])
+        return self._view[offset:offset + length]
+
+    def read_smf(self, index):
+        """解析第 index 个MIDI文件
+
+        Args:
+            index (int): 文件索引
+
+        Returns:
+            dict: smf.read_smf 的解析结果
+        """
+        data = self.get_bytes(index)
+        try:
+            return smf.read_smf(data)
+        finally:
+            data.release()
+
+    def iter_smf(self):
+        """按存储顺序依次解析全部文件
+
+        解析失败的文件会被跳过。
+
+        Yields:
+            tuple: (原始文件路径, smf.read_smf 的解析结果)
+        """
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+
+        for index, midi_path in enumerate(self.paths):
+            try:
+                yield midi_path, self.read_smf(index)
+            except (ValueError, IndexError) as e:
+                print(f"解析语料中的文件 {midi_path} 时出错，跳过: {e}")
@@ -1,9 +1,54 @@
 import os
-import glob
 import numpy as np
 import pretty_midi
 from music21 import converter, instrument, note, chord, stream
 import librosa
+from . import key_detection
+from . import feature_cache
+from . import midi_corpus
+from . import smf
+from . import note_segmentation
+from .note_array import NOTE_DTYPE, empty_note_array, note_array_to_dicts
+
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
+# 训练分词器版本，训练和生成必须使用同一版本（与模型的音符映射一起保存）：
+# 1: music21 解析（默认），与已有模型和数据集的词表一致
+# 2: 基于 smf 音符数组的快速分词，不构建 music21 流，但序列与版本 1 不同
+TOKENIZER_VERSIONS = (1, 2)
+DEFAULT_TOKENIZER_VERSION = 1
+
+def iter_midi_files(directory, recursive=True, failed_dirs=None):
+    """单次遍历目录，逐个产出MIDI文件路径
+    
+    根目录无法读取（不存在、未挂载、没有权限）时抛出 OSError；
+    子目录读取失败时打印错误并跳过该子目录。
+    
+    Args:
+        directory (str): 目录路径
+        recursive (bool): 是否递归搜索子目录
+        failed_dirs (list, optional): 读取失败的子目录路径会追加到该列表中
+    
+    Yields:
+        str: MIDI文件路径
+    """
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            pending.append(entry.path)
+                    elif entry.name.lower().endswith(MIDI_EXTENSIONS) and entry.is_file():
+                        yield entry.path
+        except OSError as e:
+            if current == directory:
+                raise
+            print(f"读取目录 {current} 时出错: {e}")
+            if failed_dirs is not None:
+                failed_dirs.append(current)
 
 def list_midi_files(directory, recursive=True):
     """列出目录中的所有MIDI文件
@@ -15,13 +60,7 @@ def list_midi_files(directory, recursive=True):
     Returns:
         list: MIDI文件路径列表
     """
-    pattern = os.path.join(directory, '**', '*.mid') if recursive else os.path.join(directory, '*.mid')
-    midi_files = glob.glob(pattern, recursive=recursive)
-    
-    pattern = os.path.join(directory, '**', '*.midi') if recursive else os.path.join(directory, '*.midi')
-    midi_files.extend(glob.glob(pattern, recursive=recursive))
-    
-    return sorted(midi_files)
+    return sorted(iter_midi_files(directory, recursive))
 
 def midi_to_notes(midi_path):
     """从MIDI文件中提取音符信息
@@ -32,24 +71,8 @@ def midi_to_notes(midi_path):
     Returns:
         list: 音符对象列表
     """
-    midi_data = pretty_midi.PrettyMIDI(midi_path)
-    notes = []
-    
-    for instrument in midi_data.instruments:
-        # 跳过鼓声轨道
-        if instrument.is_drum:
-            continue
-            
-        for note in instrument.notes:
-            notes.append({
-                'pitch': note.pitch,
-                'start': note.start,
-                'end': note.end,
-                'velocity': note.velocity,
-                'instrument': instrument.program
-            })
-    
-    return sorted(notes, key=lambda x: x['start'])
+    # 跳过鼓声轨道
+    return note_array_to_dicts(midi_to_note_array(midi_path, include_drums=False))
 
 def notes_to_midi(notes, output_path, tempo=120, program=0):
     """将音符信息转换为MIDI文件
@@ -117,29 +140,65 @@ def extract_chords(midi_path):
     chords = []
     
     # 提取和弦
-    for element in midi.flat.getElementsByClass('Chord'):
+    for element in midi.flatten().getElementsByClass('Chord'):
         chords.append((element.offset, element.pitchedCommonName))
     
     return chords
 
-def extract_key(midi_path):
+def midi_to_note_array(midi_path, include_drums=True):
+    """从MIDI文件中提取音符数组
+    
+    Args:
+        midi_path (str): MIDI文件路径
+        include_drums (bool): 是否包含鼓声轨道
+    
+    Returns:
+        ndarray: 按开始时间排序的音符数组（见 note_array.NOTE_DTYPE）
+    """
+    notes = feature_cache.cached(midi_path, 'note_array', lambda: midi_corpus.read_smf_file(midi_path)['notes'])
+    return notes if include_drums else notes[~notes['is_drum']]
+
+def extract_key(midi_path, profile=key_detection.DEFAULT_PROFILE):
     """从MIDI文件中提取调式
     
+    使用向量化的 Krumhansl-Schmuckler 算法，不再构建 music21 流。
+    默认的 'aarden' 轮廓与 music21 的 'key' 分析结果一致。
+    
     Args:
         midi_path (str): MIDI文件路径
+        profile (str): 调性轮廓，'aarden' 或 'krumhansl'
     
     Returns:
         tuple: (调式, 大调/小调)
     """
-    from music21 import analysis
+    def compute():
+        notes = midi_to_note_array(midi_path, include_drums=False)
+        return key_detection.estimate_key(notes, profile=profile)
     
-    midi = converter.parse(midi_path)
-    key = analysis.discrete.analyzeStream(midi, 'key')
+    return tuple(feature_cache.cached(midi_path, f'key:{profile}', compute))
+
+def extract_key_changes(midi_path, window=8.0, hop=4.0, profile=key_detection.DEFAULT_PROFILE):
+    """按时间窗口估计MIDI文件的调性变化（转调）
+    
+    Args:
+        midi_path (str): MIDI文件路径
+        window (float): 窗口长度（秒）
+        hop (float): 窗口步长（秒）
+        profile (str): 调性轮廓
+    
+    Returns:
+        list: [(开始时间, 调式, 大调/小调), ...]，只保留调性发生变化的位置
+    """
+    notes = midi_to_note_array(midi_path, include_drums=False)
+    changes = []
     
-    if key is None:
-        return None, None
+    for start, tonic, mode in key_detection.estimate_key_windows(notes, window, hop, profile):
+        if tonic is None:
+            continue
+        if not changes or changes[-1][1:] != (tonic, mode):
+            changes.append((start, tonic, mode))
     
-    return key.tonic.name, key.mode
+    return changes
 
 def get_tempo(midi_path):
     """获取MIDI文件的速度
@@ -150,8 +209,12 @@ def get_tempo(midi_path):
     Returns:
         float: 速度 (BPM)
     """
-    midi_data = pretty_midi.PrettyMIDI(midi_path)
-    return midi_data.get_tempo_changes()[1][0] if len(midi_data.get_tempo_changes()[1]) > 0 else 120.0
+    return feature_cache.cached(midi_path, 'tempo', lambda: _first_tempo(midi_corpus.read_smf_file(midi_path)))
+
+def _first_tempo(midi_data):
+    """获取 read_smf 结果中的初始速度"""
+    tempi = midi_data['tempo_changes'][1]
+    return float(tempi[0]) if len(tempi) > 0 else 120.0
 
 def get_instruments(midi_path):
     """获取MIDI文件中的乐器信息
@@ -162,22 +225,22 @@ def get_instruments(midi_path):
     Returns:
         list: 乐器对象列表
     """
-    midi_data = pretty_midi.PrettyMIDI(midi_path)
+    midi_data = midi_corpus.read_smf_file(midi_path)
     instruments = []
     
-    for i, inst in enumerate(midi_data.instruments):
+    for i, inst in enumerate(midi_data['instruments']):
         instruments.append({
             'index': i,
-            'name': pretty_midi.program_to_instrument_name(inst.program) if not inst.is_drum else 'Drums',
-            'is_drum': inst.is_drum,
-            'program': inst.program,
-            'note_count': len(inst.notes)
+            'name': pretty_midi.program_to_instrument_name(inst['program']) if not inst['is_drum'] else 'Drums',
+            'is_drum': inst['is_drum'],
+            'program': inst['program'],
+            'note_count': inst['note_count']
         })
     
     return instruments
 
 def quantize_notes(notes, ticks_per_beat=480):
-    """量化音符时值
+    """量化音符时值（音符字典列表版本，网格为 1/8 秒）
     
     Args:
         notes (list): 音符对象列表
@@ -186,96 +249,259 @@ def quantize_notes(notes, ticks_per_beat=480):
     Returns:
         list: 量化后的音符对象列表
     """
-    quantized_notes = []
+    if not notes:
+        return []
     
-    for note_info in notes:
-        # 将时间转换为tick
-        start_tick = round(note_info['start'] * ticks_per_beat)
-        end_tick = round(note_info['end'] * ticks_per_beat)
-        
-        # 量化到最近的tick
-        start_tick = round(start_tick / 60) * 60
-        end_tick = round(end_tick / 60) * 60
-        
-        # 转换回秒
-        quantized_note = note_info.copy()
-        quantized_note['start'] = start_tick / ticks_per_beat
-        quantized_note['end'] = end_tick / ticks_per_beat
-        
-        quantized_notes.append(quantized_note)
+    # 原实现：先换算为tick，再量化到 60 tick 的倍数
+    grid = 60 / ticks_per_beat
+    starts = np.round(np.round(np.array([n['start'] for n in notes]) * ticks_per_beat) / 60) * grid
+    ends = np.round(np.round(np.array([n['end'] for n in notes]) * ticks_per_beat) / 60) * grid
+    
+    return [dict(note_info, start=start, end=end) for note_info, start, end in zip(notes, starts.tolist(), ends.tolist())]
+
+def _as_note_array(source):
+    """将MIDI文件路径或音符数组统一为音符数组（不修改输入）"""
+    if isinstance(source, (str, os.PathLike)):
+        return midi_to_note_array(source)
+    return np.array(source, dtype=NOTE_DTYPE)
+
+def quantize_note_array(source, grid, tempo=None):
+    """将音符的开始和结束时间量化到网格
+    
+    Args:
+        source (str | ndarray): MIDI文件路径或音符数组
+        grid (float): 网格大小；指定 tempo 时单位为拍，否则为秒
+        tempo (float, optional): 速度 (BPM)
+    
+    Returns:
+        ndarray: 量化后的音符数组，每个音符至少占一格
+    """
+    notes = _as_note_array(source)
+    step = grid * 60.0 / tempo if tempo else grid
+    if step <= 0:
+        raise ValueError("grid必须大于0")
+    
+    starts = np.round(notes['start'] / step) * step
+    ends = np.round(notes['end'] / step) * step
+    notes['start'] = starts
+    notes['end'] = np.maximum(ends, starts + step)
+    return notes[np.argsort(notes['start'], kind='stable')]
+
+def transpose_note_array(source, semitones, clamp='octave', min_pitch=0, max_pitch=127):
+    """转调音符数组（鼓声不转调）
     
-    return quantized_notes
+    Args:
+        source (str | ndarray): MIDI文件路径或音符数组
+        semitones (int): 转调半音数
+        clamp (str): 超出音域时的处理方式，'octave' 按八度折回音域内，'clip' 截断到边界，'drop' 丢弃
+        min_pitch (int): 最低音高
+        max_pitch (int): 最高音高
+    
+    Returns:
+        ndarray: 转调后的音符数组
+    """
+    notes = _as_note_array(source)
+    melodic = ~notes['is_drum']
+    pitches, keep = _transpose_pitches(notes['pitch'], semitones, clamp, min_pitch, max_pitch, melodic)
+    notes = notes[keep]
+    notes['pitch'] = pitches[keep]
+    return notes
 
-def transpose_midi(midi_path, output_path, semitones):
-    """转调MIDI文件
+def _transpose_pitches(pitches, semitones, clamp, min_pitch=0, max_pitch=127, mask=None):
+    """转调音高数组并处理超出音域的音
+    
+    Args:
+        pitches (ndarray): 音高数组
+        semitones (int): 转调半音数
+        clamp (str): 超出音域时的处理方式，见 transpose_note_array
+        min_pitch (int): 最低音高
+        max_pitch (int): 最高音高
+        mask (ndarray, optional): 需要转调的元素（例如非鼓声），默认为全部
+    
+    Returns:
+        tuple: (转调后的音高数组, 需要保留的元素掩码)
+    """
+    pitches = np.asarray(pitches, dtype=np.int64).copy()
+    if mask is None:
+        mask = np.ones(len(pitches), dtype=bool)
+    pitches[mask] += semitones
+    
+    out_of_range = mask & ((pitches < min_pitch) | (pitches > max_pitch))
+    keep = np.ones(len(pitches), dtype=bool)
+    if clamp == 'octave':
+        if max_pitch - min_pitch < 11:
+            raise ValueError("按八度折回时音域必须至少包含一个八度")
+        low = out_of_range & (pitches < min_pitch)
+        high = out_of_range & (pitches > max_pitch)
+        pitches[low] += 12 * ((min_pitch - pitches[low] + 11) // 12)
+        pitches[high] -= 12 * ((pitches[high] - max_pitch + 11) // 12)
+    elif clamp == 'clip':
+        pitches[mask] = np.clip(pitches[mask], min_pitch, max_pitch)
+    elif clamp == 'drop':
+        keep = ~out_of_range
+    else:
+        raise ValueError("clamp参数必须是'octave'、'clip'或'drop'")
+    
+    return pitches, keep
+
+def time_stretch_note_array(source, factor):
+    """按比例拉伸音符时间
+    
+    Args:
+        source (str | ndarray): MIDI文件路径或音符数组
+        factor (float): 拉伸系数，大于 1 变慢，小于 1 变快
+    
+    Returns:
+        ndarray: 拉伸后的音符数组
+    """
+    if factor <= 0:
+        raise ValueError("factor必须大于0")
+    
+    notes = _as_note_array(source)
+    notes['start'] *= factor
+    notes['end'] *= factor
+    return notes
+
+def merge_note_arrays(sources, align='sequential'):
+    """合并多个音符数组
+    
+    Args:
+        sources (list): MIDI文件路径或音符数组列表
+        align (str): 合并方式，'sequential'顺序排列，'parallel'同时播放
+    
+    Returns:
+        ndarray: 按开始时间排序的合并结果
+    """
+    if align not in ('sequential', 'parallel'):
+        raise ValueError("align参数必须是'sequential'或'parallel'")
+    
+    arrays = [_as_note_array(source) for source in sources]
+    if not arrays:
+        return empty_note_array(0)
+    
+    if align == 'sequential':
+        # 每段的偏移为之前所有段最晚结束时间之和
+        durations = np.array([notes['end'].max() if len(notes) else 0.0 for notes in arrays])
+        offsets = np.concatenate([[0.0], np.cumsum(durations)[:-1]])
+        for notes, offset in zip(arrays, offsets):
+            notes['start'] += offset
+            notes['end'] += offset
+    
+    merged = np.concatenate(arrays)
+    return merged[np.argsort(merged['start'], kind='stable')]
+
+def split_note_array_by_bar(source, tempo=None, beats_per_bar=4, bars_per_segment=1):
+    """按小节切分音符数组
+    
+    音符归入其开始时间所在的片段，跨越片段边界的部分被截断；
+    每个片段内的时间从 0 开始。
+    
+    Args:
+        source (str | ndarray): MIDI文件路径或音符数组
+        tempo (float, optional): 速度 (BPM)，传入文件路径时默认读取文件的速度，否则默认为120
+        beats_per_bar (int): 每小节拍数
+        bars_per_segment (int): 每个片段的小节数
+    
+    Returns:
+        list: 音符数组列表，第 i 项对应第 i 个片段（没有音符的片段为空数组）
+    """
+    if tempo is None:
+        tempo = get_tempo(source) if isinstance(source, (str, os.PathLike)) else 120.0
+    notes = _as_note_array(source)
+    if len(notes) == 0:
+        return []
+    
+    segment_length = beats_per_bar * bars_per_segment * 60.0 / tempo
+    segments = np.floor(notes['start'] / segment_length + 1e-9).astype(np.int64)
+    order = np.argsort(segments, kind='stable')
+    notes, segments = notes[order], segments[order]
+    
+    offsets = segments * segment_length
+    notes['start'] = np.maximum(notes['start'] - offsets, 0.0)
+    notes['end'] = np.minimum(notes['end'] - offsets, segment_length)
+    
+    boundaries = np.searchsorted(segments, np.arange(1, segments[-1] + 1))
+    return np.split(notes, boundaries)
+
+def write_note_array(notes, output_path, tempo=120.0):
+    """将音符数组保存为MIDI文件
+    
+    Args:
+        notes (ndarray): 音符数组
+        output_path (str): 输出MIDI文件路径
+        tempo (float): 速度 (BPM)
+    """
+    smf.write_smf(notes, output_path, tempo=tempo)
+
+# transpose_midi 和 merge_midi_files 输出给用户的完整文件，仍通过 pretty_midi 读写，
+# 保留音符数组中没有的控制器、弯音、音色变化和完整的速度表
+
+def transpose_midi(midi_path, output_path, semitones, clamp='octave'):
+    """转调MIDI文件（鼓声不转调）
     
     Args:
         midi_path (str): 输入MIDI文件路径
         output_path (str): 输出MIDI文件路径
         semitones (int): 转调半音数
+        clamp (str): 超出音域时的处理方式，见 transpose_note_array
     """
     midi_data = pretty_midi.PrettyMIDI(midi_path)
     
     for instrument in midi_data.instruments:
-        for note in instrument.notes:
-            note.pitch += semitones
+        if instrument.is_drum or not instrument.notes:
+            continue
+        
+        pitches, keep = _transpose_pitches([note.pitch for note in instrument.notes], semitones, clamp)
+        for note, pitch in zip(instrument.notes, pitches.tolist()):
+            note.pitch = pitch
+        instrument.notes = [note for note, kept in zip(instrument.notes, keep.tolist()) if kept]
     
     midi_data.write(output_path)
 
 def merge_midi_files(midi_paths, output_path, align='sequential'):
     """合并多个MIDI文件
     
+    合并结果沿用第一个文件的速度表、拍号和调号，其余文件的音符、控制器和弯音按秒对齐。
+    
     Args:
         midi_paths (list): MIDI文件路径列表
         output_path (str): 输出MIDI文件路径
         align (str): 合并方式，'sequential'顺序排列，'parallel'同时播放
     """
-    if align == 'sequential':
-        # 顺序合并
-        merged_midi = pretty_midi.PrettyMIDI()
-        current_time = 0
-        
-        for midi_path in midi_paths:
-            midi_data = pretty_midi.PrettyMIDI(midi_path)
-            max_end_time = 0
-            
-            for instrument in midi_data.instruments:
-                new_instrument = pretty_midi.Instrument(program=instrument.program, is_drum=instrument.is_drum)
-                
-                for note in instrument.notes:
-                    new_note = pretty_midi.Note(
-                        velocity=note.velocity,
-                        pitch=note.pitch,
-                        start=note.start + current_time,
-                        end=note.end + current_time
-                    )
-                    new_instrument.notes.append(new_note)
-                    max_end_time = max(max_end_time, note.end)
-                
-                merged_midi.instruments.append(new_instrument)
-            
-            current_time += max_end_time
-        
-        merged_midi.write(output_path)
+    if align not in ('sequential', 'parallel'):
+        raise ValueError("align参数必须是'sequential'或'parallel'")
+    
+    if not midi_paths:
+        pretty_midi.PrettyMIDI().write(output_path)
+        return
     
-    elif align == 'parallel':
-        # 并行合并（同时播放）
-        merged_midi = pretty_midi.PrettyMIDI()
+    merged = pretty_midi.PrettyMIDI(midi_paths[0])
+    offset = _last_note_end(merged) if align == 'sequential' else 0.0
+    
+    for midi_path in midi_paths[1:]:
+        midi_data = pretty_midi.PrettyMIDI(midi_path)
+        duration = _last_note_end(midi_data)
         
-        for midi_path in midi_paths:
-            midi_data = pretty_midi.PrettyMIDI(midi_path)
-            
-            for instrument in midi_data.instruments:
-                new_instrument = pretty_midi.Instrument(program=instrument.program, is_drum=instrument.is_drum)
-                new_instrument.notes = instrument.notes
-                merged_midi.instruments.append(new_instrument)
+        for instrument in midi_data.instruments:
+            if offset:
+                for event in instrument.notes:
+                    event.start += offset
+                    event.end += offset
+                for event in instrument.control_changes + instrument.pitch_bends:
+                    event.time += offset
+            merged.instruments.append(instrument)
         
-        merged_midi.write(output_path)
+        if align == 'sequential':
+            # 与 merge_note_arrays 一致：下一段从本段最晚结束的音符之后开始
+            offset += duration
     
-    else:
-        raise ValueError("align参数必须是'sequential'或'parallel'")
+    merged.write(output_path)
 
-def midi_to_spectrogram(midi_path, sr=22050, n_fft=2048, hop_length=512):
+def _last_note_end(midi_data):
+    """PrettyMIDI 对象中最晚结束的音符的结束时间"""
+    return max((note.end for instrument in midi_data.instruments for note in instrument.notes), default=0.0)
+
+def midi_to_spectrogram(midi_path, sr=22050, n_fft=2048, hop_length=512, n_mels=128, dtype=np.float32):
     """将MIDI文件转换为频谱图
     
     Args:
@@ -283,19 +509,21 @@ def midi_to_spectrogram(midi_path, sr=22050, n_fft=2048, hop_length=512):
         sr (int): 采样率
         n_fft (int): FFT窗口大小
         hop_length (int): 帧移
+        n_mels (int): 梅尔频带数
+        dtype: 计算和返回使用的数据类型
     
     Returns:
-        ndarray: 频谱图
+        ndarray: 形状为 (n_mels, 帧数) 的对数梅尔频谱图 (dB)
     """
     # 先将MIDI转换为音频
     midi_data = pretty_midi.PrettyMIDI(midi_path)
-    audio_data = midi_data.fluidsynth(fs=sr)
+    audio_data = midi_data.fluidsynth(fs=sr).astype(dtype, copy=False)
     
     # 计算频谱图
-    spectrogram = librosa.feature.melspectrogram(y=audio_data, sr=sr, n_fft=n_fft, hop_length=hop_length)
+    spectrogram = librosa.feature.melspectrogram(y=audio_data, sr=sr, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels)
     spectrogram_db = librosa.power_to_db(spectrogram, ref=np.max)
     
-    return spectrogram_db
+    return spectrogram_db.astype(dtype, copy=False)
 
 def extract_midi_features(midi_path):
     """提取MIDI文件的特征
@@ -306,73 +534,316 @@ def extract_midi_features(midi_path):
     Returns:
         dict: 特征字典
     """
-    midi_data = pretty_midi.PrettyMIDI(midi_path)
+    return feature_cache.cached(midi_path, 'features', lambda: _compute_midi_features(midi_path))
+
+def _compute_midi_features(midi_path):
+    """提取MIDI文件的特征（不经过缓存）"""
+    midi_data = midi_corpus.read_smf_file(midi_path)
+    notes = midi_data['notes']
+    end_time = midi_data['end_time']
     
     # 注意密度（每秒的平均音符数）
-    note_density = len(midi_data.get_onsets()) / midi_data.get_end_time() if midi_data.get_end_time() > 0 else 0
+    note_density = len(notes) / end_time if end_time > 0 else 0
     
     # 音高范围
-    all_notes = []
-    for instrument in midi_data.instruments:
-        if not instrument.is_drum:
-            all_notes.extend([note.pitch for note in instrument.notes])
-    
-    pitch_range = max(all_notes) - min(all_notes) if all_notes else 0
+    pitches = notes['pitch'][~notes['is_drum']]
+    pitch_range = int(pitches.max() - pitches.min()) if len(pitches) else 0
     
     # 和弦密度（同时弹奏的平均音符数）
-    if all_notes:
-        onsets = midi_data.get_onsets()
-        chord_density = len(all_notes) / len(onsets) if len(onsets) > 0 else 0
-    else:
-        chord_density = 0
+    chord_density = len(pitches) / len(notes) if len(pitches) else 0
     
     # 平均音符持续时间
-    note_durations = []
-    for instrument in midi_data.instruments:
-        note_durations.extend([note.end - note.start for note in instrument.notes])
-    
-    avg_note_duration = sum(note_durations) / len(note_durations) if note_durations else 0
+    avg_note_duration = float(np.mean(notes['end'] - notes['start'])) if len(notes) else 0
     
     return {
         'note_density': note_density,
         'pitch_range': pitch_range,
         'chord_density': chord_density,
         'avg_note_duration': avg_note_duration,
-        'tempo': midi_data.get_tempo_changes()[1][0] if len(midi_data.get_tempo_changes()[1]) > 0 else 120.0,
-        'duration': midi_data.get_end_time(),
-        'num_instruments': len(midi_data.instruments),
-        'num_notes': sum(len(instrument.notes) for instrument in midi_data.instruments)
+        'tempo': _first_tempo(midi_data),
+        'duration': end_time,
+        'num_instruments': len(midi_data['instruments']),
+        'num_notes': len(notes)
     }
 
+def extract_track_info(midi_path):
+    """一次解析MIDI文件，提取入库所需的基本信息
+    
+    等价于分别调用 get_tempo、extract_key 和 extract_midi_features，
+    但只读取和解析文件一次。
+    
+    Args:
+        midi_path (str): MIDI文件路径
+    
+    Returns:
+        dict: 包含 tempo、key、mode、duration 的字典
+    """
+    def compute():
+        midi_data = midi_corpus.read_smf_file(midi_path)
+        notes = midi_data['notes']
+        key, mode = key_detection.estimate_key(notes[~notes['is_drum']])
+        
+        return {
+            'tempo': _first_tempo(midi_data),
+            'key': key,
+            'mode': mode,
+            'duration': midi_data['end_time']
+        }
+    
+    return feature_cache.cached(midi_path, 'track_info', compute)
 
-def wav_to_midi(wav_path, midi_path):
-    """将WAV文件转换为MIDI文件"""
-    # 加载音频文件
-    y, sr = librosa.load(wav_path)
 
-    # 使用音高检测算法（如音高跟踪）来提取音符
-    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+def midi_to_tokens(midi_path, version=DEFAULT_TOKENIZER_VERSION):
+    """将MIDI文件转换为训练用的音符序列
+    
+    Args:
+        midi_path (str): MIDI文件路径
+        version (int): 分词器版本，见 TOKENIZER_VERSIONS
+    
+    Returns:
+        list: 音符序列，版本 1 的格式见 stream_to_tokens，版本 2 见 notes_to_tokens
+    """
+    _check_tokenizer_version(version)
+    if version == 1:
+        return feature_cache.cached(midi_path, 'tokens:v1', lambda: stream_to_tokens(converter.parse(midi_path)))
+    return feature_cache.cached(midi_path, 'tokens:v2', lambda: smf_to_tokens(midi_corpus.read_smf_file(midi_path)))
 
-    # 创建一个新的MIDI对象
-    midi_data = pretty_midi.PrettyMIDI()
+def midi_bytes_to_tokens(data, version=DEFAULT_TOKENIZER_VERSION):
+    """将MIDI文件内容转换为训练用的音符序列（用于打包语料）
+    
+    Args:
+        data (bytes | memoryview): MIDI文件内容
+        version (int): 分词器版本
+    
+    Returns:
+        list: 音符序列
+    """
+    _check_tokenizer_version(version)
+    if version == 1:
+        return stream_to_tokens(converter.parseData(bytes(data), format='midi'))
+    return smf_to_tokens(smf.read_smf(data))
 
-    # 创建一个乐器
-    instrument = pretty_midi.Instrument(program=0)  # 0表示钢琴
+def _check_tokenizer_version(version):
+    if version not in TOKENIZER_VERSIONS:
+        raise ValueError(f"未知的分词器版本: {version}，可选: {', '.join(str(v) for v in TOKENIZER_VERSIONS)}")
 
-    # 遍历音高数据，创建音符
-    for t in range(pitches.shape[1]):
-        for p in range(pitches.shape[0]):
-            if pitches[p, t] > 0:  # 检查音高是否有效
-                note = pretty_midi.Note(
-                    velocity=100,  # 音量
-                    pitch=int(pitches[p, t]),  # 音高
-                    start=t * (1.0 / sr),  # 开始时间
-                    end=(t + 1) * (1.0 / sr)  # 结束时间
-                )
-                instrument.notes.append(note)
+def stream_to_tokens(midi):
+    """将 music21 流转换为音符序列（分词器版本 1）
+    
+    只取第一个乐器部分，单音记为音名（如 'C#4'），和弦记为 normal order 音级（如 '0.4.7'），
+    休止符记为 'REST'。
+    
+    Args:
+        midi (music21.stream.Stream): converter.parse 的解析结果
+    
+    Returns:
+        list: 音符序列
+    """
+    tokens = []
+    
+    # 提取所有乐器部分
+    parts = instrument.partitionByInstrument(midi)
+    
+    if parts:  # 文件有乐器部分
+        notes_to_parse = parts.parts[0].recurse()
+    else:  # 文件没有乐器部分
+        notes_to_parse = midi.flat.notes
+    
+    # 提取音符、和弦和休止符
+    for element in notes_to_parse:
+        if isinstance(element, note.Note):
+            tokens.append(str(element.pitch))
+        elif isinstance(element, chord.Chord):
+            tokens.append('.'.join(str(n) for n in element.normalOrder))
+        elif isinstance(element, note.Rest):
+            tokens.append('REST')
+    
+    return tokens
 
-    # 将乐器添加到MIDI数据中
-    midi_data.instruments.append(instrument)
+def smf_to_tokens(midi_data):
+    """将 read_smf 的解析结果转换为训练用的音符序列（分词器版本 2）
+    
+    Args:
+        midi_data (dict): smf.read_smf 的解析结果
+    
+    Returns:
+        list: 音符序列
+    """
+    return notes_to_tokens(midi_data['notes'], tempo=_first_tempo(midi_data))
 
+def notes_to_tokens(notes, tempo=120.0):
+    """将音符数组转换为音符序列（分词器版本 2）
+    
+    记号的写法与版本 1 相同：只取第一个非鼓乐器，单音记为音名（如 'C#4'），
+    同时开始的多个音记为和弦的 normal order 音级（如 '0.4.7'），间隔超过十六分音符记为 'REST'。
+    但不经过 music21 的量化、声部和小节切分，时值不同的同时音、重叠音和休止符的切分方式
+    与版本 1 不同，两个版本的序列和词表不能混用。
+    
+    Args:
+        notes (ndarray): 音符数组
+        tempo (float): 速度 (BPM)，用于把时间换算为拍
+    
+    Returns:
+        list: 音符序列
+    """
+    notes = notes[~notes['is_drum']]
+    if len(notes) == 0:
+        return []
+    notes = notes[notes['program'] == notes['program'][0]]
+    
+    # 以拍为单位，开始时间量化到 1/12 拍
+    beat = 60.0 / tempo
+    onsets = np.round(notes['start'] / beat * 12) / 12
+    group_starts, group_index = np.unique(onsets, return_inverse=True)
+    group_ends = np.zeros(len(group_starts))
+    np.maximum.at(group_ends, group_index, notes['end'] / beat)
+    boundaries = np.flatnonzero(np.diff(group_index)) + 1
+    
+    tokens = []
+    last_end = None
+    for start, end, pitches in zip(group_starts, group_ends, np.split(notes['pitch'], boundaries)):
+        if last_end is not None and start - last_end >= 0.25:
+            tokens.append('REST')
+        
+        unique_pitches = np.unique(pitches)
+        if len(unique_pitches) == 1:
+            pitch = int(unique_pitches[0])
+            tokens.append(f"{key_detection.TONIC_NAMES[pitch % 12]}{pitch // 12 - 1}")
+        else:
+            tokens.append('.'.join(str(pc) for pc in normal_order(unique_pitches % 12)))
+        
+        last_end = end if last_end is None else max(last_end, end)
+    
+    return tokens
+
+def normal_order(pitch_classes):
+    """计算音级集合的 normal order（最紧凑排列）
+    
+    与 music21 的 Chord.normalOrder 相同（Forte 的规则）：先比较首尾跨度，
+    再依次比较第一个音到第二、第三……个音的音程，完全对称时取最低音级开头的排列。
+    """
+    pitch_classes = sorted(set(int(pc) for pc in pitch_classes))
+    n = len(pitch_classes)
+    if n <= 1:
+        return pitch_classes
+    
+    rotations = [pitch_classes[i:] + [pc + 12 for pc in pitch_classes[:i]] for i in range(n)]
+    best = min(rotations, key=lambda r: (r[-1] - r[0],) + tuple(r[k] - r[0] for k in range(1, n - 1)))
+    return [pc % 12 for pc in best]
+
+def compare_tokenizers(midi_paths, version=2):
+    """在语料上比较分词器版本与版本 1（music21）的输出
+    
+    Args:
+        midi_paths (list): MIDI文件路径列表
+        version (int): 要比较的分词器版本
+    
+    Returns:
+        dict: 包含文件数、序列完全一致的文件数、一致率以及不一致的文件
+    """
+    total = 0
+    agreed = 0
+    mismatches = []
+    
+    for midi_path in midi_paths:
+        try:
+            expected = stream_to_tokens(converter.parse(midi_path))
+            with open(midi_path, 'rb') as f:
+                actual = midi_bytes_to_tokens(f.read(), version=version)
+        except Exception as e:
+            print(f"比较文件 {midi_path} 时出错: {e}")
+            continue
+        
+        total += 1
+        if actual == expected:
+            agreed += 1
+        else:
+            mismatches.append({'filepath': midi_path, 'expected_length': len(expected), 'actual_length': len(actual)})
+    
+    return {
+        'total': total,
+        'agreed': agreed,
+        'agreement': agreed / total if total else 0.0,
+        'mismatches': mismatches
+    }
+
+
+def segment_pitch_track(midi_pitches, sr, hop_length, onset_frames=None, min_duration=0.05, strengths=None,
+                        kernel_size=1, hysteresis=0.0):
+    """将逐帧的音高序列分割为音符
+    
+    对量化后的音高做游程编码：音高变化、发声状态变化或检测到起音的帧开始一个新音符，
+    时长小于 min_duration 的音符被丢弃。实现见 note_segmentation.segment_notes，
+    默认不做中值滤波和迟滞。
+    
+    Args:
+        midi_pitches (ndarray): 每帧的MIDI音高（浮点），NaN 或非正值表示不发声
+        sr (int): 采样率
+        hop_length (int): 帧移（采样点数）
+        onset_frames (ndarray, optional): 起音所在的帧索引
+        min_duration (float): 最短音符时长（秒）
+        strengths (ndarray, optional): 每帧 0-1 的强度，用于计算音符力度；缺省时力度为 100
+        kernel_size (int): 中值滤波窗口帧数，不大于 1 时不滤波
+        hysteresis (float): 音高切换的迟滞宽度（半音），为 0 时直接四舍五入
+    
+    Returns:
+        ndarray: 音符数组（见 note_array.NOTE_DTYPE）
+    """
+    return note_segmentation.segment_notes(
+        midi_pitches, sr, hop_length,
+        onset_frames=onset_frames,
+        min_duration=min_duration,
+        strengths=strengths,
+        kernel_size=kernel_size,
+        hysteresis=hysteresis
+    )
+
+def wav_to_midi(wav_path, midi_path, hop_length=512, fmin=65.0, fmax=2093.0, threshold=0.1, min_duration=0.05):
+    """将WAV文件转换为MIDI文件
+    
+    取每帧 piptrack 幅度最大的音高作为主音高并转换为MIDI音高，结合起音检测做游程分割，
+    生成单声部旋律。
+    
+    Args:
+        wav_path (str): WAV文件路径
+        midi_path (str): 输出MIDI文件路径
+        hop_length (int): 帧移（采样点数）
+        fmin (float): 最低检测频率 (Hz)
+        fmax (float): 最高检测频率 (Hz)
+        threshold (float): 相对于全曲最大幅度的发声阈值
+        min_duration (float): 最短音符时长（秒）
+    
+    Returns:
+        ndarray: 转录得到的音符数组
+    """
+    # 加载音频文件
+    y, sr = librosa.load(wav_path)
+    
+    # 音高跟踪，取每帧幅度最大的频率
+    pitches, magnitudes = librosa.piptrack(y=y, sr=sr, hop_length=hop_length, fmin=fmin, fmax=fmax)
+    best_bins = np.argmax(magnitudes, axis=0)
+    frames = np.arange(magnitudes.shape[1])
+    frequencies = pitches[best_bins, frames]
+    frame_magnitudes = magnitudes[best_bins, frames]
+    
+    peak = frame_magnitudes.max() if frame_magnitudes.size else 0.0
+    strengths = frame_magnitudes / peak if peak > 0 else np.zeros_like(frame_magnitudes)
+    voiced = (frequencies > 0) & (strengths >= threshold)
+    
+    midi_pitches = np.full(len(frequencies), np.nan)
+    midi_pitches[voiced] = librosa.hz_to_midi(frequencies[voiced])
+    
+    # 起音检测，用于分开同音高的连续音符
+    onset_frames = librosa.onset.onset_detect(y=y, sr=sr, hop_length=hop_length)
+    
+    notes = segment_pitch_track(
+        midi_pitches, sr, hop_length,
+        onset_frames=onset_frames,
+        min_duration=min_duration,
+        strengths=np.sqrt(strengths)
+    )
+    
     # 保存MIDI文件
-    midi_data.write(midi_path)
\ No newline at end of file
+    notes_to_midi(note_array_to_dicts(notes), midi_path)
+    
+    return notes
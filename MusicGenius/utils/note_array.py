@@ -0,0 +1,86 @@
+"""
+音符数组（NoteArray）
+
+用 numpy 结构化数组按列保存音符，每一行对应一个音符，
+可直接按字段取出整列（如 notes['pitch']）做批量计算，
+避免为每个音符创建 Python 对象。
+"""
+
+import numpy as np
+
+# 音符数组的字段定义
+NOTE_DTYPE = np.dtype([
+    ('pitch', np.int16),      # MIDI音高 (0-127)
+    ('start', np.float64),    # 开始时间（秒）
+    ('end', np.float64),      # 结束时间（秒）
+    ('velocity', np.int16),   # 力度 (0-127)
+    ('program', np.int16),    # 乐器编号 (0-127)
+    ('is_drum', np.bool_),    # 是否为鼓声轨道
+])
+
+
+def empty_note_array(size=0):
+    """创建空的音符数组
+
+    Args:
+        size (int): 数组长度
+
+    Returns:
+        ndarray: NOTE_DTYPE 结构化数组
+    """
+    return np.zeros(size, dtype=NOTE_DTYPE)
+
+
+def note_array_from_pretty_midi(midi_data, include_drums=True):
+    """将 PrettyMIDI 对象转换为音符数组
+
+    Args:
+        midi_data (pretty_midi.PrettyMIDI): MIDI数据
+        include_drums (bool): 是否包含鼓声轨道
+
+    Returns:
+        ndarray: 按开始时间排序的音符数组
+    """
+    instruments = [inst for inst in midi_data.instruments if include_drums or not inst.is_drum]
+    notes = empty_note_array(sum(len(inst.notes) for inst in instruments))
+
+    i = 0
+    for inst in instruments:
+        n = len(inst.notes)
+        if n == 0:
+            continue
+        block = notes[i:i + n]
+        block['pitch'] = [note.pitch for note in inst.notes]
+        block['start'] = [note.start for note in inst.notes]
+        block['end'] = [note.end for note in inst.notes]
+        block['velocity'] = [note.velocity for note in inst.notes]
+        block['program'] = inst.program
+        block['is_drum'] = inst.is_drum
+        i += n
+
+    return notes[np.argsort(notes['start'], kind='stable')]
+
+
+
+def note_array_to_dicts(notes):
+    """将音符数组转换为音符字典列表
+
+    Args:
+        notes (ndarray): 音符数组
+
+    Returns:
+        list: 音符字典列表，每项包含 pitch、start、end、velocity、instrument
+    """
+    return [
+        {
+            'pitch': pitch,
+            'start': start,
+            'end': end,
+            'velocity': velocity,
+            'instrument': program
+        }
+        for pitch, start, end, velocity, program in zip(
+            notes['pitch'].tolist(), notes['start'].tolist(), notes['end'].tolist(),
+            notes['velocity'].tolist(), notes['program'].tolist()
+        )
+    ]
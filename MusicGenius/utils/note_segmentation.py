@@ -0,0 +1,177 @@
+"""
+音高轨迹的音符分割
+
+把逐帧的音高序列转换为音符数组，全部为向量化操作，没有逐帧的 Python 循环：
+1. 中值滤波：发声状态按窗口内多数表决，音高取窗口内发声帧的中值，去掉孤立的错误帧和倍频跳变
+2. 迟滞量化：只有音高明确落入新的半音（离半音边界超过 hysteresis）时才切换音符，
+   在两个半音之间抖动的颤音或滑音不会被切成大量短音符
+3. 游程编码：音高、发声状态变化或检测到起音的帧开始一个新音符，过短的音符被丢弃
+4. 速度映射：按估计的速度把起止时间对齐到每拍 subdivisions 格的网格上，
+   写出的 MIDI 文件中音符落在整齐的 tick 上
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .note_array import empty_note_array
+
+
+def _voiced_mask(pitches):
+    return np.isfinite(pitches) & (pitches > 0)
+
+
+def median_smooth(midi_pitches, kernel_size=5):
+    """对音高序列做中值滤波
+
+    Args:
+        midi_pitches (ndarray): 每帧的MIDI音高（浮点），NaN 或非正值表示不发声
+        kernel_size (int): 窗口帧数（偶数时加一），不大于 1 时不滤波
+
+    Returns:
+        ndarray: 滤波后的音高，不发声的帧为 NaN
+    """
+    pitches = np.asarray(midi_pitches, dtype=np.float64)
+    voiced = _voiced_mask(pitches)
+    smoothed = np.where(voiced, pitches, np.nan)
+    if kernel_size <= 1 or len(pitches) == 0:
+        return smoothed
+
+    kernel_size = int(kernel_size) | 1
+    half = kernel_size // 2
+
+    # 发声状态：窗口内过半的帧发声才算发声
+    padded_voiced = np.pad(voiced, half, mode='edge')
+    voiced_count = sliding_window_view(padded_voiced, kernel_size).sum(axis=1)
+    voiced = voiced_count > half
+
+    # 音高：窗口内发声帧的下中位数（有效值为偶数个时取较低的一个，而不是两音之间的平均值）；
+    # 多数表决保证这些帧的窗口内至少有 half + 1 个有效值。NaN 排序后在末尾
+    windows = np.sort(sliding_window_view(np.pad(smoothed, half, mode='edge'), kernel_size)[voiced], axis=1)
+    middle = (np.isfinite(windows).sum(axis=1) - 1) // 2
+    smoothed = np.full(len(pitches), np.nan)
+    smoothed[voiced] = windows[np.arange(len(windows)), middle]
+    return smoothed
+
+
+def hysteresis_quantize(midi_pitches, hysteresis=0.25, onset_frames=None):
+    """带迟滞地把音高量化为半音
+
+    离最近半音的距离不超过 0.5 - hysteresis 的帧是确定的，取四舍五入的音高；
+    其余靠近半音边界的帧沿用前一帧的音高。每段发声的第一帧、起音帧，以及与前一帧的
+    半音相差超过 0.5 + hysteresis 的帧（换音而不是抖动）总是确定的。
+
+    Args:
+        midi_pitches (ndarray): 每帧的MIDI音高（浮点），NaN 或非正值表示不发声
+        hysteresis (float): 迟滞宽度（半音），取值 0 到 0.5，为 0 时直接四舍五入
+        onset_frames (ndarray, optional): 起音所在的帧索引
+
+    Returns:
+        ndarray: 每帧的整数音高，不发声的帧为 -1
+    """
+    pitches = np.asarray(midi_pitches, dtype=np.float64)
+    n_frames = len(pitches)
+    voiced = _voiced_mask(pitches)
+    rounded = np.full(n_frames, -1, dtype=np.int64)
+    rounded[voiced] = np.clip(np.round(pitches[voiced]), 0, 127)
+    if hysteresis <= 0 or n_frames == 0:
+        return rounded
+
+    hysteresis = min(hysteresis, 0.5)
+    confident = ~voiced
+    confident[voiced] = np.abs(pitches[voiced] - np.round(pitches[voiced])) <= 0.5 - hysteresis
+    confident[1:] |= voiced[1:] & ~voiced[:-1]
+    confident[1:] |= voiced[1:] & (np.abs(pitches[1:] - rounded[:-1]) > 0.5 + hysteresis)
+    confident[0] = True
+    if onset_frames is not None:
+        onset_frames = np.asarray(onset_frames, dtype=np.int64)
+        confident[onset_frames[(onset_frames >= 0) & (onset_frames < n_frames)]] = True
+
+    # 每帧取最近一个确定帧的音高（前向填充）
+    source = np.where(confident, np.arange(n_frames), 0)
+    np.maximum.accumulate(source, out=source)
+    return rounded[source]
+
+
+def segment_notes(midi_pitches, sr, hop_length, onset_frames=None, min_duration=0.05, strengths=None,
+                  kernel_size=5, hysteresis=0.25):
+    """将逐帧的音高序列分割为音符
+
+    Args:
+        midi_pitches (ndarray): 每帧的MIDI音高（浮点），NaN 或非正值表示不发声
+        sr (int): 采样率
+        hop_length (int): 帧移（采样点数）
+        onset_frames (ndarray, optional): 起音所在的帧索引
+        min_duration (float): 最短音符时长（秒）
+        strengths (ndarray, optional): 每帧 0-1 的强度，用于计算音符力度；缺省时力度为 100
+        kernel_size (int): 中值滤波窗口帧数，不大于 1 时不滤波
+        hysteresis (float): 音高切换的迟滞宽度（半音），为 0 时直接四舍五入
+
+    Returns:
+        ndarray: 音符数组（见 note_array.NOTE_DTYPE）
+    """
+    n_frames = len(midi_pitches)
+    if n_frames == 0:
+        return empty_note_array(0)
+
+    rounded = hysteresis_quantize(median_smooth(midi_pitches, kernel_size), hysteresis, onset_frames)
+
+    # 游程边界：音高（含不发声状态）变化或起音
+    boundaries = np.empty(n_frames, dtype=bool)
+    boundaries[0] = True
+    boundaries[1:] = rounded[1:] != rounded[:-1]
+    if onset_frames is not None:
+        onset_frames = np.asarray(onset_frames, dtype=np.int64)
+        boundaries[onset_frames[(onset_frames >= 0) & (onset_frames < n_frames)]] = True
+
+    run_starts = np.flatnonzero(boundaries)
+    run_ends = np.append(run_starts[1:], n_frames)
+    run_pitches = rounded[run_starts]
+
+    frame_duration = hop_length / sr
+    starts = run_starts * frame_duration
+    ends = run_ends * frame_duration
+
+    if strengths is not None:
+        # 每段的平均强度
+        strengths = np.clip(np.asarray(strengths, dtype=np.float64)[:n_frames], 0.0, 1.0)
+        strengths = np.pad(strengths, (0, n_frames - len(strengths)))
+        mean_strengths = np.add.reduceat(strengths, run_starts) / (run_ends - run_starts)
+        velocities = np.round(40 + 87 * mean_strengths)
+    else:
+        velocities = np.full(len(run_starts), 100)
+
+    keep = (run_pitches >= 0) & (ends - starts >= min_duration)
+
+    notes = empty_note_array(int(keep.sum()))
+    notes['pitch'] = run_pitches[keep]
+    notes['start'] = starts[keep]
+    notes['end'] = ends[keep]
+    notes['velocity'] = velocities[keep]
+    return notes
+
+
+def quantize_to_tempo(notes, tempo, subdivisions=4, offset=0.0):
+    """按速度把音符起止时间对齐到节拍网格
+
+    Args:
+        notes (ndarray): 音符数组，时间单位为秒
+        tempo (float): 速度 (BPM)
+        subdivisions (int): 每拍的网格数，为 0 时不量化
+        offset (float): 网格的起点（秒），通常为第一拍的时间
+
+    Returns:
+        ndarray: 新的音符数组，每个音符至少占一格
+    """
+    notes = notes.copy()
+    if subdivisions <= 0 or tempo <= 0 or len(notes) == 0:
+        return notes
+
+    step = 60.0 / tempo / subdivisions
+    # 网格起点取 offset 在第一格内的相位，保证量化后的时间不为负
+    phase = offset % step
+    start_steps = np.maximum(np.round((notes['start'] - phase) / step), 0)
+    end_steps = np.maximum(np.round((notes['end'] - phase) / step), start_steps + 1)
+
+    notes['start'] = phase + start_steps * step
+    notes['end'] = phase + end_steps * step
+    return notes
+
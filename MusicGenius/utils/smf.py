@@ -0,0 +1,423 @@
+"""
+标准MIDI文件（SMF）读写模块
+
+直接在字节层面解析 MIDI 文件：读取轨道块、处理 running status、建立速度映射并配对
+note-on/note-off，最后一次性输出按列存储的音符数组，不为每个事件或音符创建 Python 对象。
+
+写入时按 (音色, 是否为鼓) 将音符数组分组为轨道，事件排序和可变长度编码全部向量化完成。
+
+音符配对、速度映射和乐器划分的规则与 pretty_midi 保持一致：
+- 只读取第 0 轨中的速度事件
+- 乐器按 (音色, 通道, 轨道) 区分，通道 10（索引 9）为鼓
+- 力度为 0 的 note-on 视为 note-off；与 note-off 同一 tick 开始的音符保持打开
+"""
+
+import io
+import os
+import time
+import numpy as np
+from .note_array import empty_note_array
+
+# 默认速度 (BPM)
+DEFAULT_TEMPO = 120.0
+
+# 需要计入结束时间的元事件：文本、歌词、拍号、调号
+_END_TIME_META_TYPES = (0x01, 0x05, 0x58, 0x59)
+
+
+def read_smf(source):
+    """解析标准MIDI文件
+
+    Args:
+        source (str | bytes | bytearray | memoryview | mmap.mmap): 文件路径或文件内容
+
+    Returns:
+        dict: 包含以下字段的字典
+            resolution (int): 每拍的tick数
+            notes (ndarray): 按开始时间排序的音符数组（见 note_array.NOTE_DTYPE）
+            instrument_index (ndarray): 每个音符所属乐器在 instruments 中的索引
+            instruments (list): 乐器列表，每项包含 program、channel、track、is_drum、note_count
+            tempo_changes (tuple): (速度变化时间数组, BPM数组)
+            end_time (float): 结束时间（秒）
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            data = f.read()
+    else:
+        data = source
+
+    if bytes(data[0:4]) != b'MThd':
+        raise ValueError("不是有效的MIDI文件：缺少 MThd 文件头")
+
+    header_length = int.from_bytes(data[4:8], 'big')
+    division = int.from_bytes(data[12:14], 'big')
+    if division & 0x8000:
+        raise ValueError("不支持 SMPTE 时间格式的MIDI文件")
+    resolution = division
+
+    # 音符列（tick 为单位）
+    pitches = []
+    start_ticks = []
+    end_ticks = []
+    velocities = []
+    note_instruments = []
+
+    # 乐器: (音色, 通道, 轨道) -> 索引
+    instrument_keys = {}
+    instruments = []
+
+    tempo_events = []
+    control_ticks = {}
+    max_event_tick = 0
+
+    size = len(data)
+    pos = 8 + header_length
+    track_index = 0
+
+    while pos + 8 <= size:
+        chunk_id = bytes(data[pos:pos + 4])
+        chunk_length = int.from_bytes(data[pos + 4:pos + 8], 'big')
+        p = pos + 8
+        end = min(p + chunk_length, size)
+        pos = p + chunk_length
+
+        if chunk_id != b'MTrk':
+            continue
+
+        tick = 0
+        status = 0
+        programs = [0] * 16
+        open_notes = {}
+
+        while p < end:
+            # 可变长度的 delta time
+            byte = data[p]
+            p += 1
+            delta = byte & 0x7F
+            while byte & 0x80:
+                byte = data[p]
+                p += 1
+                delta = (delta << 7) | (byte & 0x7F)
+            tick += delta
+
+            byte = data[p]
+            if byte & 0x80:
+                p += 1
+                if byte < 0xF0:
+                    status = byte
+                event_status = byte
+            else:
+                # running status
+                event_status = status
+
+            if event_status == 0xFF:
+                meta_type = data[p]
+                p += 1
+                byte = data[p]
+                p += 1
+                length = byte & 0x7F
+                while byte & 0x80:
+                    byte = data[p]
+                    p += 1
+                    length = (length << 7) | (byte & 0x7F)
+
+                if meta_type == 0x51 and track_index == 0 and length == 3:
+                    tempo_events.append((tick, (data[p] << 16) | (data[p + 1] << 8) | data[p + 2]))
+                elif meta_type in _END_TIME_META_TYPES:
+                    max_event_tick = max(max_event_tick, tick)
+                elif meta_type == 0x2F:
+                    p += length
+                    break
+
+                p += length
+                continue
+
+            if event_status == 0xF0 or event_status == 0xF7:
+                byte = data[p]
+                p += 1
+                length = byte & 0x7F
+                while byte & 0x80:
+                    byte = data[p]
+                    p += 1
+                    length = (length << 7) | (byte & 0x7F)
+                p += length
+                continue
+
+            if event_status == 0:
+                raise ValueError(f"第 {track_index} 轨中缺少状态字节")
+
+            kind = event_status & 0xF0
+            channel = event_status & 0x0F
+
+            if kind == 0xC0 or kind == 0xD0:
+                value = data[p]
+                p += 1
+                if kind == 0xC0:
+                    programs[channel] = value
+                continue
+
+            note_number = data[p]
+            value = data[p + 1]
+            p += 2
+
+            if kind == 0x90 and value > 0:
+                open_notes.setdefault((channel, note_number), []).append((tick, value))
+
+            elif kind == 0x80 or kind == 0x90:
+                key = (channel, note_number)
+                pending = open_notes.get(key)
+                if pending is None:
+                    continue
+
+                to_close = [item for item in pending if item[0] != tick]
+                to_keep = [item for item in pending if item[0] == tick]
+
+                if to_close:
+                    instrument_key = (programs[channel], channel, track_index)
+                    index = instrument_keys.get(instrument_key)
+                    if index is None:
+                        index = instrument_keys[instrument_key] = len(instruments)
+                        instruments.append(instrument_key)
+
+                    for start_tick, velocity in to_close:
+                        pitches.append(note_number)
+                        start_ticks.append(start_tick)
+                        end_ticks.append(tick)
+                        velocities.append(velocity)
+                        note_instruments.append(index)
+
+                if to_close and to_keep:
+                    open_notes[key] = to_keep
+                else:
+                    del open_notes[key]
+
+            elif kind == 0xB0 or kind == 0xE0:
+                # 控制器和弯音事件计入所属乐器的结束时间（乐器没有音符时忽略）
+                instrument_key = (programs[channel], channel, track_index)
+                if tick > control_ticks.get(instrument_key, -1):
+                    control_ticks[instrument_key] = tick
+
+        track_index += 1
+
+    if track_index == 0:
+        raise ValueError("MIDI文件中没有轨道数据")
+
+    # 速度映射: 每段的起始tick和每tick对应的秒数
+    scale_ticks, scales = _build_tick_scales(tempo_events, resolution)
+    segment_times = [0.0]
+    for i in range(1, len(scale_ticks)):
+        segment_times.append(segment_times[-1] + scales[i - 1] * (scale_ticks[i] - scale_ticks[i - 1]))
+
+    scale_ticks = np.asarray(scale_ticks, dtype=np.int64)
+    scales = np.asarray(scales, dtype=np.float64)
+    segment_times = np.asarray(segment_times, dtype=np.float64)
+
+    def ticks_to_time(ticks):
+        ticks = np.asarray(ticks, dtype=np.int64)
+        segment = np.searchsorted(scale_ticks, ticks, side='right') - 1
+        return segment_times[segment] + scales[segment] * (ticks - scale_ticks[segment])
+
+    # 组装音符数组：先按乐器创建顺序和音符结束顺序排列，再按开始时间稳定排序
+    note_instruments = np.asarray(note_instruments, dtype=np.int64)
+    order = np.argsort(note_instruments, kind='stable')
+
+    notes = empty_note_array(len(pitches))
+    notes['pitch'] = np.asarray(pitches, dtype=np.int16)[order]
+    notes['start'] = ticks_to_time(np.asarray(start_ticks, dtype=np.int64)[order])
+    notes['end'] = ticks_to_time(np.asarray(end_ticks, dtype=np.int64)[order])
+    notes['velocity'] = np.asarray(velocities, dtype=np.int16)[order]
+    note_instruments = note_instruments[order]
+
+    instrument_programs = np.asarray([key[0] for key in instruments], dtype=np.int16)
+    instrument_channels = np.asarray([key[1] for key in instruments], dtype=np.int16)
+    if len(instruments):
+        notes['program'] = instrument_programs[note_instruments]
+        notes['is_drum'] = instrument_channels[note_instruments] == 9
+
+    by_start = np.argsort(notes['start'], kind='stable')
+    notes = notes[by_start]
+    note_instruments = note_instruments[by_start]
+
+    note_counts = np.bincount(note_instruments, minlength=len(instruments))
+    instrument_list = [
+        {
+            'program': program,
+            'channel': channel,
+            'track': track,
+            'is_drum': channel == 9,
+            'note_count': int(count)
+        }
+        for (program, channel, track), count in zip(instruments, note_counts)
+    ]
+
+    # 结束时间：音符结束、控制器/弯音、元事件和速度变化中最晚的时间
+    for instrument_key, tick in control_ticks.items():
+        if instrument_key in instrument_keys:
+            max_event_tick = max(max_event_tick, tick)
+    end_tick = max([max_event_tick, int(scale_ticks[-1])] + ([max(end_ticks)] if end_ticks else []))
+    tempo_times = ticks_to_time(scale_ticks)
+
+    return {
+        'resolution': resolution,
+        'notes': notes,
+        'instrument_index': note_instruments,
+        'instruments': instrument_list,
+        'tempo_changes': (tempo_times, 60.0 / (scales * resolution)),
+        'end_time': float(ticks_to_time([end_tick])[0])
+    }
+
+
+def write_smf(notes, destination=None, tempo=DEFAULT_TEMPO, resolution=480):
+    """将音符数组写为标准MIDI文件（格式 1）
+
+    第 0 轨只包含速度事件，之后每个 (音色, 是否为鼓) 组合占一轨；
+    鼓声使用通道 10（索引 9），其他乐器依次分配其余通道。
+
+    Args:
+        notes (ndarray): 音符数组（见 note_array.NOTE_DTYPE），时间单位为秒
+        destination (str | file, optional): 输出路径或可写的二进制文件对象，为None时只返回字节
+        tempo (float): 速度 (BPM)
+        resolution (int): 每拍的tick数
+
+    Returns:
+        bytes: MIDI文件内容
+    """
+    ticks_per_second = tempo / 60.0 * resolution
+    start_ticks = np.round(notes['start'] * ticks_per_second).astype(np.int64)
+    end_ticks = np.round(notes['end'] * ticks_per_second).astype(np.int64)
+    # 结束与开始落在同一 tick 的音符读取时会被丢弃，至少保留 1 tick
+    end_ticks = np.maximum(end_ticks, start_ticks + 1)
+
+    microseconds = int(round(6e7 / tempo))
+    tempo_track = (b'\x00\xff\x51\x03' + microseconds.to_bytes(3, 'big') + b'\x00\xff\x2f\x00')
+    tracks = [tempo_track]
+
+    group_keys = notes['program'].astype(np.int64) * 2 + notes['is_drum']
+    melodic_channels = [channel for channel in range(16) if channel != 9]
+    for group_number, group_key in enumerate(np.unique(group_keys).tolist()):
+        program, is_drum = group_key // 2, bool(group_key % 2)
+        channel = 9 if is_drum else melodic_channels[group_number % len(melodic_channels)]
+        mask = group_keys == group_key
+        tracks.append(_encode_note_track(
+            notes['pitch'][mask], notes['velocity'][mask], start_ticks[mask], end_ticks[mask],
+            channel, None if is_drum else program
+        ))
+
+    chunks = [b'MThd', (6).to_bytes(4, 'big'), (1).to_bytes(2, 'big'),
+              len(tracks).to_bytes(2, 'big'), int(resolution).to_bytes(2, 'big')]
+    for track in tracks:
+        chunks.append(b'MTrk')
+        chunks.append(len(track).to_bytes(4, 'big'))
+        chunks.append(track)
+    data = b''.join(chunks)
+
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, 'wb') as f:
+            f.write(data)
+    elif destination is not None:
+        destination.write(data)
+
+    return data
+
+
+def _encode_note_track(pitches, velocities, start_ticks, end_ticks, channel, program):
+    """编码单个音符轨道的事件数据（不含块头）"""
+    n = len(pitches)
+
+    # 事件列：同一 tick 上 note-off 排在 note-on 之前
+    ticks = np.concatenate([end_ticks, start_ticks])
+    is_on = np.concatenate([np.zeros(n, dtype=np.int64), np.ones(n, dtype=np.int64)])
+    statuses = np.where(is_on == 1, 0x90 | channel, 0x80 | channel)
+    data1 = np.concatenate([pitches, pitches]).astype(np.int64)
+    data2 = np.concatenate([np.zeros(n, dtype=np.int64), np.clip(velocities, 1, 127)])
+
+    order = np.lexsort((is_on, ticks))
+    ticks = ticks[order]
+    deltas = np.diff(ticks, prepend=0)
+
+    # 可变长度编码的 delta time（最多 4 字节）
+    lengths = 1 + (deltas >= 1 << 7) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+    event_sizes = lengths + 3
+    positions = np.concatenate([[0], np.cumsum(event_sizes)[:-1]])
+    events = np.zeros(int(event_sizes.sum()), dtype=np.uint8)
+    for k in range(4):
+        has_byte = lengths > k
+        value = (deltas[has_byte] >> (7 * k)) & 0x7F
+        if k > 0:
+            value |= 0x80
+        events[positions[has_byte] + lengths[has_byte] - 1 - k] = value
+    status_positions = positions + lengths
+    events[status_positions] = statuses[order]
+    events[status_positions + 1] = data1[order]
+    events[status_positions + 2] = data2[order]
+
+    header = b'' if program is None else bytes([0x00, 0xC0 | channel, int(program)])
+    return header + events.tobytes() + b'\x00\xff\x2f\x00'
+
+
+def _build_tick_scales(tempo_events, resolution):
+    """根据速度事件建立 tick 缩放表
+
+    Args:
+        tempo_events (list): [(tick, 每拍微秒数), ...]
+        resolution (int): 每拍的tick数
+
+    Returns:
+        tuple: (每段起始tick列表, 每段每tick秒数列表)
+    """
+    scale_ticks = [0]
+    scales = [60.0 / (DEFAULT_TEMPO * resolution)]
+
+    for tick, microseconds in tempo_events:
+        scale = 60.0 / ((6e7 / microseconds) * resolution)
+        if tick == 0:
+            scale_ticks = [0]
+            scales = [scale]
+        elif scale != scales[-1]:
+            scale_ticks.append(tick)
+            scales.append(scale)
+
+    return scale_ticks, scales
+
+
+def benchmark_against_pretty_midi(midi_paths):
+    """在语料上比较本模块与 pretty_midi 的解析速度和音符输出
+
+    Args:
+        midi_paths (list): MIDI文件路径列表
+
+    Returns:
+        dict: 包含文件数、两者耗时、加速比以及音符输出不一致的文件
+    """
+    import pretty_midi
+    from .note_array import note_array_from_pretty_midi
+
+    contents = []
+    for midi_path in midi_paths:
+        with open(midi_path, 'rb') as f:
+            contents.append((midi_path, f.read()))
+
+    start = time.perf_counter()
+    smf_notes = [read_smf(data)['notes'] for _, data in contents]
+    smf_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference_notes = [
+        note_array_from_pretty_midi(pretty_midi.PrettyMIDI(io.BytesIO(data)))
+        for _, data in contents
+    ]
+    pretty_midi_seconds = time.perf_counter() - start
+
+    mismatches = [
+        midi_path
+        for (midi_path, _), actual, expected in zip(contents, smf_notes, reference_notes)
+        if not np.array_equal(actual, expected)
+    ]
+
+    return {
+        'files': len(contents),
+        'smf_seconds': smf_seconds,
+        'pretty_midi_seconds': pretty_midi_seconds,
+        'speedup': pretty_midi_seconds / smf_seconds if smf_seconds > 0 else float('inf'),
+        'mismatches': mismatches
+    }
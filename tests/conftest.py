@@ -0,0 +1,24 @@
+"""
+测试共用的夹具
+"""
+
+import glob
+import os
+import pytest
+
+
+@pytest.fixture(scope='session')
+def midi_corpus():
+    """music21 自带的测试MIDI文件（test01.mid ~ test21.mid）"""
+    music21 = pytest.importorskip('music21')
+    directory = os.path.join(os.path.dirname(music21.__file__), 'midi', 'testPrimitive')
+    paths = sorted(glob.glob(os.path.join(directory, '*.mid')))
+    if not paths:
+        pytest.skip('music21 未附带测试MIDI文件')
+    return paths
+
+
+@pytest.fixture(autouse=True)
+def _isolated_feature_cache(tmp_path, monkeypatch):
+    """特征缓存写入临时目录，测试之间互不影响，也不改动 data/ 下的缓存"""
+    monkeypatch.setenv('MUSICGENIUS_FEATURE_CACHE', str(tmp_path / 'feature_cache.db'))
@@ -0,0 +1,43 @@
+"""
+批量音频分析的摘要字段与按列输出测试
+"""
+
+import numpy as np
+from MusicGenius.audio import analysis_profiles
+from MusicGenius.audio.analysis_session import AnalysisSession
+from MusicGenius.core import audio_batch
+
+
+def _session(profile):
+    processor = analysis_profiles.create_processor(profile)
+    y = (0.1 * np.random.default_rng(0).standard_normal(processor.sr * 2)).astype(np.float32)
+    return AnalysisSession(processor, y=y, sr=processor.sr, pitch_method='yin')
+
+
+def test_fast_summary_skips_unselected_features():
+    session = _session('fast')
+    summary = audio_batch.summarize(session, audio_batch.summary_fields('fast'))
+
+    assert set(summary) == {'duration', 'tempo', 'estimated_key', 'estimated_mode', 'onset_strength_mean',
+                            'chroma_avg'}
+    for name in ('mfcc', 'spectral_centroid', 'zero_crossing_rate'):
+        assert not session.features.is_computed(name)
+
+
+def test_standard_summary_has_every_field():
+    summary = audio_batch.summarize(_session('standard'), audio_batch.summary_fields('standard'))
+    assert set(summary) == set(audio_batch.summarize(_session('standard')))
+    assert len(summary['mfcc_mean']) == audio_batch.VECTOR_COLUMNS['mfcc_mean']
+
+
+def test_write_columns_fills_missing_fields(tmp_path):
+    fast = audio_batch.summarize(_session('fast'), audio_batch.summary_fields('fast'))
+    full = audio_batch.summarize(_session('standard'))
+    output_path = str(tmp_path / 'features.npz')
+    audio_batch.write_columns([{'key': 'a', 'filepath': 'a.wav', 'summary': fast},
+                               {'key': 'b', 'filepath': 'b.wav', 'summary': full}], output_path)
+
+    columns = audio_batch.load_columns(output_path)
+    assert np.isnan(columns['spectral_centroid_mean'][0]) and not np.isnan(columns['spectral_centroid_mean'][1])
+    assert np.isnan(columns['mfcc_mean'][0]).all() and columns['mfcc_mean'].shape == (2, 13)
+    assert columns['tempo'][0] == fast['tempo']
@@ -0,0 +1,28 @@
+"""
+共享 STFT 导出的音频特征与 librosa 独立计算结果的一致性测试
+"""
+
+import numpy as np
+import pytest
+from MusicGenius.audio.audio_processor import check_feature_parity
+
+SR = 22050
+
+
+def _signal():
+    """三秒的合成信号：断续的 440Hz 正弦加少量噪声，带有明显的起音"""
+    t = np.arange(SR * 3) / SR
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+    noise = 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    return (tone + noise).astype(np.float32)
+
+
+@pytest.mark.parametrize('hop_length', [512, 256])
+def test_shared_features_match_librosa(hop_length):
+    parity = check_feature_parity(_signal(), SR, hop_length=hop_length)
+    assert parity == {name: True for name in parity}
+
+
+def test_shared_features_match_librosa_with_small_fft():
+    parity = check_feature_parity(_signal(), SR, n_fft=1024, hop_length=256)
+    assert parity == {name: True for name in parity}
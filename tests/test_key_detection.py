@@ -0,0 +1,11 @@
+"""
+调性检测与 music21 的一致性测试
+"""
+
+from MusicGenius.utils import key_detection
+
+
+def test_agreement_with_music21(midi_corpus):
+    result = key_detection.compare_with_music21(midi_corpus)
+    assert result['total'] == len(midi_corpus)
+    assert result['agreement'] >= key_detection.MUSIC21_AGREEMENT_TARGET, result['mismatches']
@@ -0,0 +1,170 @@
+"""
+MusicDatabase 查询集在各存储后端上的测试
+
+SQLite 后端总是运行；MySQL 后端只在设置了 MUSICGENIUS_TEST_MYSQL_HOST 时运行
+（可选 MUSICGENIUS_TEST_MYSQL_USER、MUSICGENIUS_TEST_MYSQL_PASSWORD、MUSICGENIUS_TEST_MYSQL_DATABASE），
+测试开始前会清空该数据库中的曲库表，请使用专门的测试数据库。
+
+运行:
+    python -m pytest tests
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+import pandas as pd
+import pytest
+from MusicGenius.core import db_backends
+from MusicGenius.core.music_database import MusicDatabase
+
+MYSQL_HOST = os.environ.get('MUSICGENIUS_TEST_MYSQL_HOST')
+
+# 按外键依赖顺序删除
+TABLES = ('track_tags', 'instruments', 'tags', 'tracks')
+
+
+def _row(filepath, title='Song', genre='pop', duration=120, tempo=100, key='C', mode='major'):
+    return {'title': title, 'genre': genre, 'filepath': filepath, 'duration': duration, 'tempo': tempo,
+            'key': key, 'mode': mode}
+
+
+def _open_mysql():
+    """连接测试用的 MySQL 数据库，并清空上一次运行留下的表"""
+    import mysql.connector
+
+    config = {
+        'host': MYSQL_HOST,
+        'user': os.environ.get('MUSICGENIUS_TEST_MYSQL_USER', 'root'),
+        'password': os.environ.get('MUSICGENIUS_TEST_MYSQL_PASSWORD', ''),
+        'database': os.environ.get('MUSICGENIUS_TEST_MYSQL_DATABASE', 'music_genius_test')
+    }
+    conn = mysql.connector.connect(**config)
+    try:
+        cursor = conn.cursor()
+        for table in TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.commit()
+    finally:
+        conn.close()
+    return MusicDatabase(backend='mysql', **config)
+
+
+@pytest.fixture(params=[
+    'sqlite',
+    pytest.param('mysql', marks=pytest.mark.skipif(not MYSQL_HOST, reason='未配置 MUSICGENIUS_TEST_MYSQL_HOST'))
+])
+def db(request, tmp_path):
+    if request.param == 'sqlite':
+        database = MusicDatabase(backend='sqlite', path=str(tmp_path / 'music.db'))
+    else:
+        database = _open_mysql()
+    yield database
+    database.close()
+
+
+def _track_id(db, filepath):
+    return db.get_track_ids_by_filepath([filepath])[filepath]
+
+
+def test_add_track_rows_skips_existing_filepaths(db):
+    assert db.add_track_rows([_row('a.mid'), _row('b.mid')]) == 2
+    assert db.add_track_rows([_row('a.mid', title='Other'), _row('c.mid')]) == 1
+
+    assert db.get_total_tracks() == 3
+    assert db.get_track(_track_id(db, 'a.mid'))['title'] == 'Song'
+
+
+def test_add_track_rows_updates_existing_filepaths(db):
+    db.add_track_rows([_row('a.mid')])
+    db.add_track_rows([_row('a.mid', title='Other', duration=90, tempo=140, key='A', mode='minor'),
+                       _row('b.mid')], update_existing=True)
+
+    track = db.get_track(_track_id(db, 'a.mid'))
+    assert (track['title'], track['duration'], track['tempo']) == ('Song', 90, 140)
+    assert (track['key'], track['mode']) == ('A', 'minor')
+    assert db.get_total_tracks() == 2
+
+
+def test_update_track_audio_features_keeps_other_fields(db):
+    db.add_track_rows([_row('a.mid'), _row('b.mid')])
+    a, b = _track_id(db, 'a.mid'), _track_id(db, 'b.mid')
+    db.set_track_analysis(a, {'analysis_version': 1, 'analysis': {'key': 'C major'}})
+
+    summary = {'tempo': 120.0, 'estimated_key': 'C', 'chroma_avg': [0.5] * 12}
+    assert db.update_track_audio_features([(a, summary), (b, summary)]) == 2
+
+    features = db.get_track(a)['features']
+    assert features['audio'] == summary
+    assert features['analysis'] == {'key': 'C major'}
+    # features 列为空时创建新对象
+    assert db.get_track(b)['features'] == {'audio': summary}
+
+
+def test_set_track_analysis_merges_top_level_fields(db):
+    db.add_track_rows([_row('a.mid', key=None, mode=None)])
+    a = _track_id(db, 'a.mid')
+    db.update_track_audio_features([(a, {'tempo': 120.0})])
+
+    assert db.set_track_analysis(a, {'analysis_version': 1, 'file_size': 10, 'analysis': {'key': 'D minor'}},
+                                 key='D', mode='minor')
+    db.set_track_analysis(a, {'file_size': 20})
+
+    track = db.get_track(a)
+    assert track['features'] == {'audio': {'tempo': 120.0}, 'analysis_version': 1, 'file_size': 20,
+                                 'analysis': {'key': 'D minor'}}
+    assert (track['key'], track['mode']) == ('D', 'minor')
+
+
+def test_track_statistics(db):
+    db.add_track_rows([
+        _row('a.mid', tempo=50),
+        _row('b.mid', tempo=100),
+        _row('c.mid', genre='jazz', tempo=130, key='A', mode='minor'),
+        _row('d.mid', genre=None, tempo=None, key=None, mode=None)
+    ])
+
+    stats = db.get_track_statistics()
+    assert stats['total_tracks'] == 4
+    assert stats['genre_distribution'] == {'pop': 2, 'jazz': 1}
+    assert stats['key_distribution'] == {'C major': 2, 'A minor': 1}
+    assert stats['tempo_distribution'] == {'Very Slow (<60)': 1, 'Moderate (90-120)': 1, 'Fast (120-160)': 1}
+
+
+def test_export_to_csv(db, tmp_path):
+    db.add_track_rows([_row('a.mid'), _row('b.mid', key='G', mode='major')])
+    output_path = str(tmp_path / 'tracks.csv')
+    db.export_to_csv(output_path)
+
+    df = pd.read_csv(output_path)
+    assert list(df.columns) == ['id', 'title', 'artist', 'genre', 'filepath', 'duration', 'tempo', 'key', 'mode',
+                                'created_at']
+    assert sorted(df['filepath']) == ['a.mid', 'b.mid']
+    assert sorted(df['key']) == ['C', 'G']
+    assert pd.to_datetime(df['created_at']).notna().all()
+
+
+def test_delete_tracks_by_filepath_cascades(db):
+    db.add_track_rows([_row('a.mid'), _row('b.mid')])
+    a, b = _track_id(db, 'a.mid'), _track_id(db, 'b.mid')
+    tag_id = db.add_tag('calm')
+    with db.operation() as (conn, cursor):
+        cursor.executemany("INSERT INTO track_tags (track_id, tag_id) VALUES (%s, %s)", [(a, tag_id), (b, tag_id)])
+        cursor.executemany("INSERT INTO instruments (track_id, name, program, is_drum) VALUES (%s, %s, %s, %s)",
+                           [(a, 'Piano', 0, False), (b, 'Drums', 0, True)])
+
+    assert db.delete_tracks_by_filepath(['a.mid']) == 1
+
+    assert db.get_track(a) is None
+    assert db._fetchall("SELECT track_id FROM track_tags") == [(b,)]
+    assert [row[0] for row in db._fetchall("SELECT track_id FROM instruments")] == [b]
+    assert db.get_track(b)['instruments'] == [{'name': 'Drums', 'program': 0, 'is_drum': True}]
+
+
+def test_created_at_is_datetime(db):
+    db.add_track_rows([_row('a.mid')])
+    assert isinstance(db.get_track(_track_id(db, 'a.mid'))['created_at'], datetime)
+
+
+def test_sqlite_backend_does_not_register_global_converters(tmp_path):
+    MusicDatabase(backend='sqlite', path=str(tmp_path / 'music.db')).close()
+    assert all(converter.__module__ != db_backends.__name__ for converter in sqlite3.converters.values())
@@ -0,0 +1,11 @@
+"""
+smf 字节级解析器与 pretty_midi 的输出一致性测试
+"""
+
+from MusicGenius.utils import smf
+
+
+def test_notes_match_pretty_midi(midi_corpus):
+    result = smf.benchmark_against_pretty_midi(midi_corpus)
+    assert result['files'] == len(midi_corpus)
+    assert result['mismatches'] == []
@@ -0,0 +1,65 @@
+"""
+TrackAnalysisCache 的测试（SQLite 后端，分析函数用桩代替）
+"""
+
+import os
+import threading
+import numpy as np
+import pytest
+from MusicGenius.core.music_database import MusicDatabase
+from MusicGenius.core.track_analysis import TrackAnalysisCache
+
+
+def _analyzer(filepath):
+    summary = {'key': 'C major', 'mode': 'major', 'tempo': 120.0}
+    return summary, {'notes': np.arange(1000, dtype=np.float64)}
+
+
+@pytest.fixture
+def track(tmp_path):
+    filepath = tmp_path / 'a.mid'
+    filepath.write_bytes(b'MThd' + bytes(100))
+    db = MusicDatabase(backend='sqlite', path=str(tmp_path / 'music.db'))
+    db.add_track_rows([{'title': 'a', 'genre': None, 'filepath': str(filepath), 'duration': 1, 'tempo': 120}])
+    track_id = db.get_track_ids_by_filepath([str(filepath)])[str(filepath)]
+    yield db, track_id
+    db.close()
+
+
+def test_analysis_keeps_fields_written_during_analysis(track, tmp_path):
+    db, track_id = track
+    stale = db.get_track(track_id)
+    db.update_track_audio_features([(track_id, {'tempo': 98.0})])
+
+    cache = TrackAnalysisCache(db, sidecar_dir=str(tmp_path / 'analysis'), analyzer=_analyzer)
+    assert cache.get(stale)['key'] == 'C major'
+
+    features = db.get_track(track_id)['features']
+    assert features['audio'] == {'tempo': 98.0}
+    assert features['analysis']['key'] == 'C major'
+    assert db.get_track(track_id)['key'] == 'C'
+
+
+def test_concurrent_analysis_writes_one_sidecar(track, tmp_path):
+    db, track_id = track
+    sidecar_dir = tmp_path / 'analysis'
+    cache = TrackAnalysisCache(db, sidecar_dir=str(sidecar_dir), analyzer=_analyzer)
+    stale = db.get_track(track_id)
+    errors = []
+
+    def analyze():
+        try:
+            cache.get_arrays(stale)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=analyze) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [name for name in os.listdir(sidecar_dir) if not name.endswith('.npz') or '.tmp' in name] == []
+    assert len(os.listdir(sidecar_dir)) == 1
+    np.testing.assert_array_equal(cache.get_arrays(db.get_track(track_id))['notes'], np.arange(1000))